@@ -1,8 +1,9 @@
-from multiprocessing import Array,Manager,Value
+from multiprocessing import Manager,Value
 from datetime import datetime
 from ..core import logger
-from shared.utils import is_point_in_rect,is_boxes_intersect,is_point_in_polygon
-from shared.services import BaseResultProcessor
+from shared.utils import is_boxes_intersect,RegionSet,keypoint_arrays,keypoints_in_regions
+from shared.utils.pose import HEAD,WRISTS
+from shared.services import BaseResultProcessor, SharedStateDict, SharedStateList, SharedFlags
 
 class ResultProcessor(BaseResultProcessor):
     #悬挂机构
@@ -18,7 +19,7 @@ class ResultProcessor(BaseResultProcessor):
     #钢丝绳区域
     STEEL_WIRE_REGION = [
         [(490, 239), (544, 423), (706, 374), (663, 201)],
-        (1312, 661), (1615, 886), (1369, 1245), (1141, 1061)
+        [(1312, 661), (1615, 886), (1369, 1245), (1141, 1061)]
     ]
 
     #吊篮平台区域
@@ -43,13 +44,45 @@ class ResultProcessor(BaseResultProcessor):
     # 清洗工作区
     WORK_REGIONS = [(8, 1439), (1232, 1437), (1337, 1141), (181, 0), (0, 1)]
 
+    # 预编译的区域，每帧一次判断所有关键点和中心点
+    REGIONS = RegionSet({
+        **{f"suspension_{i}": region for i, region in enumerate(SUSPENSION_REGION)},
+        "warning_zone": WARNING_ZONE_REGION,
+        "warning_zone_removed": (1841, 737, 2558, 1438),#警戒区撤除后的位置
+        **{f"steel_wire_{i}": region for i, region in enumerate(STEEL_WIRE_REGION)},
+        "platform": PLATFORM_REGION,
+        **{f"hoist_{i}": region for i, region in enumerate(HOIST_REGION)},
+        **{f"safety_lock_{i}": region for i, region in enumerate(SAFETY_LOCK_REGION)},
+        "electrical_system": ELECTRICAL_SYSTEM_REGION,
+        "work": WORK_REGIONS,
+        "hoist_default_0": (633, 354, 795, 526),#提升机默认位置
+        "hoist_default_1": (1176, 878, 1340, 1038),
+    })
+    SUSPENSION_NAMES = [f"suspension_{i}" for i in range(len(SUSPENSION_REGION))]
+    WRIST_NAMES = ["steel_wire_0", "steel_wire_1", "platform", "hoist_0", "hoist_1",
+                   "safety_lock_0", "safety_lock_1", "electrical_system"]
+
+    # 考试步骤：{模型序号: [(exam_flag序号, 步骤名), ...]}
+    EXAM_STEPS = {
+        1: [(0, "basket_step_1"), (10, "basket_step_11"), (11, "basket_step_12")],
+        0: [(1, "basket_step_2")],
+        2: [
+            (1, "basket_step_2"), (2, "basket_step_3"), (3, "basket_step_4"), (4, "basket_step_5"),
+            (5, "basket_step_6"), (6, "basket_step_7"),
+        ],
+        3: [(7, "basket_step_8")],
+        4: [(0, "basket_step_1"), (8, "basket_step_9"), (9, "basket_step_10")],
+    }
+    # 由其他视角写入的标志：1由悬挂机构姿态模型写入，0由正面警戒区模型写入，7需要吊篮顶部姿态模型判断人在吊篮上
+    EXAM_FLAG_SOURCES = {1: [0], 0: [1], 7: [2]}
+
     def __init__(self,weights_paths: list[str],images_dir, img_url_path):
         super().__init__(weights_paths,images_dir, img_url_path)
-        self.exam_flag = Array('b', [False] * 12)
+        self.exam_flag = SharedFlags(12)
         #self.warning_zone_flag=Array('b', [False] * 2)#存储两个视角下的警戒区域的检测结果
         self.manager = Manager()
-        self.exam_imgs = self.manager.dict()
-        self.exam_order = self.manager.list()
+        self.exam_imgs = SharedStateDict(self.manager)
+        self.exam_order = SharedStateList(self.manager)
         self.exam_status = Value('b', False)
         self.person_status=Value('b', False)
 
@@ -57,10 +90,9 @@ class ResultProcessor(BaseResultProcessor):
 
     
     def init_exam_variables(self):
-        for i in range(len(self.exam_flag)):
-            self.exam_flag[i] = False    
+        self.exam_flag.fill(False)
         self.exam_imgs.clear()
-        self.exam_order[:]=[]
+        self.exam_order.clear()
 
     def process_result(self, r, weights_path):
         """Process results from the model - implementation of BaseResultProcessor method"""
@@ -70,82 +102,54 @@ class ResultProcessor(BaseResultProcessor):
         if weights_path==self.weights_paths[0] and not self.exam_flag[1]:  # 姿态估计,检查悬挂机构
             if r.keypoints is None:
                 return
-            keypoints = r.keypoints.xy.cpu().numpy()
-            if keypoints.size != 0:
-                for keypoint in keypoints:
-                    try:
-                        left_wrist = list(map(int, keypoint[9]))
-                        right_wrist = list(map(int, keypoint[10]))
-                        for region in self.SUSPENSION_REGION:
-                            if is_point_in_rect(left_wrist, region) or is_point_in_rect(right_wrist, region):
-                                self.exam_flag[1]=True               
-                                break                                                                
-                    except (IndexError, ValueError) as e:
-                        logger.error(f"处理关键点时出错: {e}")
-                        continue
+            xy, conf = keypoint_arrays(r)
+            # 所有人的左右手腕与所有悬挂机构一次判断
+            if keypoints_in_regions(xy, conf, WRISTS, self.REGIONS, self.SUSPENSION_NAMES).any():
+                self.exam_flag[1]=True
 
         if weights_path==self.weights_paths[1]:#正面警戒区
             boxes = r.boxes.xyxy.cpu().numpy()
             classes = r.boxes.cls.cpu().numpy()
-            for box, cls in zip(boxes, classes):
+            centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+            in_zones = self.REGIONS.contains(centers.astype(int), ["warning_zone", "warning_zone_removed"])
+            for cls, (in_zone, in_removed) in zip(classes, in_zones):
                 if r.names[int(cls)] == "warning_zone":#当警戒区的中点在指定区域内
-                    center_point=(int((box[0]+box[2])/2), int((box[1]+box[3])/2))
-                    if not self.exam_flag[0] and is_point_in_rect(center_point, self.WARNING_ZONE_REGION):
+                    if not self.exam_flag[0] and in_zone:
                         self.exam_flag[0]=True
-                    if self.exam_flag[0] and not self.exam_flag[10] and is_point_in_rect(center_point,(1841, 737, 2558, 1438)):
+                    if self.exam_flag[0] and not self.exam_flag[10] and in_removed:
                         self.exam_flag[10]=True
                         self.exam_flag[11]=True
 
         if weights_path==self.weights_paths[2]:#姿态估计，吊篮顶部视角
-        
             if r.keypoints is None:
                 return
-            keypoints = r.keypoints.xy.cpu().numpy()
-            if keypoints.size != 0:
-                for keypoint in keypoints:
-                    try:
-                        left_wrist = list(map(int, keypoint[9]))
-                        right_wrist = list(map(int, keypoint[10]))
-                        
-                        left_eye=list(map(int, keypoint[1]))
-                        right_eye=list(map(int, keypoint[2]))
-                        nose=list(map(int, keypoint[0]))
-
-                        if is_point_in_polygon(nose, self.PLATFORM_REGION) or is_point_in_polygon(left_eye, self.PLATFORM_REGION) or is_point_in_polygon(right_eye, self.PLATFORM_REGION):
-                            self.person_status.value=True
-                        else:
-                            self.person_status.value=False
-
-                        for region in self.STEEL_WIRE_REGION:
-                            if not self.exam_flag[2] and (is_point_in_polygon(left_wrist, region) or is_point_in_polygon(right_wrist, region)):
-                                self.exam_flag[2]=True               
-                                break    
-
-                        if not self.exam_flag[3] and (is_point_in_polygon(left_wrist, self.PLATFORM_REGION) or is_point_in_polygon(right_wrist, self.PLATFORM_REGION)):
-                            self.exam_flag[3]=True
-
-                        for region in self.HOIST_REGION:
-                            if not self.exam_flag[4] and (is_point_in_polygon(left_wrist, region) or is_point_in_polygon(right_wrist, region)):
-                                self.exam_flag[4]=True               
-                                break
-
-                        for region in self.SAFETY_LOCK_REGION:
-                            if not self.exam_flag[5] and (is_point_in_polygon(left_wrist, region) or is_point_in_polygon(right_wrist, region)):
-                                self.exam_flag[5]=True               
-                                break
-                        if not self.exam_flag[6] and (is_point_in_polygon(left_wrist, self.ELECTRICAL_SYSTEM_REGION) or is_point_in_polygon(right_wrist, self.ELECTRICAL_SYSTEM_REGION)):
-                            self.exam_flag[6]=True
-
-                    except (IndexError, ValueError) as e:
-                        logger.error(f"处理关键点时出错: {e}")
-                        continue
+            xy, conf = keypoint_arrays(r)
+            if xy.shape[0] != 0:
+                # 有人的头部（鼻子或眼睛）在吊篮平台内即认为人在吊篮上
+                on_platform = keypoints_in_regions(xy, conf, HEAD, self.REGIONS, ["platform"])
+                self.person_status.value = bool(on_platform.any())
+
+                # 任意一人的左右手腕任意一个在区域内即可
+                wrist_hits = keypoints_in_regions(xy, conf, WRISTS, self.REGIONS, self.WRIST_NAMES).any(axis=(0, 1))
+                in_region = dict(zip(self.WRIST_NAMES, wrist_hits))
+                if in_region["steel_wire_0"] or in_region["steel_wire_1"]:
+                    self.exam_flag[2]=True
+                if in_region["platform"]:
+                    self.exam_flag[3]=True
+                if in_region["hoist_0"] or in_region["hoist_1"]:
+                    self.exam_flag[4]=True
+                if in_region["safety_lock_0"] or in_region["safety_lock_1"]:
+                    self.exam_flag[5]=True
+                if in_region["electrical_system"]:
+                    self.exam_flag[6]=True
 
         if weights_path==self.weights_paths[3]:#hoist
             boxes = r.boxes.xyxy.cpu().numpy()
             classes = r.boxes.cls.cpu().numpy()
-            for box, cls in zip(boxes, classes):
+            at_default = self.REGIONS.intersects(boxes.astype(int), ["hoist_default_0", "hoist_default_1"])
+            for cls, (at_left, at_right) in zip(classes, at_default):
                 if r.names[int(cls)] == "hoist":#当其中一个提升机与指定的区域相交
-                    if is_boxes_intersect(tuple(map(int, box)), (633, 354, 795, 526)) or is_boxes_intersect(tuple(map(int, box)), (1176, 878, 1340, 1038)) and self.person_status.value:
+                    if at_left or at_right and self.person_status.value:
                         self.exam_flag[7]=True
 
         if weights_path==self.weights_paths[4]:#吊篮顶部 检查安全带挂设相关
@@ -156,10 +160,11 @@ class ResultProcessor(BaseResultProcessor):
             #hoist_position=[]
             #self.warning_zone_flag[1]=False
             
-            for box, cls in zip(boxes, classes):
+            in_work_region = self.REGIONS.contains(((boxes[:, :2] + boxes[:, 2:]) / 2).astype(int), ["work"])[:, 0]
+
+            for box, cls, in_work in zip(boxes, classes, in_work_region):
                 if r.names[int(cls)] == "brush":#刷子出现在指定区域则完成清洗
-                    center_point=(int((box[0]+box[2])/2), int((box[1]+box[3])/2))
-                    if is_point_in_polygon(center_point, self.WORK_REGIONS):
+                    if in_work:
                         self.exam_flag[9]=True                  
 
                 if r.names[int(cls)] == "safety_belt":
@@ -175,45 +180,12 @@ class ResultProcessor(BaseResultProcessor):
 
         self.save_step(r, weights_path)
     
-    def save_step(self,r,weights_path):
-
-        # Restructure exam_steps to be a dictionary with weights_path as keys
-        exam_steps = {
-            self.weights_paths[1]: [
-                (self.exam_flag[0], "basket_step_1"),                
-                (self.exam_flag[10], "basket_step_11"),
-                (self.exam_flag[11], "basket_step_12")
-            ],
-            self.weights_paths[0]: [(self.exam_flag[1], "basket_step_2")],
-            self.weights_paths[2]: [
-                (self.exam_flag[1], "basket_step_2"),
-                (self.exam_flag[2], "basket_step_3"),
-                (self.exam_flag[3], "basket_step_4"),
-                (self.exam_flag[4], "basket_step_5"),
-                (self.exam_flag[5], "basket_step_6"),
-                (self.exam_flag[6], "basket_step_7"),
-                
-            ],
-            self.weights_paths[3]: [(self.exam_flag[7], "basket_step_8")],
-            self.weights_paths[4]: [
-                (self.exam_flag[0], "basket_step_1"),
-                (self.exam_flag[8], "basket_step_9"),
-                (self.exam_flag[9], "basket_step_10"),
-
-            ]
-        }
-        
-        if self.exam_status.value and weights_path in exam_steps:
-            for flag, step in exam_steps[weights_path]:
-                if flag and step not in self.exam_imgs:
-                    self.save_image_exam(self.exam_imgs, r, step, self.exam_order)
-
     #TODO 还需要修改
     def save_image_exam(self,welding_exam_imgs,r, step_name,welding_exam_order):
         save_time = datetime.now().strftime('%Y%m%d_%H%M')
         imgpath = f"{self.images_dir}/{step_name}_{save_time}.jpg"
         postpath = f"{self.img_url_path}/{step_name}_{save_time}.jpg"
-        r.save(imgpath)
+        self.save_result_image(r, imgpath)
         # annotated_frame = r.plot()
         # cv2.imwrite(imgpath, annotated_frame)
         welding_exam_imgs[step_name]=postpath
@@ -0,0 +1 @@
+"""Offline replay and micro-benchmarks for the detection pipeline"""
@@ -0,0 +1,91 @@
+"""
+Micro-benchmark of mask/region IoU at 2560x1440.
+
+Compares the previous full-frame raster implementation (two frame-sized canvases
+per call) with the bbox-local ``calculate_mask_rect_iou`` and the batched
+``calculate_masks_regions_iou``, and checks that all three agree exactly.
+
+Usage::
+
+    python -m benchmarks.geometry_bench --masks 4 --repeat 50
+"""
+import argparse
+import time
+import cv2
+import numpy as np
+
+from shared.utils.geometry import calculate_mask_rect_iou, calculate_masks_regions_iou
+
+FRAME_WIDTH, FRAME_HEIGHT = 2560, 1440
+
+# Regions of the welding2_k2 segmentation view
+REGIONS = [
+    (662, 976, 1421, 1407),
+    (948, 293, 1397, 1091),
+    (1026, 212, 1363, 304),
+    (1026, 212, 1363, 304),
+]
+
+
+def raster_mask_rect_iou(mask: np.ndarray, rect: tuple) -> float:
+    """The previous implementation, rasterising mask and rectangle on full-size canvases"""
+    if len(mask) == 0:
+        return 0.0
+    x1_rect, y1_rect, x2_rect, y2_rect = rect
+    width = max(x2_rect, np.max(mask[:, 0]).astype(int)) + 1
+    height = max(y2_rect, np.max(mask[:, 1]).astype(int)) + 1
+    mask_img = np.zeros((height, width), dtype=np.uint8)
+    cv2.fillPoly(mask_img, [np.array(mask, dtype=np.int32).reshape((-1, 1, 2))], 1)
+    rect_img = np.zeros((height, width), dtype=np.uint8)
+    cv2.rectangle(rect_img, (x1_rect, y1_rect), (x2_rect, y2_rect), 1, -1)
+    intersection = np.logical_and(mask_img, rect_img).sum()
+    union = np.logical_or(mask_img, rect_img).sum()
+    return 0.0 if union == 0 else intersection / union
+
+
+def random_masks(count: int, vertices: int = 200, seed: int = 0) -> list:
+    """Star-shaped polygons with segmentation-like size and vertex count"""
+    rng = np.random.default_rng(seed)
+    masks = []
+    for _ in range(count):
+        cx, cy = rng.uniform(400, FRAME_WIDTH - 400), rng.uniform(300, FRAME_HEIGHT - 300)
+        angles = np.sort(rng.uniform(0, 2 * np.pi, vertices))
+        radius = rng.uniform(0.6, 1.0, vertices) * rng.uniform(100, 400)
+        masks.append(np.stack([cx + radius * np.cos(angles),
+                               cy + 2 * radius * np.sin(angles)], axis=1).astype(np.float32))
+    return masks
+
+
+def _time(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mask/region IoU micro-benchmark at 2560x1440")
+    parser.add_argument("--masks", type=int, default=4, help="Masks per frame")
+    parser.add_argument("--repeat", type=int, default=50, help="Frames to time")
+    args = parser.parse_args()
+
+    masks = random_masks(args.masks)
+
+    raster = np.array([[raster_mask_rect_iou(m, r) for r in REGIONS] for m in masks])
+    single = np.array([[calculate_mask_rect_iou(m, r) for r in REGIONS] for m in masks])
+    batch = calculate_masks_regions_iou(masks, REGIONS)
+    assert np.array_equal(raster, single) and np.array_equal(raster, batch), "IoU results differ"
+
+    raster_ms = _time(lambda: [[raster_mask_rect_iou(m, r) for r in REGIONS] for m in masks], args.repeat)
+    single_ms = _time(lambda: [[calculate_mask_rect_iou(m, r) for r in REGIONS] for m in masks], args.repeat)
+    batch_ms = _time(lambda: calculate_masks_regions_iou(masks, REGIONS), args.repeat)
+
+    print(f"{args.masks} masks x {len(REGIONS)} regions per frame, {FRAME_WIDTH}x{FRAME_HEIGHT}, "
+          f"results identical")
+    print(f"{'full-frame raster':<24} {raster_ms:9.3f} ms/frame")
+    print(f"{'bbox-local per pair':<24} {single_ms:9.3f} ms/frame  ({raster_ms / single_ms:6.1f}x)")
+    print(f"{'batched':<24} {batch_ms:9.3f} ms/frame  ({raster_ms / batch_ms:6.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Offline replay benchmark for a whole detection service.
+
+Recorded video files stand in for the RTSP cameras of a service and drive
+``BaseDetectionManager.start()`` exactly like the API does. Frames are replayed
+either as fast as they can be decoded or paced at the file frame rate, with the
+real YOLO models or with StubPredictor (canned results, CPU only).
+
+Usage::
+
+    python -m benchmarks.replay basket_k2 --video cam1.mp4 --video cam2.mp4 \\
+        --duration 60 --stub --canned canned.yaml --json report.json
+
+The report contains frames/sec per stream and per model, stage latency
+percentiles from PipelineMetrics, CPU and RSS of every process and the exam
+steps that fired.
+"""
+from functools import partial
+from importlib import import_module
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import json
+import os
+import tempfile
+import time
+import cv2
+
+from shared.services.decoders import OpenCVDecoder, DECODER_BACKENDS
+from shared.utils.config import get_service_config
+from .stub import StubPredictor, load_canned_results
+
+try:
+    import psutil
+except ImportError:  # /proc fallback below
+    psutil = None
+
+
+class ReplayDecoder(OpenCVDecoder):
+    """
+    OpenCV decoder for recorded files that can pace frames at the file frame rate
+    and restart from the beginning at end of file. Options are class attributes so
+    they reach the forked stream processes.
+    """
+
+    name = "replay"
+    realtime = False
+    loop = True
+
+    def open(self):
+        super().open()
+        self._fps = self.cap.get(cv2.CAP_PROP_FPS) or 25.0
+        self._started = time.monotonic()
+        self._frames_read = 0
+
+    def grab(self) -> bool:
+        # Pace before the capture time is taken, so waiting does not count as decode latency
+        if self.realtime:
+            delay = self._started + self._frames_read / self._fps - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return super().grab()
+
+    def _grab(self) -> bool:
+        ret = self.cap.grab()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret = self.cap.grab()
+        if ret:
+            self._frames_read += 1
+        return ret
+
+
+DECODER_BACKENDS[ReplayDecoder.name] = ReplayDecoder
+
+
+class ProcessMonitor:
+    """Samples CPU time and RSS of a set of processes (psutil when installed, /proc otherwise)"""
+
+    def __init__(self, processes: Dict[str, int]):
+        """
+        :param processes: Role name -> pid
+        """
+        self.processes = processes
+        self._first: Dict[str, tuple] = {}
+        self._last: Dict[str, tuple] = {}
+        self._peak_rss: Dict[str, int] = {}
+
+    @staticmethod
+    def _read(pid: int) -> Optional[tuple]:
+        """(cpu seconds, rss bytes) of a process, None once it has exited"""
+        try:
+            if psutil is not None:
+                process = psutil.Process(pid)
+                cpu = process.cpu_times()
+                return cpu.user + cpu.system, process.memory_info().rss
+
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            ticks = os.sysconf('SC_CLK_TCK')
+            cpu_seconds = (int(fields[11]) + int(fields[12])) / ticks  # utime + stime
+            rss = int(fields[21]) * os.sysconf('SC_PAGE_SIZE')
+            return cpu_seconds, rss
+        except Exception:
+            return None
+
+    def sample(self):
+        now = time.monotonic()
+        for role, pid in self.processes.items():
+            reading = self._read(pid)
+            if reading is None:
+                continue
+            cpu_seconds, rss = reading
+            self._first.setdefault(role, (now, cpu_seconds))
+            self._last[role] = (now, cpu_seconds, rss)
+            self._peak_rss[role] = max(self._peak_rss.get(role, 0), rss)
+
+    def report(self) -> dict:
+        report = {}
+        for role, (end, cpu_end, rss) in self._last.items():
+            start, cpu_start = self._first[role]
+            elapsed = end - start
+            report[role] = {
+                "pid": self.processes[role],
+                "cpu_percent": round(100.0 * (cpu_end - cpu_start) / elapsed, 1) if elapsed > 0 else 0.0,
+                "rss_mb": round(rss / 2**20, 1),
+                "peak_rss_mb": round(self._peak_rss[role] / 2**20, 1),
+            }
+        return report
+
+
+def _replay_config(service_name: str, videos: List[str], images_dir: Path, every_frame: bool):
+    """Service config with every stream replaced by a video file (round-robin)"""
+    config = get_service_config(service_name)
+    overrides = {'decoder': ReplayDecoder.name}
+    if every_frame:
+        overrides.update(target_fps=None, frame_skip=1)
+    stream_configs = [
+        stream.model_copy(update={'rtsp_url': videos[i % len(videos)], **overrides})
+        for i, stream in enumerate(config.stream_configs)
+    ]
+    return config.model_copy(update={'stream_configs': stream_configs, 'images_dir': images_dir})
+
+
+def _fired_steps(manager) -> dict:
+    """Exam / reset steps recorded by the service's result processor"""
+    processor = manager.result_processor
+    steps = {}
+    for name in ('exam_order', 'exam_flag', 'reset_flag'):
+        value = getattr(processor, name, None)
+        if value is not None:
+            steps[name] = list(value)
+    for name in ('exam_imgs', 'reset_imgs'):
+        value = getattr(processor, name, None)
+        if value is not None:
+            steps[name] = sorted(dict(value))
+    return steps
+
+
+def run_benchmark(service_name: str, videos: List[str], duration: float = 30.0, realtime: bool = False,
+                  loop: bool = True, stub: bool = False, canned: Optional[dict] = None, exam: bool = True,
+                  every_frame: bool = False, images_dir: Optional[str] = None,
+                  sample_interval: float = 1.0) -> dict:
+    """
+    Replay video files through a service's detection pipeline and collect a report
+    :param service_name: Service section in config.yaml, e.g. basket_k2
+    :param videos: Video files, assigned to the service's streams round-robin
+    :param duration: Seconds to run after the pipeline has started
+    :param realtime: Pace each file at its own frame rate instead of decoding as fast as possible
+    :param loop: Restart files at end of file
+    :param stub: Use StubPredictor instead of loading YOLO weights
+    :param canned: Canned result spec for the stub, keyed by weights filename
+    :param exam: Start an exam so that exam steps can fire
+    :param every_frame: Send every frame to every model instead of the configured sampling rate
+    :param images_dir: Where step images are written, a temporary directory by default
+    :param sample_interval: Seconds between CPU/RSS samples
+    """
+    ReplayDecoder.realtime = realtime
+    ReplayDecoder.loop = loop
+
+    images_dir = Path(images_dir or tempfile.mkdtemp(prefix=f"bench_{service_name}_"))
+    images_dir.mkdir(parents=True, exist_ok=True)
+    config = _replay_config(service_name, videos, images_dir, every_frame)
+
+    manager = import_module(f"{service_name}.services.manager").DetectionManager(config)
+    if stub:
+        manager.predictor_class = partial(StubPredictor, canned=canned)
+
+    started = time.monotonic()
+    manager.start()
+    startup_seconds = time.monotonic() - started
+    try:
+        if exam and hasattr(manager, 'set_exam_status'):
+            manager.set_exam_status(True)
+            manager.init_exam_variables()
+
+        processes = {"api": os.getpid()}
+        for i, process in enumerate(manager.stream_manager.processes):
+            processes[f"stream_{i}"] = process.pid
+        for i, process in enumerate(manager.inference_manager.processes):
+            processes[f"inference_{i}"] = process.pid
+        monitor = ProcessMonitor(processes)
+
+        run_start = time.monotonic()
+        frames_start = list(manager.inference_manager.frames_processed)
+        while time.monotonic() - run_start < duration:
+            monitor.sample()
+            time.sleep(sample_interval)
+        monitor.sample()
+        elapsed = time.monotonic() - run_start
+
+        snapshot = manager.metrics.snapshot()
+        worker_stats = manager.inference_manager.get_worker_stats()
+        frames_end = list(manager.inference_manager.frames_processed)
+        steps = _fired_steps(manager)
+
+        # A stop/start cycle reuses the warm inference workers
+        restart_started = time.monotonic()
+        manager.stop()
+        manager.start()
+        restart_seconds = time.monotonic() - restart_started
+    finally:
+        manager.close()
+
+    model_names = [Path(path).name for path in config.weights_paths]
+    stream_names = [stream.rtsp_url for stream in config.stream_configs]
+    return {
+        "service": service_name,
+        "mode": "realtime" if realtime else "unthrottled",
+        "predictor": "stub" if stub else "yolo",
+        "duration_seconds": round(elapsed, 2),
+        "startup_seconds": round(startup_seconds, 2),
+        "restart_seconds": round(restart_seconds, 3),
+        "streams": {
+            f"stream_{i}": {
+                "video": stream_names[i],
+                "decoded_fps": round(data["stages"]["decode"]["count"] / elapsed, 2),
+                **{stage: summary for stage, summary in data["stages"].items()},
+                "drops": data["drops"],
+            }
+            for i, data in snapshot["streams"].items()
+        },
+        "models": {
+            model_names[i]: {
+                "processed_fps": round(data["stages"]["end_to_end"]["count"] / elapsed, 2),
+                **{stage: summary for stage, summary in data["stages"].items()},
+                "drops": data["drops"],
+            }
+            for i, data in snapshot["models"].items()
+        },
+        "workers": {
+            Path(name).name: {**stats, "fps": round((frames_end[i] - frames_start[i]) / elapsed, 2)}
+            for i, (name, stats) in enumerate(worker_stats.items())
+        },
+        "processes": monitor.report(),
+        "steps": steps,
+        "images_dir": str(images_dir),
+    }
+
+
+def format_report(report: dict) -> str:
+    """Human-readable summary of a benchmark report"""
+    def ms(summary: dict, key: str) -> str:
+        return f"{summary[key] * 1000:8.1f}" if key in summary else f"{'-':>8}"
+
+    lines = [
+        f"{report['service']} - {report['mode']} replay, {report['predictor']} predictor, "
+        f"{report['duration_seconds']}s (startup {report['startup_seconds']}s, "
+        f"restart {report['restart_seconds']}s)",
+        "",
+        f"{'stream':<40} {'fps':>8} {'decode p50':>11} {'p95':>8} {'p99':>8}",
+    ]
+    for name, data in report["streams"].items():
+        decode = data["decode"]
+        label = f"{name} {data['video']}"  # Several streams may replay the same video
+        lines.append(f"{label[-40:]:<40} {data['decoded_fps']:8.2f} {ms(decode, 'p50'):>11} "
+                     f"{ms(decode, 'p95')} {ms(decode, 'p99')}")
+
+    lines += ["", f"{'model':<28} {'fps':>8} {'e2e p50':>8} {'p95':>8} {'p99':>8} "
+                  f"{'infer p50':>10} {'wait p50':>9} {'dropped':>8}"]
+    for name, data in report["models"].items():
+        e2e = data["end_to_end"]
+        lines.append(f"{name:<28} {data['processed_fps']:8.2f} {ms(e2e, 'p50')} {ms(e2e, 'p95')} "
+                     f"{ms(e2e, 'p99')} {ms(data['inference'], 'p50'):>10} {ms(data['queue_wait'], 'p50'):>9} "
+                     f"{sum(data['drops'].values()):8d}")
+
+    lines += ["", f"{'process':<20} {'pid':>8} {'cpu %':>8} {'rss MB':>8} {'peak MB':>8}"]
+    for role, data in report["processes"].items():
+        lines.append(f"{role:<20} {data['pid']:8d} {data['cpu_percent']:8.1f} "
+                     f"{data['rss_mb']:8.1f} {data['peak_rss_mb']:8.1f}")
+
+    lines += ["", "steps:"]
+    for name, value in report["steps"].items():
+        lines.append(f"  {name}: {value}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded videos through a detection service")
+    parser.add_argument("service", help="Service name in config.yaml, e.g. basket_k2")
+    parser.add_argument("--video", action="append", required=True,
+                        help="Video file replacing a stream URL, repeat for several streams")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--realtime", action="store_true", help="Pace files at their own frame rate")
+    parser.add_argument("--no-loop", action="store_true", help="Do not restart files at end of file")
+    parser.add_argument("--stub", action="store_true", help="Use canned results instead of YOLO models")
+    parser.add_argument("--canned", help="YAML file with canned results for --stub")
+    parser.add_argument("--no-exam", action="store_true", help="Do not start an exam")
+    parser.add_argument("--every-frame", action="store_true", help="Send every frame to every model")
+    parser.add_argument("--images-dir", help="Directory for step images (default: temporary)")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        args.service, args.video, duration=args.duration, realtime=args.realtime,
+        loop=not args.no_loop, stub=args.stub, canned=load_canned_results(args.canned),
+        exam=not args.no_exam, every_frame=args.every_frame, images_dir=args.images_dir
+    )
+    print(format_report(report))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
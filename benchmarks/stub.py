@@ -0,0 +1,165 @@
+"""
+Stub inference for pipeline benchmarks.
+
+StubPredictor swaps the YOLO models of BaseYOLOPredictor for StubModel instances
+that return canned ultralytics-style results, so the streamer -> predictor ->
+processor chain can be exercised on machines without a GPU or weights files.
+
+Canned results are described per weights filename in a YAML file::
+
+    yolo11l-pose1.pt:
+      names: {0: person}
+      latency_ms: 30          # simulated inference time per frame
+      frames:                 # cycled, one entry per predicted frame
+        - boxes: [[100, 200, 300, 600, 0, 0.9]]   # x1, y1, x2, y2, cls, conf
+          keypoints: [[[150, 250], [160, 260]]]  # one list of (x, y) per box
+        - boxes: []
+    welding_k2.pt:
+      names: {0: welding_components}
+      frames:
+        - masks: [[[10, 10], [200, 10], [200, 200]]]  # polygons in pixels
+          boxes: [[10, 10, 200, 200, 0, 0.8]]
+          probs: {top1: 0}
+
+Models without an entry return empty results: no boxes, masks or keypoints, and
+class 0 (named ``object`` unless ``names`` says otherwise) for classification models.
+"""
+from itertools import cycle
+from pathlib import Path
+from typing import Optional
+import time
+import cv2
+import numpy as np
+import yaml
+
+from shared.services import BaseYOLOPredictor
+
+
+class StubTensor:
+    """numpy-backed stand-in for the torch tensors on ultralytics results"""
+
+    def __init__(self, data):
+        self.data = np.asarray(data, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.data
+
+    def tolist(self):
+        return self.data.tolist()
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+
+class StubBoxes:
+    def __init__(self, rows):
+        rows = np.asarray(rows, dtype=np.float32).reshape(-1, 6)
+        self.data = StubTensor(rows)
+        self.xyxy = StubTensor(rows[:, :4])
+        self.cls = StubTensor(rows[:, 4])
+        self.conf = StubTensor(rows[:, 5])
+
+    def __len__(self):
+        return len(self.data)
+
+
+class StubKeypoints:
+    def __init__(self, points):
+        points = np.asarray(points, dtype=np.float32)
+        self.xy = StubTensor(points.reshape(len(points), -1, 2) if points.size else np.zeros((0, 0, 2)))
+        self.conf = StubTensor(np.ones(self.xy.shape[:2], dtype=np.float32))
+
+
+class StubMasks:
+    def __init__(self, polygons):
+        self.xy = [np.asarray(polygon, dtype=np.float32).reshape(-1, 2) for polygon in polygons]
+
+    def __len__(self):
+        return len(self.xy)
+
+
+class StubProbs:
+    def __init__(self, top1: int = 0, top1conf: float = 1.0):
+        self.top1 = int(top1)
+        self.top1conf = StubTensor(top1conf)
+        self.top5 = [self.top1]
+
+
+class StubResult:
+    """Subset of ``ultralytics.engine.results.Results`` used by the result processors"""
+
+    def __init__(self, orig_img: np.ndarray, names: dict, detections: Optional[dict] = None):
+        detections = detections or {}
+        self.orig_img = orig_img
+        self.orig_shape = orig_img.shape[:2]
+        self.names = names
+        self.boxes = StubBoxes(detections.get('boxes', []))
+        self.keypoints = StubKeypoints(detections['keypoints']) if 'keypoints' in detections else None
+        self.masks = StubMasks(detections['masks']) if detections.get('masks') else None
+        # Classification processors read probs unconditionally, so every result carries one
+        self.probs = StubProbs(**(detections.get('probs') or {}))
+
+    def cpu(self):
+        return self
+
+    def plot(self, *args, **kwargs) -> np.ndarray:
+        return self.orig_img.copy()
+
+    def save(self, filename: str, *args, **kwargs) -> str:
+        cv2.imwrite(str(filename), self.orig_img)
+        return str(filename)
+
+
+class StubModel:
+    """Stand-in for ``ultralytics.YOLO`` that replays canned detections"""
+
+    def __init__(self, spec: Optional[dict] = None):
+        spec = spec or {}
+        self.names = {int(k): v for k, v in spec.get('names', {}).items()} or {0: 'object'}
+        self.latency = float(spec.get('latency_ms', 0.0)) / 1000.0
+        self._frames = cycle(spec.get('frames') or [{}])
+
+    def predict(self, source, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        if self.latency:
+            time.sleep(self.latency * len(frames))
+        return [StubResult(frame, self.names, next(self._frames)) for frame in frames]
+
+
+class StubPredictor(BaseYOLOPredictor):
+    """BaseYOLOPredictor that loads StubModel instances instead of weights files"""
+
+    def __init__(self, *args, canned: Optional[dict] = None, **kwargs):
+        """
+        :param canned: Canned result spec keyed by weights filename, see module docstring
+        """
+        kwargs['model_server_socket'] = None
+        super().__init__(*args, **kwargs)
+        self.canned = canned or {}
+
+    def _load_model(self, weights_path: str, gpu_device=0):
+        return StubModel(self.canned.get(Path(weights_path).name))
+
+    def _warm_up(self, model, predict_kwargs: dict):
+        """Skipped so that canned results are replayed from their first frame"""
+
+
+def load_canned_results(path: Optional[str]) -> dict:
+    """Load a canned result spec, an empty spec makes every model return no detections"""
+    if not path:
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
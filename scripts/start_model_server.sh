@@ -0,0 +1,8 @@
+#!/bin/bash
+
+# Load YAML-based configuration
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+source "${SCRIPT_DIR}/yaml_common.sh"
+
+# Start the shared model server using YAML configuration
+start_model_server "$@"
@@ -93,6 +93,38 @@ start_service() {
     uvicorn "${service_name}.main:app" --host "$host" --port "$port"
 }
 
+start_model_server() {
+    echo "Starting shared model server"
+    
+    # Check YAML configuration
+    check_yaml_config
+    
+    # Activate UV virtual environment
+    activate_uv_env
+    
+    # Change to project directory
+    cd "$PROJECT_DIR" || exit 1
+    
+    # Socket, device and batching come from global.model_server in config.yaml
+    python -m shared.services.model_server "$@"
+}
+
+start_camera_hub() {
+    echo "Starting shared camera hub"
+    
+    # Check YAML configuration
+    check_yaml_config
+    
+    # Activate UV virtual environment
+    activate_uv_env
+    
+    # Change to project directory
+    cd "$PROJECT_DIR" || exit 1
+    
+    # Cameras are the streams with decoder: hub, settings come from global.camera_hub in config.yaml
+    python -m shared.services.camera_hub "$@"
+}
+
 check_and_kill_port() {
     local port="$1"
     
@@ -2,12 +2,20 @@
 通用API端点模板，减少重复代码
 """
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import PlainTextResponse
 from functools import lru_cache
 from typing import Any
-from shared.schemas import StatusResponse, ResetStatusResponse, ExamStatusResponse, WearingStatusResponse
+from shared.schemas import (StatusResponse, ServiceStatusResponse, ResetStatusResponse, ExamStatusResponse,
+                            WearingStatusResponse, StreamHealthResponse, StreamStatusResponse)
+from shared.services import ServiceState
+from shared.utils import redact_url
+import asyncio
 import re
 import time
 
+# 等待拍照请求被推理进程应答时的轮询间隔（秒）
+SNAPSHOT_POLL_INTERVAL = 0.02
+
 
 def create_detection_router(
     service_class,
@@ -16,7 +24,8 @@ def create_detection_router(
     service_name: str = "detection",
     include_reset: bool = True,
     include_exam: bool = True,
-    include_wearing: bool = False
+    include_wearing: bool = False,
+    snapshot_timeout: float = 3.0
 ) -> APIRouter:
     """
     创建标准的检测服务路由器
@@ -29,44 +38,85 @@ def create_detection_router(
         include_reset: 是否包含reset相关端点
         include_exam: 是否包含exam相关端点
         include_wearing: 是否包含wearing相关端点
+        snapshot_timeout: wearing_status等待推理进程保存穿戴图片的最长时间（秒）
     """
     router = APIRouter()
     
     @lru_cache()  # 单例模式
     def get_service():
         return service_class(config)
+
+    async def warm_up_service():
+        """应用启动时加载并预热模型，之后启动检测只需接入视频流"""
+        try:
+            await get_service().warm_up_async()
+        except Exception as e:
+            logger.error(f"Model warm-up failed, models will be loaded on start_detection: {e}")
+
+    async def close_service():
+        """应用退出时停止常驻的推理进程并释放共享内存"""
+        await get_service().close_async()
+
+    router.add_event_handler("startup", warm_up_service)
+    router.add_event_handler("shutdown", close_service)
     
     @router.get("/start_detection", response_model=StatusResponse)
     async def start_detection(service=Depends(get_service)) -> StatusResponse:
         """Start detection service"""
         try:
-            if service.is_running:
+            if service.state in (ServiceState.STARTING, ServiceState.RUNNING):
                 logger.info("Detection already running")
                 return StatusResponse(status="ALREADY_RUNNING")
             
             logger.info("Starting detection service")
-            service.start()
+            await service.start_async()
             return StatusResponse(status="SUCCESS")
         except Exception as e:
             logger.error(f"Detection start failed: {e}")
-            service.stop()
             raise HTTPException(status_code=500, detail=str(e))
 
     @router.get("/stop_detection", response_model=StatusResponse)
     async def stop_detection(service=Depends(get_service)) -> StatusResponse:
         """Stop detection service"""
         try:
-            if not service.is_running:
+            if service.state in (ServiceState.STOPPED, ServiceState.STOPPING):
                 logger.info("No detection running")
                 return StatusResponse(status="NO_DETECTION_RUNNING")
             
             logger.info("Stopping detection service")
-            service.stop()
+            await service.stop_async()
             return StatusResponse(status="SUCCESS")
         except Exception as e:
             logger.error(f"Detection stop failed: {e}")
             raise HTTPException(status_code=500, detail=str(e))
 
+    @router.get("/service_status", response_model=ServiceStatusResponse)
+    async def service_status(wait: float = 0.0, service=Depends(get_service)) -> ServiceStatusResponse:
+        """Lifecycle state of the detection service, optionally waiting up to `wait` seconds for a start/stop to finish"""
+        state = await service.wait_state(wait) if wait > 0 else service.state
+        return ServiceStatusResponse(status=state.value,
+                                     error=service.last_error if state == ServiceState.FAILED else None)
+
+    @router.get("/stream_status", response_model=StreamStatusResponse)
+    async def stream_status(service=Depends(get_service)) -> StreamStatusResponse:
+        """Connection state of every camera stream, unreachable streams keep reconnecting in the background"""
+        streams = [
+            StreamHealthResponse(url=redact_url(stream["url"]), state=stream["state"],
+                                 last_frame_age=stream["last_frame_age"], reconnects=stream["reconnects"],
+                                 decode_ms=stream["decode_ms"])
+            for stream in service.get_stream_status().values()
+        ]
+        return StreamStatusResponse(status="SUCCESS", data=streams)
+
+    @router.get("/metrics", response_class=PlainTextResponse)
+    async def metrics(service=Depends(get_service)) -> PlainTextResponse:
+        """Pipeline latency and throughput metrics in Prometheus text format"""
+        try:
+            return PlainTextResponse(service.get_metrics_text(), media_type="text/plain; version=0.0.4")
+        except Exception as e:
+            logger.error(f"Metrics export failed: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
     if include_reset:
         @router.get("/reset_status", response_model=ResetStatusResponse)
         async def reset_status(service=Depends(get_service)) -> ResetStatusResponse:
@@ -171,28 +221,27 @@ def create_detection_router(
         async def wearing_detection(service=Depends(get_service)) -> StatusResponse:
             """Start wearing detection service"""
             try:
-                if service.is_running:
+                if service.state in (ServiceState.STARTING, ServiceState.RUNNING):
                     logger.info("Detection already running")
                     return StatusResponse(status="ALREADY_RUNNING")
                 
                 logger.info("Starting detection service")
-                service.start()
+                await service.start_async()
                 return StatusResponse(status="SUCCESS")
             except Exception as e:
                 logger.error(f"Detection start failed: {e}")
-                service.stop()
                 raise HTTPException(status_code=500, detail=str(e))
 
         @router.get("/end_wearing_exam", response_model=StatusResponse)
         async def end_wearing_exam(service=Depends(get_service)) -> StatusResponse:
             """Stop wearing detection service"""
             try:
-                if not service.is_running:
+                if service.state in (ServiceState.STOPPED, ServiceState.STOPPING):
                     logger.info("No detection running")
                     return StatusResponse(status="NO_DETECTION_RUNNING")
                 
                 logger.info("Stopping detection service")
-                service.stop()
+                await service.stop_async()
                 return StatusResponse(status="SUCCESS")
             except Exception as e:
                 logger.error(f"Detection stop failed: {e}")
@@ -216,11 +265,17 @@ def create_detection_router(
         async def wearing_status(service=Depends(get_service)) -> WearingStatusResponse:
             """Get examination status"""
             try:
-                service.set_save_img_flag(True)
-                time.sleep(1)  # TODO 寻找更好方法实现
-                
+                # 请求推理进程用下一帧保存图片，异步等待应答，不阻塞事件循环
+                request_id = service.request_wearing_snapshot()
+                image = None
+                deadline = time.monotonic() + snapshot_timeout
+                while request_id is not None and time.monotonic() < deadline:
+                    image = service.get_wearing_snapshot(request_id)
+                    if image is not None:
+                        break
+                    await asyncio.sleep(SNAPSHOT_POLL_INTERVAL)
+
                 wearing_items = service.get_wearing_items()
-                image = service.get_wearing_img()
                 if wearing_items is None or image is None:
                     logger.info("No wearing items or image found")
                     return StatusResponse(status="NONE")
@@ -230,7 +285,7 @@ def create_detection_router(
                     json_array.append({"name": key, "number": value})
 
                 service.init_variables()
-                return WearingStatusResponse(status="SUCCESS", data=json_array, image=image['welding_wearing'])
+                return WearingStatusResponse(status="SUCCESS", data=json_array, image=image)
                 
             except Exception as e:
                 logger.error(f"Status check failed: {e}")
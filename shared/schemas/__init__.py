@@ -1,9 +1,13 @@
 """Shared schema definitions for AI exam projects."""
 
-from .stream import StreamConfig
+from .stream import StreamConfig, RATE_PHASES
 from .server import ServerConfig
+from .model import ModelSettings
 from .response import (
     StatusResponse,
+    ServiceStatusResponse,
+    StreamHealthResponse,
+    StreamStatusResponse,
     ExamStepResponse,
     ExamStatusResponse,
     ResetStepResponse,
@@ -13,8 +17,13 @@ from .response import (
 
 __all__ = [
     "StreamConfig",
+    "RATE_PHASES",
     "ServerConfig",
+    "ModelSettings",
     "StatusResponse",
+    "ServiceStatusResponse",
+    "StreamHealthResponse",
+    "StreamStatusResponse",
     "ExamStepResponse",
     "ExamStatusResponse",
     "ResetStepResponse",
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import Optional, Union
+
+class ModelSettings(BaseModel):
+    """单个模型的推理参数，未设置的字段使用ultralytics默认值"""
+    conf: float = 0.6  # 置信度阈值
+    iou: Optional[float] = None  # NMS的IoU阈值
+    classes: Optional[list[int]] = None  # 只保留指定类别
+    imgsz: Optional[Union[int, list[int]]] = None  # 网络输入分辨率，越小推理越快
+    half: bool = False  # FP16推理，仅在GPU上生效
+    max_det: Optional[int] = None  # 每帧最大检测数量
+    target_fps: Optional[float] = None  # 送入该模型的目标帧率，未设置时使用视频流的target_fps
+
+    def predict_kwargs(self, device: str) -> dict:
+        """编译为model.predict的关键字参数，在推理进程启动时调用一次"""
+        kwargs = {"verbose": False, "conf": self.conf, "device": device}
+        for key in ("iou", "classes", "imgsz", "max_det"):
+            value = getattr(self, key)
+            if value is not None:
+                kwargs[key] = value
+        if self.half and device != 'cpu':
+            kwargs["half"] = True
+        return kwargs
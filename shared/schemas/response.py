@@ -5,6 +5,22 @@ class StatusResponse(BaseModel):
     """基础状态响应模型"""
     status: str
 
+class ServiceStatusResponse(StatusResponse):
+    """服务生命周期状态响应模型"""
+    error: Optional[str] = None  # 最近一次启动失败的原因
+
+class StreamHealthResponse(BaseModel):
+    """单个视频流的健康状态"""
+    url: str  # 已去掉账号密码
+    state: str  # connecting / connected / reconnecting / stopped
+    last_frame_age: Optional[float] = None  # 距最近一帧的秒数，从未收到帧时为None
+    reconnects: int = 0
+    decode_ms: float = 0.0
+
+class StreamStatusResponse(StatusResponse):
+    """视频流健康状态响应模型"""
+    data: list[StreamHealthResponse] = []
+
 class ResetStepResponse(BaseModel):
     """复位步骤响应模型"""
     resetStep: str
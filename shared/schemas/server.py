@@ -1,18 +1,29 @@
 from pydantic import BaseModel, field_validator
 from pathlib import Path
-from typing import Union
+from typing import Optional, Union
 from .stream import StreamConfig
+from .model import ModelSettings
 
 class ServerConfig(BaseModel):
     """检测服务配置"""
     server_ip: str
     server_port: int
     weights_paths: list[str]
+    model_settings: list[ModelSettings] = []  # 与weights_paths一一对应的推理参数
     images_dir: Path
     img_url_path: str
     static_mount_path: str
     stream_configs: list[StreamConfig]
     gpu_device: Union[int, str] = 0  # GPU device ID or 'cpu' for CPU mode
+    inference_mode: str = 'per_model'  # 'per_model' or 'batched'
+    batch_size: int = 8  # Max frames per model in one predict call (batched mode)
+    batch_wait_ms: float = 20.0  # Max wait for a batch to fill (batched mode)
+    model_server_socket: Optional[str] = None  # Unix socket of the shared model server, None loads models locally
+    frame_delivery: str = 'queue'  # 'queue' or 'mailbox' (newest frame only per model)
+    max_frame_age: Optional[float] = None  # Seconds after capture beyond which frames are skipped
+    stream_startup_timeout: Optional[float] = 15.0  # Max seconds start waits for cameras, None waits for all
+    warm_pool: bool = True  # Keep inference workers and loaded models alive across stop/start
+    model_heartbeat: Optional[float] = 1.0  # Seconds between frames for models with no pending step, None runs all frames
 
     @field_validator('images_dir')
     def validate_images_dir(cls, v):
@@ -27,3 +38,15 @@ class ServerConfig(BaseModel):
         if isinstance(v, int) and v < 0:
             raise ValueError("GPU device ID must be non-negative")
         return v
+
+    @field_validator('inference_mode')
+    def validate_inference_mode(cls, v):
+        if v not in ('per_model', 'batched'):
+            raise ValueError("Inference mode must be 'per_model' or 'batched'")
+        return v
+
+    @field_validator('frame_delivery')
+    def validate_frame_delivery(cls, v):
+        if v not in ('queue', 'mailbox'):
+            raise ValueError("Frame delivery must be 'queue' or 'mailbox'")
+        return v
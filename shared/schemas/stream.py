@@ -1,4 +1,8 @@
 from pydantic import BaseModel
+from typing import Optional
+
+# 各自有一套帧率配置的考试阶段：空闲、复位检查、考试进行中
+RATE_PHASES = ("idle", "reset", "exam")
 
 class StreamConfig(BaseModel):
     """流配置"""
@@ -6,3 +10,13 @@ class StreamConfig(BaseModel):
     queue_size: int = 100
     frame_skip: int = 10
     target_models: set[int]
+    buffer_slots: int = 8  # 共享内存环形缓冲区的帧槽数量
+    max_frame_shape: tuple[int, int, int] = (1440, 2560, 3)  # 单个帧槽可容纳的最大帧 (h, w, c)
+    decoder: str = 'opencv'  # 解码后端: opencv / pyav / hub（从共享摄像头服务读取）
+    keyframes_only: bool = False  # 只解码关键帧（仅pyav支持），适用于低帧率的考核检测
+    target_fps: Optional[float] = None  # 按采集时间采样的目标帧率，未设置时按frame_skip跳帧
+    model_fps: dict[int, float] = {}  # 单个模型的目标帧率，覆盖target_fps
+    change_threshold: Optional[float] = None  # 画面变化像素比例低于该值时不送入change_models，None表示不做变化检测
+    change_refresh: float = 5.0  # 画面没有变化时，至少每隔多少秒仍送入一帧
+    change_models: set[int] = set()  # 受变化检测控制的模型，其余模型照常接收帧
+    phase_fps: dict[str, dict[int, float]] = {}  # 各考试阶段(idle/reset/exam)下每个模型的目标帧率，未列出的模型使用上面的帧率
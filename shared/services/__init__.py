@@ -3,11 +3,32 @@
 from .streamer import BaseVideoStreamer
 from .predictor import BaseYOLOPredictor
 from .processor import BaseResultProcessor
-from .manager import BaseDetectionManager
+from .manager import BaseDetectionManager, ServiceState
+from .frame_buffer import SharedFrameRing, FrameRef, FrameMailbox
+from .decoders import BaseDecoder, create_decoder, DECODER_BACKENDS
+from .metrics import PipelineMetrics
+from .state import SharedStateDict, SharedStateList, SharedFlags, SnapshotChannel
+from .image_writer import StepImageWriter
+from .sampler import RateController, RATE_PHASES
 
 __all__ = [
     "BaseVideoStreamer",
     "BaseYOLOPredictor",
     "BaseResultProcessor",
-    "BaseDetectionManager"
+    "BaseDetectionManager",
+    "ServiceState",
+    "SharedFrameRing",
+    "FrameRef",
+    "FrameMailbox",
+    "BaseDecoder",
+    "create_decoder",
+    "DECODER_BACKENDS",
+    "PipelineMetrics",
+    "SharedStateDict",
+    "SharedStateList",
+    "SharedFlags",
+    "SnapshotChannel",
+    "StepImageWriter",
+    "RateController",
+    "RATE_PHASES"
 ]
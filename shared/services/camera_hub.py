@@ -0,0 +1,156 @@
+"""
+Camera hub shared by all services on a host.
+
+Several services watch the same physical cameras. Without the hub every stream
+process opens its own RTSP session and decodes the same H.264 stream again. The
+hub opens each distinct camera URL once, decodes it in one process per camera and
+publishes the frames into a named shared-memory ring (see ``hub_ring_name``).
+Services subscribe with ``decoder: hub`` on a stream (or in ``defaults``) and read
+that ring instead of dialling the camera.
+
+Start it with ``python -m shared.services.camera_hub`` (see scripts/start_camera_hub.sh)
+before the services; subscribers reconnect with back-off until the hub publishes.
+"""
+from multiprocessing import Process, Event
+from typing import Dict, Optional, Tuple
+import argparse
+import logging
+import signal
+import time
+
+from .decoders import create_decoder, hub_ring_name, HubDecoder
+from .frame_buffer import SharedFrameRing
+from .sampler import FrameSampler
+
+logger = logging.getLogger("shared_services")
+
+
+class CameraHub:
+    MAX_RECONNECT_DELAY = 60.0
+
+    def __init__(self, cameras: Dict[str, bool], decoder: str = "opencv", target_fps: Optional[float] = None,
+                 buffer_slots: int = 8, max_frame_shape: Tuple[int, int, int] = (1440, 2560, 3),
+                 custom_logger=None):
+        """
+        :param cameras: Camera URL -> whether decoding key frames only is enough for every subscriber
+        :param decoder: Decoder backend the hub opens cameras with (opencv or pyav)
+        :param target_fps: Frames per second published per camera, None publishes every frame;
+                           must be at least the highest rate any subscriber samples at
+        :param buffer_slots: Frame slots per camera ring
+        :param max_frame_shape: Largest decoded frame (h, w, c) a slot can hold
+        :param custom_logger: Optional custom logger
+        """
+        if decoder == HubDecoder.name:
+            raise ValueError("The camera hub cannot subscribe to itself, use opencv or pyav")
+        self.cameras = cameras
+        self.decoder = decoder
+        self.target_fps = target_fps
+        self.buffer_slots = buffer_slots
+        self.max_frame_shape = tuple(max_frame_shape)
+        self.logger = custom_logger or logger
+
+        self.rings: Dict[str, SharedFrameRing] = {}
+        self.processes = []
+        self._stop_event = Event()
+
+    def serve_forever(self):
+        """Publish every camera until stop() is called or the process receives SIGTERM/SIGINT"""
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        try:
+            for url, keyframes_only in self.cameras.items():
+                try:
+                    ring = SharedFrameRing(self.buffer_slots, self.max_frame_shape, name=hub_ring_name(url))
+                except FileExistsError:
+                    raise RuntimeError(f"Ring {hub_ring_name(url)} for {url} already exists, "
+                                       f"is another camera hub running?")
+                self.rings[url] = ring
+                process = Process(target=self._publish, args=(url, keyframes_only, ring), daemon=True)
+                process.start()
+                self.processes.append(process)
+            self.logger.info(f"Camera hub publishing {len(self.cameras)} cameras with the {self.decoder} decoder")
+            while not self._stop_event.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def close(self):
+        """Stop the camera processes and unlink the rings, which the hub owns"""
+        self._stop_event.set()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.processes.clear()
+        for ring in self.rings.values():
+            ring.close()
+            ring.unlink()
+        self.rings.clear()
+        self.logger.info("Camera hub stopped")
+
+    def _publish(self, url: str, keyframes_only: bool, ring: SharedFrameRing):
+        """Decode one camera into its ring, reconnecting with exponential back-off"""
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # The parent stops us through the stop event
+        sampler = FrameSampler(self.target_fps)
+        reconnect_delay = 1.0
+        while not self._stop_event.is_set():
+            try:
+                with create_decoder(self.decoder, url, keyframes_only=keyframes_only,
+                                    custom_logger=self.logger) as decoder:
+                    self.logger.info(f"Camera hub connected to {url}")
+                    reconnect_delay = 1.0
+                    while not self._stop_event.is_set():
+                        if not decoder.grab():
+                            self.logger.warning(f"Failed to grab frame from {url}")
+                            break
+                        capture_time = decoder.last_capture_time
+                        if not sampler.due(capture_time):
+                            continue  # Skip frame without expensive decoding
+                        frame = decoder.retrieve()
+                        if frame is None:
+                            continue
+                        if not ring.fits(frame):
+                            self.logger.error(f"Frame {frame.shape} from {url} exceeds "
+                                              f"max_frame_shape {ring.max_shape}, dropped")
+                            continue
+                        ring.write(frame, capture_time)
+                        sampler.mark(capture_time)
+            except ConnectionError as e:
+                self.logger.error(f"Connection error for {url}: {e}")
+            except Exception as e:
+                self.logger.error(f"Unexpected error in camera {url}: {e}")
+
+            if not self._stop_event.is_set():
+                self.logger.info(f"Reconnecting to {url} in {reconnect_delay:.1f}s")
+                self._stop_event.wait(reconnect_delay)
+                reconnect_delay = min(reconnect_delay * 2, self.MAX_RECONNECT_DELAY)
+
+
+def main():
+    from shared.utils.config import config_manager
+
+    global_config = config_manager.get_global_config()
+    hub_config = global_config.get('camera_hub', {})
+    defaults = global_config.get('defaults', {})
+    parser = argparse.ArgumentParser(description="Shared camera hub for AI exam services")
+    parser.add_argument("--decoder", default=hub_config.get('decoder', 'opencv'))
+    parser.add_argument("--target-fps", type=float, default=hub_config.get('target_fps'))
+    parser.add_argument("--buffer-slots", type=int,
+                        default=hub_config.get('buffer_slots', defaults.get('buffer_slots', 8)))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    cameras = config_manager.get_hub_cameras()
+    if not cameras:
+        logger.warning("No stream uses the hub decoder, nothing to publish")
+        return
+    max_frame_shape = hub_config.get('max_frame_shape', defaults.get('max_frame_shape', (1440, 2560, 3)))
+    CameraHub(cameras, args.decoder, args.target_fps, args.buffer_slots, max_frame_shape).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+
+
+class ChangeDetector:
+    """
+    Cheap scene-change test for one stream.
+
+    Each frame is shrunk to a small grayscale thumbnail (area averaging also
+    smooths out sensor noise and compression artefacts) and compared with the
+    thumbnail of the last frame that was let through. The frame counts as
+    changed when the fraction of thumbnail pixels whose brightness moved by more
+    than ``PIXEL_DELTA`` reaches ``threshold``. Comparing against the last
+    accepted frame rather than the previous one also catches slow changes.
+    A frame is let through at least every ``refresh_interval`` seconds so that
+    models still see a static scene now and then.
+    """
+
+    # Thumbnail size (width, height), 16:9 like the cameras
+    THUMBNAIL_SIZE = (64, 36)
+    # Brightness change (0-255) for a thumbnail pixel to count as changed
+    PIXEL_DELTA = 25
+
+    def __init__(self, threshold: float, refresh_interval: float = 5.0,
+                 thumbnail_size: Optional[Tuple[int, int]] = None):
+        """
+        :param threshold: Fraction (0-1) of changed thumbnail pixels that makes a frame count as changed
+        :param refresh_interval: Seconds after which a frame is let through even if nothing changed
+        :param thumbnail_size: Thumbnail size (width, height), THUMBNAIL_SIZE by default
+        """
+        self.threshold = threshold
+        self.refresh_interval = refresh_interval
+        self.thumbnail_size = tuple(thumbnail_size or self.THUMBNAIL_SIZE)
+        self._reference: Optional[np.ndarray] = None
+        self._reference_time = 0.0
+        self.last_score = 0.0
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, self.thumbnail_size, interpolation=cv2.INTER_AREA)
+
+    def changed(self, frame: np.ndarray, timestamp: float) -> bool:
+        """
+        Whether a frame captured at ``timestamp`` differs enough from the last accepted frame;
+        accepted frames become the new reference
+        """
+        thumbnail = self._thumbnail(frame)
+        if self._reference is None or timestamp - self._reference_time >= self.refresh_interval:
+            self.last_score = 1.0
+        else:
+            moved = cv2.absdiff(thumbnail, self._reference) > self.PIXEL_DELTA
+            self.last_score = float(np.count_nonzero(moved)) / moved.size
+            if self.last_score < self.threshold:
+                return False
+        self._reference = thumbnail
+        self._reference_time = timestamp
+        return True
@@ -0,0 +1,236 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Dict, Type
+import logging
+import time
+import hashlib
+import cv2
+import numpy as np
+from .frame_buffer import SharedFrameRing
+
+# Use basic logging if specific logger not provided
+logger = logging.getLogger("shared_services")
+
+
+class BaseDecoder(ABC):
+    """
+    Common interface of the video decoding backends used by BaseVideoStreamer.
+
+    ``grab`` advances to the next frame as cheaply as the backend allows and
+    ``retrieve`` returns the current frame as a BGR ndarray. Time spent decoding
+    the last retrieved frame (grab + retrieve) is reported in ``last_decode_time``
+    and the wall-clock time the last frame was grabbed in ``last_capture_time``.
+    """
+
+    name = "base"
+
+    def __init__(self, url: str, keyframes_only: bool = False, custom_logger=None):
+        """
+        :param url: RTSP URL or video file path
+        :param keyframes_only: Decode only key frames when the backend supports it
+        :param custom_logger: Optional custom logger
+        """
+        self.url = url
+        self.keyframes_only = keyframes_only
+        self.logger = custom_logger or logger
+        self.last_decode_time = 0.0
+        self.last_capture_time = 0.0
+        self._grab_time = 0.0
+
+    @abstractmethod
+    def open(self):
+        """Open the source, raise ConnectionError on failure"""
+
+    @abstractmethod
+    def _grab(self) -> bool:
+        pass
+
+    @abstractmethod
+    def _retrieve(self) -> Optional[np.ndarray]:
+        pass
+
+    @abstractmethod
+    def release(self):
+        pass
+
+    def grab(self) -> bool:
+        self.last_capture_time = time.time()
+        start = time.perf_counter()
+        ret = self._grab()
+        self._grab_time = time.perf_counter() - start
+        return ret
+
+    def retrieve(self) -> Optional[np.ndarray]:
+        start = time.perf_counter()
+        frame = self._retrieve()
+        self.last_decode_time = self._grab_time + time.perf_counter() - start
+        return frame
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class OpenCVDecoder(BaseDecoder):
+    """cv2.VideoCapture backend (FFmpeg under the hood), the historical default"""
+
+    name = "opencv"
+
+    def __init__(self, url: str, keyframes_only: bool = False, custom_logger=None):
+        super().__init__(url, keyframes_only, custom_logger)
+        self.cap = None
+        if keyframes_only:
+            self.logger.warning(f"opencv decoder cannot skip non-key frames, decoding all frames of {url}")
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.url)
+        if not self.cap.isOpened():
+            self.release()
+            raise ConnectionError(f"Failed to open stream: {self.url}")
+
+        # Set capture properties for better performance
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Reduce buffer to minimize latency
+        self.cap.set(cv2.CAP_PROP_FPS, 30)  # Set desired FPS
+
+    def _grab(self) -> bool:
+        return self.cap.grab()
+
+    def _retrieve(self) -> Optional[np.ndarray]:
+        ret, frame = self.cap.retrieve()
+        return frame if ret else None
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class PyAVDecoder(BaseDecoder):
+    """
+    PyAV/FFmpeg backend with frame-threaded decoding and an optional
+    keyframe-only mode (the codec skips all non-key frames)
+    """
+
+    name = "pyav"
+    OPEN_TIMEOUT = 10.0
+    READ_TIMEOUT = 10.0
+
+    def __init__(self, url: str, keyframes_only: bool = False, custom_logger=None):
+        super().__init__(url, keyframes_only, custom_logger)
+        self.container = None
+        self._frames = None
+        self._current = None
+
+    def open(self):
+        try:
+            import av
+        except ImportError as e:
+            raise ImportError("pyav decoder requires the 'av' package: uv pip install av") from e
+
+        options = {'rtsp_transport': 'tcp'} if self.url.startswith('rtsp://') else {}
+        try:
+            self.container = av.open(self.url, options=options,
+                                     timeout=(self.OPEN_TIMEOUT, self.READ_TIMEOUT))
+        except Exception as e:
+            raise ConnectionError(f"Failed to open stream: {self.url}: {e}")
+
+        stream = self.container.streams.video[0]
+        stream.thread_type = 'AUTO'  # Let FFmpeg decode with frame + slice threads
+        if self.keyframes_only:
+            stream.codec_context.skip_frame = 'NONKEY'
+        self._frames = self.container.decode(stream)
+
+    def _grab(self) -> bool:
+        try:
+            self._current = next(self._frames)
+            return True
+        except Exception:
+            self._current = None
+            return False
+
+    def _retrieve(self) -> Optional[np.ndarray]:
+        if self._current is None:
+            return None
+        return self._current.to_ndarray(format='bgr24')
+
+    def release(self):
+        self._frames = None
+        self._current = None
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+
+
+def hub_ring_name(url: str) -> str:
+    """Name of the shared-memory ring the camera hub publishes a camera URL to"""
+    return "ai_exam_cam_" + hashlib.sha1(url.encode()).hexdigest()[:16]
+
+
+class HubDecoder(BaseDecoder):
+    """
+    Subscriber of the camera hub (shared/services/camera_hub.py). The hub opens each
+    camera once and decodes it into a named shared-memory ring; this backend reads
+    that ring instead of opening another session to the camera. Capture times are the
+    hub's, decode time is only the copy out of the ring.
+    """
+
+    name = "hub"
+    # The stream counts as lost when the hub publishes no new frame for this long
+    READ_TIMEOUT = 10.0
+    POLL_INTERVAL = 0.005
+
+    def __init__(self, url: str, keyframes_only: bool = False, custom_logger=None):
+        super().__init__(url, keyframes_only, custom_logger)
+        self.ring: Optional[SharedFrameRing] = None
+        self._seq = 0
+
+    def open(self):
+        try:
+            self.ring = SharedFrameRing.attach(hub_ring_name(self.url))
+        except FileNotFoundError:
+            raise ConnectionError(f"Camera hub is not publishing {self.url}")
+        self._seq = self.ring.latest_seq  # Only frames published after subscribing
+
+    def grab(self) -> bool:
+        ret = super().grab()
+        self._grab_time = 0.0  # Waiting for the hub is not decoding
+        if ret:
+            timestamp = self.ring.timestamp(self._seq % self.ring.slots, self._seq)
+            if timestamp:
+                self.last_capture_time = timestamp
+        return ret
+
+    def _grab(self) -> bool:
+        deadline = time.monotonic() + self.READ_TIMEOUT
+        while self.ring.latest_seq == self._seq:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.POLL_INTERVAL)
+        self._seq = self.ring.latest_seq
+        return True
+
+    def _retrieve(self) -> Optional[np.ndarray]:
+        # None when the hub has already overwritten the slot
+        return self.ring.read(self._seq % self.ring.slots, self._seq)
+
+    def release(self):
+        if self.ring is not None:
+            self.ring.close()  # The hub owns the ring, never unlink it here
+            self.ring = None
+
+
+DECODER_BACKENDS: Dict[str, Type[BaseDecoder]] = {
+    OpenCVDecoder.name: OpenCVDecoder,
+    PyAVDecoder.name: PyAVDecoder,
+    HubDecoder.name: HubDecoder,
+}
+
+
+def create_decoder(backend: str, url: str, keyframes_only: bool = False, custom_logger=None) -> BaseDecoder:
+    """Instantiate a decoder backend by name"""
+    if backend not in DECODER_BACKENDS:
+        raise ValueError(f"Unknown decoder backend '{backend}', available: {list(DECODER_BACKENDS)}")
+    return DECODER_BACKENDS[backend](url, keyframes_only=keyframes_only, custom_logger=custom_logger)
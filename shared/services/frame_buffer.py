@@ -0,0 +1,211 @@
+from multiprocessing import shared_memory, resource_tracker, Condition, RawArray, RawValue
+from queue import Empty
+from typing import NamedTuple, Optional, Tuple
+import numpy as np
+
+
+class FrameRef(NamedTuple):
+    """Lightweight handle passed through frame queues instead of the frame itself"""
+    stream: int
+    slot: int
+    seq: int
+    timestamp: float = 0.0  # Wall-clock time the frame was grabbed
+    decoded: float = 0.0  # Wall-clock time decoding finished
+    enqueued: float = 0.0  # Wall-clock time the reference was handed to the model queues
+
+
+class SharedFrameRing:
+    """
+    Fixed-size ring of frame slots backed by ``multiprocessing.shared_memory``.
+
+    A single stream process writes decoded frames into the ring and hands out
+    ``(slot, seq)`` pairs; consumers read the slot back and use the sequence
+    number to detect that the slot has been reused in the meantime. Once the
+    writer wraps around, the oldest frames are overwritten, which gives the
+    same drop-oldest behaviour as a full frame queue.
+
+    A ring can also be opened by name from an unrelated process (see ``attach``),
+    which is how the camera hub publishes frames to the services.
+
+    Memory layout: ``[latest_seq, slots, max_h, max_w, max_c | slot headers (seq, h, w, c, timestamp_us) * slots
+    | slot data]``
+    """
+
+    META_FIELDS = 5  # latest_seq, slots, max height, max width, max channels
+    HEADER_FIELDS = 5  # seq, height, width, channels, capture timestamp in microseconds
+
+    def __init__(self, slots: int, max_shape: Tuple[int, int, int],
+                 name: Optional[str] = None, create: bool = True):
+        """
+        :param slots: Number of frame slots in the ring
+        :param max_shape: Largest frame shape (h, w, c) a slot can hold
+        :param name: Shared memory block name, generated when creating if omitted
+        :param create: Create a new block or attach to an existing one by name
+        """
+        if slots < 1:
+            raise ValueError("Frame ring needs at least one slot")
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+        self.slot_bytes = int(np.prod(self.max_shape))
+        self._header_len = self.META_FIELDS + slots * self.HEADER_FIELDS
+        header_bytes = self._header_len * np.dtype(np.int64).itemsize
+
+        self._shm = shared_memory.SharedMemory(
+            name=name, create=create, size=header_bytes + slots * self.slot_bytes
+        )
+        if not create:
+            # Before Python 3.13 every process that opens a block by name registers it with
+            # its resource tracker, which unlinks the block when that process exits and
+            # would pull the ring away from its owner and the other readers
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        self._header = np.ndarray((self._header_len,), dtype=np.int64, buffer=self._shm.buf)
+        self._data = np.ndarray((slots, self.slot_bytes), dtype=np.uint8,
+                                buffer=self._shm.buf, offset=header_bytes)
+        if create:
+            self._header[:] = 0
+            self._header[1:self.META_FIELDS] = (slots, *self.max_shape)
+            self._header[self.META_FIELDS::self.HEADER_FIELDS] = -1  # no slot holds a valid frame yet
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedFrameRing":
+        """
+        Open an existing ring by name, reading its layout from the block itself
+        :raise FileNotFoundError: No ring with this name exists
+        """
+        probe = shared_memory.SharedMemory(name=name)
+        try:
+            resource_tracker.unregister(probe._name, "shared_memory")
+            meta = np.ndarray((cls.META_FIELDS,), dtype=np.int64, buffer=probe.buf).copy()
+        finally:
+            probe.close()
+        return cls(int(meta[1]), tuple(int(v) for v in meta[2:]), name=name, create=False)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def latest_seq(self) -> int:
+        """Sequence number of the most recently written frame (0 before the first write)"""
+        return int(self._header[0])
+
+    def _slot_header(self, slot: int) -> np.ndarray:
+        start = self.META_FIELDS + slot * self.HEADER_FIELDS
+        return self._header[start:start + self.HEADER_FIELDS]
+
+    def fits(self, frame: np.ndarray) -> bool:
+        return frame.dtype == np.uint8 and frame.nbytes <= self.slot_bytes
+
+    def write(self, frame: np.ndarray, timestamp: float = 0.0) -> Tuple[int, int]:
+        """
+        Copy a frame into the next slot. Must only be called from the single writer process.
+        :param timestamp: Wall-clock capture time of the frame, stored for readers of the ring
+        :return: (slot, seq) identifying the written frame
+        """
+        if not self.fits(frame):
+            raise ValueError(f"Frame {frame.shape} {frame.dtype} does not fit slot shape {self.max_shape}")
+
+        seq = self.latest_seq + 1
+        slot = seq % self.slots
+        header = self._slot_header(slot)
+        header[0] = -1  # invalidate while the slot is being rewritten
+
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        self._data[slot, :frame.nbytes] = np.ascontiguousarray(frame).reshape(-1)
+        header[1:] = (height, width, channels, int(timestamp * 1e6))
+        header[0] = seq
+        self._header[0] = seq
+        return slot, seq
+
+    def read(self, slot: int, seq: int) -> Optional[np.ndarray]:
+        """
+        Copy a frame out of the ring.
+        :return: The frame, or None if the slot has been overwritten since ``seq`` was written
+        """
+        header = self._slot_header(slot)
+        if header[0] != seq:
+            return None
+
+        height, width, channels = (int(v) for v in header[1:4])
+        size = height * width * channels
+        frame = self._data[slot, :size].copy()
+
+        # Seqlock check: the writer may have reused the slot while we were copying
+        if header[0] != seq:
+            return None
+
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        return frame.reshape(shape)
+
+    def timestamp(self, slot: int, seq: int) -> Optional[float]:
+        """Capture time stored with a frame, or None if the slot no longer holds ``seq``"""
+        header = self._slot_header(slot)
+        timestamp = header[4] / 1e6
+        return timestamp if header[0] == seq else None
+
+    def close(self):
+        """Release this process's mapping of the ring"""
+        self._header = None
+        self._data = None
+        try:
+            self._shm.close()
+        except Exception:
+            pass
+
+    def unlink(self):
+        """Destroy the shared memory block, called once by the owner"""
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class FrameMailbox:
+    """
+    Single-entry frame delivery channel holding only the newest FrameRef.
+
+    Exposes the subset of the ``multiprocessing.Queue`` interface used by the
+    streamer and predictor, so it can replace a frame queue. ``put_nowait``
+    atomically overwrites an unconsumed frame instead of queueing behind it,
+    which bounds the latency between capture and inference to one frame.
+    """
+
+    _maxsize = 1
+
+    def __init__(self):
+        self._cond = Condition()
+        self._ref = RawArray('q', 3)  # stream, slot, seq
+        self._times = RawArray('d', 3)  # timestamp, decoded, enqueued
+        self._version = RawValue('Q', 0)  # bumped on every put
+        self._taken = RawValue('Q', 0)  # version of the last consumed frame
+        self.overwritten = RawValue('Q', 0)  # frames replaced before anyone consumed them
+
+    def _pending(self) -> bool:
+        return self._version.value != self._taken.value
+
+    def put_nowait(self, ref: FrameRef):
+        with self._cond:
+            if self._pending():
+                self.overwritten.value += 1
+            self._ref[0], self._ref[1], self._ref[2] = ref.stream, ref.slot, ref.seq
+            self._times[0], self._times[1], self._times[2] = ref.timestamp, ref.decoded, ref.enqueued
+            self._version.value += 1
+            self._cond.notify()
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> FrameRef:
+        with self._cond:
+            if not self._pending():
+                if not block or not self._cond.wait_for(self._pending, timeout):
+                    raise Empty
+            self._taken.value = self._version.value
+            return FrameRef(self._ref[0], self._ref[1], self._ref[2], *self._times)
+
+    def get_nowait(self) -> FrameRef:
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        return 1 if self._pending() else 0
+
+    def empty(self) -> bool:
+        return not self._pending()
@@ -0,0 +1,127 @@
+from multiprocessing import Value
+from queue import Queue, Full, Empty
+from threading import Thread
+from typing import Optional
+import logging
+import os
+import time
+
+# Use basic logging if specific logger not provided
+logger = logging.getLogger("shared_services")
+
+
+class StepImageWriter:
+    """
+    Background writer for step images.
+
+    ``submit`` hands an ultralytics result and a target path to a writer thread,
+    which draws the annotations, encodes the JPEG and writes the file, so the
+    inference worker can publish the image URL and move on to the next frame.
+    The thread is started lazily in every process that submits (threads do not
+    survive fork). When the bounded queue is full the image is written inline
+    instead, so no step image is ever lost.
+    """
+
+    MAX_PENDING = 16
+    FLUSH_TIMEOUT = 2.0
+
+    def __init__(self, max_pending: Optional[int] = None, custom_logger=None):
+        """
+        :param max_pending: Images that may wait in the queue of one process before writes become inline
+        :param custom_logger: Optional custom logger
+        """
+        self.max_pending = max_pending or self.MAX_PENDING
+        self.logger = custom_logger or logger
+        # Shared across processes so the API process can report them
+        self._backlog = Value('i', 0)
+        self._written = Value('Q', 0)
+        self._failed = Value('Q', 0)
+        self._inline = Value('Q', 0)
+
+        self._queue: Optional[Queue] = None
+        self._thread: Optional[Thread] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def backlog(self) -> int:
+        """Images submitted but not yet written, over all processes"""
+        return self._backlog.value
+
+    def get_stats(self) -> dict:
+        return {
+            "backlog": self._backlog.value,
+            "written": self._written.value,
+            "failed": self._failed.value,
+            "inline": self._inline.value
+        }
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        self._queue = Queue(maxsize=self.max_pending)
+        self._thread = Thread(target=self._run, name="step-image-writer", daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+
+    def submit(self, result, imgpath: str) -> bool:
+        """
+        Queue an image for writing
+        :return: False if the queue was full and the image was written inline
+        """
+        self._ensure_started()
+        with self._backlog.get_lock():
+            self._backlog.value += 1
+        try:
+            self._queue.put_nowait((result, imgpath))
+            return True
+        except Full:
+            self.logger.warning(f"Step image queue full, writing {imgpath} inline")
+            with self._inline.get_lock():
+                self._inline.value += 1
+            self._write(result, imgpath)
+            return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            self._write(*item)
+
+    def _write(self, result, imgpath: str):
+        try:
+            result.save(imgpath)  # Annotate, encode and write
+            with self._written.get_lock():
+                self._written.value += 1
+        except Exception as e:
+            self.logger.error(f"Failed to save step image {imgpath}: {e}")
+            with self._failed.get_lock():
+                self._failed.value += 1
+        finally:
+            with self._backlog.get_lock():
+                self._backlog.value -= 1
+
+    def flush(self, timeout: Optional[float] = None):
+        """Write out the images queued by this process and stop its writer thread"""
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        timeout = self.FLUSH_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(None, timeout=timeout)
+        except Full:
+            pass
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        if self._thread.is_alive():
+            pending = self._queue.qsize()
+            self.logger.warning(f"Step image writer did not finish in {timeout}s, {pending} images pending")
+            # Drain so the shared backlog does not count images that will never be written
+            try:
+                while True:
+                    if self._queue.get_nowait() is not None:
+                        with self._backlog.get_lock():
+                            self._backlog.value -= 1
+            except Empty:
+                pass
+        self._thread = None
+        self._pid = None
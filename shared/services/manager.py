@@ -1,14 +1,36 @@
 #from typing import Optional, Type, Any
+import asyncio
 import logging
+import time
+from enum import Enum
+from pathlib import Path
+from typing import Optional
 from ..schemas import ServerConfig
-from .streamer import BaseVideoStreamer
+from ..utils import redact_url
+from .streamer import BaseVideoStreamer, CONNECTED
 from .predictor import BaseYOLOPredictor
 from .processor import BaseResultProcessor
+from .metrics import PipelineMetrics
+from .sampler import RateController
+
+class ServiceState(str, Enum):
+    """检测服务生命周期状态"""
+    STOPPED = "STOPPED"
+    STARTING = "STARTING"
+    RUNNING = "RUNNING"
+    STOPPING = "STOPPING"
+    FAILED = "FAILED"
+
 
 class BaseDetectionManager:
     """
     检测管理器基类，提供通用的检测服务管理功能
     """
+
+    # 推理管理器类，基准测试等场景可替换为桩实现
+    predictor_class = BaseYOLOPredictor
+    # 等待生命周期状态稳定时的轮询间隔（秒）
+    STATE_POLL_INTERVAL = 0.1
     
     def __init__(self, 
                  config: ServerConfig, 
@@ -23,10 +45,15 @@ class BaseDetectionManager:
             logger: 日志记录器，如不提供则创建默认logger
         """
         self.config = config
-        self.is_running = False
+        self.state = ServiceState.STOPPED
+        self.last_error: Optional[str] = None
+        # 同一时刻只允许一个启动/停止过程
+        self._lifecycle_lock = asyncio.Lock()
         self.stream_manager = None
         self.inference_manager = None
         self.result_processor = None
+        self.metrics = None
+        self.rate_controller = None
 
         self.processor_class = processor_class
         self.logger = logger or logging.getLogger(__name__)
@@ -41,48 +68,230 @@ class BaseDetectionManager:
             self.config.img_url_path
             )
             
+            # 各阶段延迟与丢帧统计，由视频流进程和推理进程写入共享内存
+            self.metrics = PipelineMetrics(len(self.config.stream_configs), len(self.config.weights_paths))
+
+            # 当前帧率档位，考试状态变化时切换，视频流进程据此调整采样帧率
+            self.rate_controller = RateController(self.result_processor.rate_phase())
+
             # 创建视频流管理器
             self.stream_manager = BaseVideoStreamer(
                 self.config.stream_configs,
                 len(self.config.weights_paths),
-                custom_logger=self.logger
+                custom_logger=self.logger,
+                delivery=self.config.frame_delivery,
+                metrics=self.metrics,
+                rate_controller=self.rate_controller,
+                startup_timeout=self.config.stream_startup_timeout
             )
             
             # 创建推理管理器
-            self.inference_manager = BaseYOLOPredictor(
+            self.inference_manager = self.predictor_class(
                 self.config.weights_paths,
                 self.stream_manager.frame_queues,
                 self.result_processor,
                 custom_logger=self.logger,
-                gpu_device=self.config.gpu_device
+                gpu_device=self.config.gpu_device,
+                frame_buffers=self.stream_manager.frame_buffers,
+                inference_mode=self.config.inference_mode,
+                batch_size=self.config.batch_size,
+                batch_wait_ms=self.config.batch_wait_ms,
+                frame_event=self.stream_manager.frame_ready,
+                model_settings=self.config.model_settings or None,
+                model_server_socket=self.config.model_server_socket,
+                max_frame_age=self.config.max_frame_age,
+                metrics=self.metrics,
+                model_heartbeat=self.config.model_heartbeat
             )
     
 
-    def start(self):
-        """启动检测服务"""
+    @property
+    def is_running(self) -> bool:
+        """服务是否已启动完成，兼容原有的布尔状态"""
+        return self.state == ServiceState.RUNNING
+
+    def warm_up(self):
+        """
+        创建所有组件并启动推理进程，模型加载后各做一次预热推理
+
+        推理进程常驻，之后的启动/停止只接入/断开视频流，不再重新加载模型；
+        已经退出的推理进程（如显存不足或推理时崩溃）在这里重新启动
+        """
         self.initialize_managers()
+        if not self.inference_manager.processes:
+            self.inference_manager.start_inference()
+            self.logger.info("Inference workers are warm")
+        else:
+            restarted = self.inference_manager.restart_dead_workers()
+            if restarted:
+                self.logger.warning(f"Restarted {len(restarted)} dead inference workers")
+
+    def start(self):
+        """启动检测服务（阻塞，直到视频流已连接；模型未预热时还要等待模型加载）"""
+        self.state = ServiceState.STARTING
         # 必须先启动推理，再启动视频流，防止出现队列变满
-        self.inference_manager.start_inference()
-        self.stream_manager.start_streams()
-        self.is_running = True
-        self.logger.info("Detection service started")
+        self.warm_up()
+        # 常驻的处理器保留着上一次检测的状态，接入视频流前恢复初始值
+        self.result_processor.reset_state()
+        self.rate_controller.set_phase(self.result_processor.rate_phase())
+        connected = self.stream_manager.start_streams()
+        self.state = ServiceState.RUNNING
+        self.last_error = None
+        self.logger.info(f"Detection service started with {len(connected)}/{len(self.config.stream_configs)} "
+                         f"streams connected")
 
     def stop(self):
-        """停止检测服务"""
+        """停止检测服务（阻塞）。启用warm_pool时只断开视频流，推理进程继续常驻"""
+        self.state = ServiceState.STOPPING
+        if not self.config.warm_pool:
+            self.close()
+        elif self.stream_manager:
+            self.stream_manager.stop_streams()
+        self.state = ServiceState.STOPPED
+        self.logger.info("Detection service stopped")
+
+    def close(self):
+        """停止所有视频流和推理进程并释放共享内存，服务退出或启动失败时调用"""
         if self.stream_manager and self.inference_manager:
             # 必须先停止视频流，再停止推理
-            self.stream_manager.stop_streams()
+            self.stream_manager.close()
             self.inference_manager.stop_inference()
             self.stream_manager = None
             self.inference_manager = None
             self.result_processor = None 
-        self.is_running = False
-        self.logger.info("Detection service stopped")
+            self.metrics = None
+            self.rate_controller = None
+        self.state = ServiceState.STOPPED
+
+    async def warm_up_async(self):
+        """在线程池中预热推理进程，服务启动时调用，未启用warm_pool时不做任何事"""
+        if not self.config.warm_pool:
+            return
+        async with self._lifecycle_lock:
+            await asyncio.get_running_loop().run_in_executor(None, self.warm_up)
+
+    async def close_async(self):
+        """在线程池中释放所有进程和共享内存，服务退出时调用"""
+        async with self._lifecycle_lock:
+            await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def start_async(self) -> ServiceState:
+        """
+        在线程池中启动检测服务，加载模型和连接视频流期间事件循环可以继续处理其他请求
+
+        启动失败时会清理已启动的进程，状态置为FAILED并抛出原异常
+
+        Returns:
+            启动后的生命周期状态
+        """
+        async with self._lifecycle_lock:
+            if self.state == ServiceState.RUNNING:
+                return self.state
+            loop = asyncio.get_running_loop()
+            self.state = ServiceState.STARTING
+            try:
+                await loop.run_in_executor(None, self.start)
+            except Exception as e:
+                self.logger.error(f"Detection start failed: {e}")
+                # 推理进程可能处于未知状态，全部释放，下次启动重新加载
+                await loop.run_in_executor(None, self.close)
+                self.state = ServiceState.FAILED
+                self.last_error = str(e)
+                raise
+            return self.state
+
+    async def stop_async(self) -> ServiceState:
+        """
+        在线程池中停止检测服务，等待进程退出期间事件循环可以继续处理其他请求
+
+        Returns:
+            停止后的生命周期状态
+        """
+        async with self._lifecycle_lock:
+            if self.state == ServiceState.STOPPED:
+                return self.state
+            self.state = ServiceState.STOPPING
+            await asyncio.get_running_loop().run_in_executor(None, self.stop)
+            return self.state
+
+    async def wait_state(self, timeout: float) -> ServiceState:
+        """
+        等待正在进行的启动/停止完成
+
+        Args:
+            timeout: 最长等待时间（秒），超时后返回当时的状态
+
+        Returns:
+            生命周期状态
+        """
+        deadline = time.monotonic() + timeout
+        while (self.state in (ServiceState.STARTING, ServiceState.STOPPING)
+               and time.monotonic() < deadline):
+            await asyncio.sleep(self.STATE_POLL_INTERVAL)
+        return self.state
     
+    def get_stream_status(self):
+        """获取各视频流的连接状态、最近一帧距今时间和重连次数"""
+        if self.stream_manager:
+            return self.stream_manager.get_stream_status()
+        return {}
+
+    def get_worker_stats(self):
+        """获取推理进程的空闲/忙碌时间统计"""
+        if self.inference_manager:
+            return self.inference_manager.get_worker_stats()
+        return {}
+
+    def get_metrics_text(self) -> str:
+        """
+        以Prometheus文本格式导出流水线指标
+
+        包括各视频流/模型各阶段延迟的p50/p95/p99、丢帧计数、队列深度、待写图片数、推理进程利用率
+        以及各模型当前是否还有未确定的步骤
+        """
+        running = 1 if self.is_running else 0
+        if not (self.metrics and self.stream_manager and self.inference_manager):
+            return f"# TYPE ai_exam_running gauge\nai_exam_running {running}\n"
+
+        # 流地址含摄像头账号密码，/metrics无鉴权，标签只用去掉账号密码的地址
+        stream_names = [redact_url(config.rtsp_url) for config in self.config.stream_configs]
+        model_names = [Path(path).name for path in self.config.weights_paths]
+        queue_status = self.stream_manager.get_queue_status()
+        worker_stats = self.inference_manager.get_worker_stats()
+        extra_gauges = {
+            "ai_exam_running": [({}, running)],
+            "ai_exam_rate_profile": [({"phase": self.rate_controller.phase}, 1)],
+            "ai_exam_stream_up": [
+                ({"stream": stream_names[i]}, int(self.stream_manager.stream_states[i] == CONNECTED))
+                for i in range(len(stream_names))
+            ],
+            "ai_exam_queue_depth": [
+                ({"model": model_names[i]}, queue_status[f"model_{i}"]["size"])
+                for i in range(len(model_names))
+            ],
+            "ai_exam_decode_ms": [
+                ({"stream": stream_names[i]}, round(self.stream_manager.decode_times[i], 3))
+                for i in range(len(stream_names))
+            ],
+            "ai_exam_image_writer_backlog": [({}, self.result_processor.image_writer.backlog)],
+            "ai_exam_worker_utilization": [
+                ({"worker": Path(name).name}, stats["utilization"])
+                for name, stats in worker_stats.items()
+            ],
+            "ai_exam_model_active": [
+                ({"model": model_names[i]}, int(active))
+                for i, active in enumerate(self.result_processor.model_demand())
+            ],
+        }
+        return self.metrics.render_prometheus(stream_names, model_names, extra_gauges)
+
     def set_exam_status(self, status):
         """设置考试状态"""
         if self.result_processor and hasattr(self.result_processor, 'exam_status'):
             self.result_processor.exam_status.value = status
+            # 不重启进程，直接切换帧率档位
+            if self.rate_controller:
+                self.rate_controller.set_phase(self.result_processor.rate_phase())
     
     def get_exam_status(self):
         """获取考试状态"""
@@ -0,0 +1,169 @@
+from multiprocessing import RawArray
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+# Latency stages recorded per stream (by its stream process) and per model (by its inference worker)
+STREAM_STAGES = ("decode", "enqueue")
+MODEL_STAGES = ("queue_wait", "inference", "process", "end_to_end")
+# Reasons a frame never reached the result processor
+STREAM_DROPS = ("queue_full", "mailbox_overwritten", "unchanged")
+MODEL_DROPS = ("ring_overwritten", "expired", "inactive")
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class PipelineMetrics:
+    """
+    Rolling latency windows and drop counters shared by the stream and inference processes.
+
+    Every series lives in shared memory and has exactly one writer: stream series are
+    written by the stream process that owns the stream, model series by the inference
+    worker of the model. Readers (the API process) copy the window and compute
+    quantiles on demand, so recording a sample is a couple of array stores.
+    """
+
+    def __init__(self, num_streams: int, num_models: int, window: int = 512):
+        """
+        :param num_streams: Number of video streams
+        :param num_models: Number of models
+        :param window: Number of most recent samples kept per series
+        """
+        self.num_streams = num_streams
+        self.num_models = num_models
+        self.window = window
+
+        self._stream_samples = RawArray('d', num_streams * len(STREAM_STAGES) * window)
+        self._stream_counts = RawArray('Q', num_streams * len(STREAM_STAGES))
+        self._stream_sums = RawArray('d', num_streams * len(STREAM_STAGES))
+        self._model_samples = RawArray('d', num_models * len(MODEL_STAGES) * window)
+        self._model_counts = RawArray('Q', num_models * len(MODEL_STAGES))
+        self._model_sums = RawArray('d', num_models * len(MODEL_STAGES))
+        # Stream drops are kept per (stream, model) pair so each stream process writes its own slots
+        self._stream_drops = RawArray('Q', num_streams * num_models * len(STREAM_DROPS))
+        self._model_drops = RawArray('Q', num_models * len(MODEL_DROPS))
+
+    def _record(self, samples, counts, sums, series: int, value: float):
+        count = counts[series]
+        samples[series * self.window + count % self.window] = value
+        sums[series] += value
+        counts[series] = count + 1
+
+    def record_stream(self, stream: int, stage: str, seconds: float):
+        self._record(self._stream_samples, self._stream_counts, self._stream_sums,
+                     stream * len(STREAM_STAGES) + STREAM_STAGES.index(stage), seconds)
+
+    def record_model(self, model: int, stage: str, seconds: float):
+        self._record(self._model_samples, self._model_counts, self._model_sums,
+                     model * len(MODEL_STAGES) + MODEL_STAGES.index(stage), seconds)
+
+    def count_stream_drop(self, stream: int, model: int, reason: str):
+        index = (stream * self.num_models + model) * len(STREAM_DROPS) + STREAM_DROPS.index(reason)
+        self._stream_drops[index] += 1
+
+    def count_model_drop(self, model: int, reason: str):
+        self._model_drops[model * len(MODEL_DROPS) + MODEL_DROPS.index(reason)] += 1
+
+    def _window(self, samples, counts, series: int) -> np.ndarray:
+        count = counts[series]
+        start = series * self.window
+        return np.array(samples[start:start + min(count, self.window)])
+
+    def _summary(self, samples, counts, sums, series: int) -> dict:
+        values = self._window(samples, counts, series)
+        summary = {"count": counts[series], "sum": sums[series]}
+        if values.size:
+            for q in QUANTILES:
+                summary[f"p{int(q * 100)}"] = float(np.quantile(values, q))
+        return summary
+
+    def snapshot(self) -> dict:
+        """Quantiles (seconds) and drop counts of every series, keyed by stream / model index"""
+        streams = {}
+        for stream in range(self.num_streams):
+            stages = {
+                stage: self._summary(self._stream_samples, self._stream_counts, self._stream_sums,
+                                     stream * len(STREAM_STAGES) + i)
+                for i, stage in enumerate(STREAM_STAGES)
+            }
+            drops = {reason: 0 for reason in STREAM_DROPS}
+            for model in range(self.num_models):
+                for i, reason in enumerate(STREAM_DROPS):
+                    drops[reason] += self._stream_drops[(stream * self.num_models + model) * len(STREAM_DROPS) + i]
+            streams[stream] = {"stages": stages, "drops": drops}
+
+        models = {}
+        for model in range(self.num_models):
+            stages = {
+                stage: self._summary(self._model_samples, self._model_counts, self._model_sums,
+                                     model * len(MODEL_STAGES) + i)
+                for i, stage in enumerate(MODEL_STAGES)
+            }
+            drops = {reason: self._model_drops[model * len(MODEL_DROPS) + i]
+                     for i, reason in enumerate(MODEL_DROPS)}
+            for reason in STREAM_DROPS:
+                drops[reason] = sum(
+                    self._stream_drops[(stream * self.num_models + model) * len(STREAM_DROPS)
+                                       + STREAM_DROPS.index(reason)]
+                    for stream in range(self.num_streams)
+                )
+            models[model] = {"stages": stages, "drops": drops}
+        return {"streams": streams, "models": models}
+
+    def render_prometheus(self, stream_names: Sequence[str], model_names: Sequence[str],
+                          extra_gauges: Optional[Dict[str, List[tuple]]] = None) -> str:
+        """
+        Render all series in the Prometheus text exposition format
+        :param stream_names: Label value of each stream, e.g. its URL without credentials
+        :param model_names: Label value of each model, e.g. its weights filename
+        :param extra_gauges: Additional gauges, metric name -> [(labels dict, value), ...]
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        lines.append("# HELP ai_exam_stream_stage_seconds Per-stream frame latency by pipeline stage")
+        lines.append("# TYPE ai_exam_stream_stage_seconds summary")
+        for stream, data in snapshot["streams"].items():
+            for stage, summary in data["stages"].items():
+                labels = {"stream": stream_names[stream], "stage": stage}
+                lines.extend(_summary_lines("ai_exam_stream_stage_seconds", labels, summary))
+
+        lines.append("# HELP ai_exam_model_stage_seconds Per-model frame latency by pipeline stage")
+        lines.append("# TYPE ai_exam_model_stage_seconds summary")
+        for model, data in snapshot["models"].items():
+            for stage, summary in data["stages"].items():
+                labels = {"model": model_names[model], "stage": stage}
+                lines.extend(_summary_lines("ai_exam_model_stage_seconds", labels, summary))
+
+        lines.append("# HELP ai_exam_frames_dropped_total Frames dropped before reaching the result processor")
+        lines.append("# TYPE ai_exam_frames_dropped_total counter")
+        for model, data in snapshot["models"].items():
+            for reason, count in data["drops"].items():
+                labels = {"model": model_names[model], "reason": reason}
+                lines.append(f"ai_exam_frames_dropped_total{_labels(labels)} {count}")
+
+        for name, samples in (extra_gauges or {}).items():
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _summary_lines(name: str, labels: dict, summary: dict) -> List[str]:
+    lines = []
+    for q in QUANTILES:
+        value = summary.get(f"p{int(q * 100)}")
+        if value is not None:
+            lines.append(f"{name}{_labels({**labels, 'quantile': q})} {value:.6f}")
+    lines.append(f"{name}_sum{_labels(labels)} {summary['sum']:.6f}")
+    lines.append(f"{name}_count{_labels(labels)} {summary['count']}")
+    return lines
@@ -0,0 +1,318 @@
+"""
+Local inference server shared by all services on a host.
+
+Each distinct weights file (identified by content hash, so the same .pt copied into
+several service weight directories counts once) is loaded a single time. Services
+connect over a Unix socket, send frames and receive ultralytics results; requests
+from all clients are batched per model before calling predict.
+
+Start it with ``python -m shared.services.model_server`` (see scripts/start_model_server.sh)
+and point services at it with ``model_server.enabled: true`` in config.yaml.
+
+Messages are pickled, so only clients holding the server's key may connect: the server
+writes a random key next to the socket (``<socket>.key``, mode 0600) and clients running
+as the same user read it. The socket itself is also created with mode 0600.
+"""
+from multiprocessing.connection import Listener, Client
+from multiprocessing import AuthenticationError
+from threading import Thread, Lock, Event
+from queue import Queue, Empty
+from pathlib import Path
+from typing import Optional, Union
+import argparse
+import hashlib
+import logging
+import os
+import socket
+import time
+
+logger = logging.getLogger("shared_services")
+
+DEFAULT_SOCKET_PATH = "/tmp/ai_exam_model_server.sock"
+AUTHKEY_BYTES = 32
+
+
+def authkey_path(socket_path: str) -> str:
+    """Key file shared by the server and its clients"""
+    return f"{socket_path}.key"
+
+
+def create_authkey(socket_path: str) -> bytes:
+    """Write a fresh random key readable by the owner only and return it"""
+    path = authkey_path(socket_path)
+    if os.path.exists(path):
+        os.unlink(path)
+    authkey = os.urandom(AUTHKEY_BYTES)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(authkey)
+    return authkey
+
+
+def read_authkey(socket_path: str) -> bytes:
+    """Key of a running server, raises ConnectionError when it is missing"""
+    try:
+        with open(authkey_path(socket_path), 'rb') as f:
+            return f.read()
+    except OSError as e:
+        raise ConnectionError(f"Cannot read model server key {authkey_path(socket_path)}: {e}")
+
+
+def weights_digest(weights_path: str) -> str:
+    """Content hash of a weights file, used to share one model between identical files"""
+    sha1 = hashlib.sha1()
+    with open(weights_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class _PendingRequest:
+    """A predict request waiting in the batch queue"""
+
+    def __init__(self, model_key: str, frames: list, kwargs: dict):
+        self.model_key = model_key
+        self.frames = frames
+        self.kwargs = kwargs
+        self.batch_key = (model_key, repr(sorted(kwargs.items())))
+        self.results = None
+        self.error: Optional[str] = None
+        self.done = Event()
+
+
+class ModelServer:
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, gpu_device: Union[int, str] = 0,
+                 batch_size: int = 8, batch_wait_ms: float = 10.0, custom_logger=None):
+        """
+        :param socket_path: Unix socket the server listens on
+        :param gpu_device: GPU device ID (int) or 'cpu'; overrides the device requested by clients
+        :param batch_size: Maximum number of frames per model in one predict call
+        :param batch_wait_ms: Maximum time to wait for a batch to fill after its first request
+        :param custom_logger: Optional custom logger
+        """
+        self.socket_path = socket_path
+        self.device = 'cpu' if str(gpu_device).lower() == 'cpu' else f'cuda:{gpu_device}'
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.logger = custom_logger or logger
+
+        self._models = {}  # content digest -> YOLO model
+        self._digests = {}  # (path, size, mtime) -> content digest
+        self._models_lock = Lock()
+        self._requests: Queue = Queue()
+        self._stop_event = Event()
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # stale socket from a previous run
+
+        authkey = create_authkey(self.socket_path)
+        old_umask = os.umask(0o177)  # Socket is created 0600, no window with looser permissions
+        try:
+            listener = Listener(self.socket_path, family='AF_UNIX', authkey=authkey)
+        finally:
+            os.umask(old_umask)
+
+        Thread(target=self._inference_loop, daemon=True).start()
+        with listener:
+            self.logger.info(f"Model server listening on {self.socket_path} (device {self.device})")
+            while not self._stop_event.is_set():
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e:
+                    if not self._stop_event.is_set():
+                        self.logger.error(f"Rejected connection: {e}")
+                    continue
+                Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+        for path in (self.socket_path, authkey_path(self.socket_path)):
+            if os.path.exists(path):
+                os.unlink(path)
+        self.logger.info("Model server stopped")
+
+    def stop(self):
+        """Stop serving; a bare connection wakes the blocking accept, whose handshake then fails"""
+        self._stop_event.set()
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(self.socket_path)
+        except OSError:
+            pass  # Not listening (yet or any more)
+
+    def _load(self, weights_path: str) -> str:
+        """Load a weights file unless an identical one is already loaded, return its model key"""
+        from ultralytics import YOLO
+
+        stat = os.stat(weights_path)
+        file_key = (str(Path(weights_path).resolve()), stat.st_size, stat.st_mtime)
+        with self._models_lock:
+            digest = self._digests.get(file_key)
+            if digest is None:
+                digest = weights_digest(weights_path)
+                self._digests[file_key] = digest
+            if digest not in self._models:
+                self._models[digest] = YOLO(weights_path)
+                self.logger.info(f"Loaded {weights_path} as {digest[:12]} ({len(self._models)} models hosted)")
+            else:
+                self.logger.info(f"Reusing loaded model {digest[:12]} for {weights_path}")
+        return digest
+
+    def _serve_client(self, conn):
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    break
+
+                command = message[0]
+                if command == "load":
+                    try:
+                        conn.send(("ok", self._load(message[1])))
+                    except Exception as e:
+                        conn.send(("error", f"Failed to load {message[1]}: {e}"))
+                elif command == "predict":
+                    _, model_key, frames, kwargs = message
+                    request = _PendingRequest(model_key, frames, kwargs)
+                    self._requests.put(request)
+                    request.done.wait()
+                    if request.error:
+                        conn.send(("error", request.error))
+                    else:
+                        conn.send(("ok", request.results))
+                else:
+                    conn.send(("error", f"Unknown command {command}"))
+        except Exception as e:
+            self.logger.error(f"Client connection error: {e}")
+        finally:
+            conn.close()
+
+    def _inference_loop(self):
+        """Single GPU thread: gather requests for up to batch_wait, then run one predict per model/settings"""
+        while not self._stop_event.is_set():
+            try:
+                first = self._requests.get(timeout=0.5)
+            except Empty:
+                continue
+
+            pending = [first]
+            frame_count = len(first.frames)
+            deadline = time.monotonic() + self.batch_wait
+            while frame_count < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except Empty:
+                    break
+                pending.append(request)
+                frame_count += len(request.frames)
+
+            groups = {}
+            for request in pending:
+                groups.setdefault(request.batch_key, []).append(request)
+            for requests in groups.values():
+                self._run_group(requests)
+
+    def _run_group(self, requests: list):
+        head = requests[0]
+        model = self._models.get(head.model_key)
+        if model is None:
+            for request in requests:
+                request.error = f"Model {head.model_key} is not loaded"
+                request.done.set()
+            return
+
+        frames = [frame for request in requests for frame in request.frames]
+        kwargs = {**head.kwargs, "device": self.device}
+        try:
+            results = [result.cpu() for result in model.predict(frames, **kwargs)]
+        except Exception as e:
+            for request in requests:
+                request.error = f"Inference failed: {e}"
+                request.done.set()
+            return
+
+        # Split the batch back into per-request result lists
+        offset = 0
+        for request in requests:
+            request.results = results[offset:offset + len(request.frames)]
+            offset += len(request.frames)
+            request.done.set()
+
+
+class RemoteModel:
+    """
+    Client-side stand-in for ``ultralytics.YOLO`` backed by the model server.
+    Only ``predict`` is supported, which is all BaseYOLOPredictor uses.
+
+    Warm inference workers outlive a restart of the server, which comes back with a
+    new key and without the model loaded; a call that finds the connection gone
+    reconnects, reloads the model and is retried once.
+    """
+
+    def __init__(self, weights_path: str, socket_path: str = DEFAULT_SOCKET_PATH):
+        self.weights_path = weights_path
+        self.socket_path = socket_path
+        self._conn = None
+        self.model_key = None
+        self._connect()
+
+    def _connect(self):
+        """Open a connection with the server's current key and (re)load the model on it"""
+        self._conn = Client(self.socket_path, family='AF_UNIX', authkey=read_authkey(self.socket_path))
+        self.model_key = self._request(("load", self.weights_path))
+
+    def _request(self, message):
+        self._conn.send(message)
+        status, payload = self._conn.recv()
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload
+
+    def _call(self, *message):
+        try:
+            return self._request(message)
+        except (EOFError, OSError):
+            logger.warning(f"Lost the model server connection for {self.weights_path}, reconnecting")
+        self.close()
+        try:
+            self._connect()
+        except (EOFError, OSError) as e:
+            raise ConnectionError(f"Model server {self.socket_path} unavailable: {e}") from e
+        if message[0] == "predict":
+            message = ("predict", self.model_key, *message[2:])  # Key of the model on the new connection
+        try:
+            return self._request(message)
+        except (EOFError, OSError) as e:
+            raise ConnectionError(f"Model server {self.socket_path} unavailable: {e}") from e
+
+    def predict(self, source, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        return self._call("predict", self.model_key, frames, kwargs)
+
+    def close(self):
+        try:
+            self._conn.close()
+        except OSError:
+            pass
+
+
+def main():
+    from shared.utils.config import config_manager
+
+    server_config = config_manager.get_global_config().get('model_server', {})
+    parser = argparse.ArgumentParser(description="Shared YOLO model server for AI exam services")
+    parser.add_argument("--socket", default=server_config.get('socket', DEFAULT_SOCKET_PATH))
+    parser.add_argument("--device", default=str(server_config.get('gpu_device', 0)))
+    parser.add_argument("--batch-size", type=int, default=server_config.get('batch_size', 8))
+    parser.add_argument("--batch-wait-ms", type=float, default=server_config.get('batch_wait_ms', 10))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    device = int(args.device) if args.device.isdigit() else args.device
+    ModelServer(args.socket, device, args.batch_size, args.batch_wait_ms).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,38 @@
-from multiprocessing import Queue, Event, Process
+from multiprocessing import Queue, Event, Process, RawArray
 from ultralytics import YOLO
 import logging
-from typing import Union, List
+import time
+import numpy as np
+from queue import Empty
+from typing import Union, List, Optional
 from .processor import BaseResultProcessor
+from .image_writer import StepImageWriter
+from .frame_buffer import SharedFrameRing, FrameRef
+from .model_server import RemoteModel
+from .metrics import PipelineMetrics
+from ..schemas import ModelSettings
 
 # Use basic logging if specific logger not provided
 logger = logging.getLogger("shared_services")
 
+INFERENCE_MODES = ("per_model", "batched")
+
 
 class BaseYOLOPredictor:
-    def __init__(self, weights_paths: List[str], frame_queues: List[Queue], 
-                 result_processor: BaseResultProcessor, custom_logger=None, gpu_device: Union[int, str] = 0):
+    # Sleep between queue sweeps while a batch is being collected
+    BATCH_POLL_INTERVAL = 0.002
+    # Upper bound on how long a worker blocks waiting for frames before rechecking its stop event
+    QUEUE_GET_TIMEOUT = 0.5
+    # Blank frame run through every locally loaded model before the worker reports ready
+    WARMUP_SHAPE = (640, 640, 3)
+
+    def __init__(self, weights_paths: List[str], frame_queues: List[Queue],
+                 result_processor: BaseResultProcessor, custom_logger=None, gpu_device: Union[int, str] = 0,
+                 frame_buffers: Optional[List[SharedFrameRing]] = None,
+                 inference_mode: str = "per_model", batch_size: int = 8, batch_wait_ms: float = 20.0,
+                 frame_event: Optional[Event] = None, model_settings: Optional[List[ModelSettings]] = None,
+                 model_server_socket: Optional[str] = None, max_frame_age: Optional[float] = None,
+                 metrics: Optional[PipelineMetrics] = None, model_heartbeat: Optional[float] = None):
         """
         Initialize YOLO predictor
         :param weights_paths: List of model weight paths
@@ -18,37 +40,105 @@ class BaseYOLOPredictor:
         :param result_processor: Processor for model results
         :param custom_logger: Optional custom logger
         :param gpu_device: GPU device ID (int) or 'cpu' for CPU mode
+        :param frame_buffers: Shared frame rings of the streamer, required when queues carry FrameRef items
+        :param inference_mode: 'per_model' runs one process per model, 'batched' runs all models
+                               in one process and predicts on batches of queued frames
+        :param batch_size: Maximum number of frames per model in one predict call (batched mode)
+        :param batch_wait_ms: Maximum time to wait for a batch to fill after its first frame (batched mode)
+        :param frame_event: Event set by the streamer whenever a frame is queued, lets the batched
+                            worker sleep until frames arrive instead of polling
+        :param model_settings: Inference settings per model, in weights_paths order; defaults are used when omitted
+        :param model_server_socket: Unix socket of a shared model server; models are loaded locally when None
+        :param max_frame_age: Frames captured more than this many seconds ago are skipped; None disables the check
+        :param metrics: Optional shared metrics the workers record latencies and drops into
+        :param model_heartbeat: Seconds between frames for models whose steps are all decided; 0 suspends
+                                them, None disables demand scheduling and runs every model on every frame
         """
+        if inference_mode not in INFERENCE_MODES:
+            raise ValueError(f"Unknown inference mode '{inference_mode}', expected one of {INFERENCE_MODES}")
+
         self.weights_paths = weights_paths
         self.frame_queues = frame_queues
+        self.frame_buffers = frame_buffers or []
+        self.model_settings = model_settings or [ModelSettings() for _ in weights_paths]
+        if len(self.model_settings) != len(self.weights_paths):
+            raise ValueError("model_settings must have one entry per weights path")
         self.result_processor = result_processor
         self.logger = custom_logger or logger
         self.gpu_device = gpu_device
-        
+        self.model_server_socket = model_server_socket
+        self.inference_mode = inference_mode
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.frame_event = frame_event or Event()
+        self.max_frame_age = max_frame_age
+        self.metrics = metrics
+        self.model_heartbeat = model_heartbeat
+        # Last heartbeat frame per model, local to whichever worker process serves the model
+        self._last_heartbeat = [float('-inf')] * len(self.weights_paths)
+
         self.processes: List[Process] = []
         self.start_events = [Event() for _ in range(len(self.weights_paths))]
         self.stop_events = [Event() for _ in range(len(self.weights_paths))]
 
-    def start_inference(self):
-        for i, (weights_path, frame_queue) in enumerate(zip(self.weights_paths, self.frame_queues)):
+        # Per-worker time accounting, each slot is written only by its own worker process
+        num_workers = 1 if inference_mode == "batched" else len(self.weights_paths)
+        self.idle_time = RawArray('d', num_workers)
+        self.busy_time = RawArray('d', num_workers)
+        self.frames_processed = RawArray('Q', num_workers)
+
+    def _spawn_worker(self, worker_index: int) -> Process:
+        if self.inference_mode == "batched":
+            # A single process hosts every model and shares one start/stop event pair
+            process = Process(
+                target=self._batched_inference_worker,
+                args=(0, self.start_events[0], self.stop_events[0], self.gpu_device)
+            )
+        else:
             process = Process(
                 target=self._inference_worker,
-                args=(weights_path, frame_queue, 
-                      self.start_events[i], self.stop_events[i], self.gpu_device)
+                args=(worker_index, self.weights_paths[worker_index], self.frame_queues[worker_index],
+                      self.start_events[worker_index], self.stop_events[worker_index], self.gpu_device)
             )
-            process.start()
-            self.processes.append(process)
+        process.start()
+        return process
 
-        for event in self.start_events:
+    def start_inference(self):
+        num_workers = 1 if self.inference_mode == "batched" else len(self.weights_paths)
+        for i in range(num_workers):
+            self.processes.append(self._spawn_worker(i))
+
+        for event in self.start_events[:len(self.processes)]:
             event.wait()
-    
+
+    def restart_dead_workers(self) -> List[int]:
+        """
+        Start a fresh process for every worker that has exited (e.g. CUDA OOM or a crash in predict)
+        and wait until it has loaded its model again
+        :return: Indices of the restarted workers
+        """
+        restarted = []
+        for i, process in enumerate(self.processes):
+            if process.is_alive():
+                continue
+            name = "batched worker" if self.inference_mode == "batched" else self.weights_paths[i]
+            self.logger.warning(f"Inference worker for {name} exited with code {process.exitcode}, restarting it")
+            self.start_events[i].clear()
+            self.stop_events[i].clear()
+            self.processes[i] = self._spawn_worker(i)
+            restarted.append(i)
+        for i in restarted:
+            self.start_events[i].wait()
+        return restarted
+
     def stop_inference(self):
         for stop_event in self.stop_events:
             stop_event.set()
-            
+
         for process in self.processes:
             try:
-                process.join(timeout=1)
+                # Leave time for the worker to flush its queued step images
+                process.join(timeout=1 + StepImageWriter.FLUSH_TIMEOUT)
                 if process.is_alive():
                     process.terminate()
             except Exception as e:
@@ -57,28 +147,169 @@ class BaseYOLOPredictor:
         self.processes.clear()
         self.logger.info("All inference processes stopped")
 
-    def _inference_worker(self, weights_path: str, frame_queue: Queue,
+    def get_worker_stats(self) -> dict:
+        """Idle/busy seconds and processed frame counts of every inference worker"""
+        if self.inference_mode == "batched":
+            names = ["batched"]
+        else:
+            names = self.weights_paths
+        stats = {}
+        for i, name in enumerate(names):
+            idle, busy = self.idle_time[i], self.busy_time[i]
+            total = idle + busy
+            stats[name] = {
+                "idle_seconds": round(idle, 3),
+                "busy_seconds": round(busy, 3),
+                "utilization": round(busy / total, 4) if total > 0 else 0.0,
+                "frames": self.frames_processed[i]
+            }
+        return stats
+
+    def _inference_worker(self, worker_index: int, weights_path: str, frame_queue: Queue,
                          start_event: Event, stop_event: Event, gpu_device: Union[int, str]):
         try:
             model = self._load_model(weights_path, gpu_device)
+            predict_kwargs = self._compile_predict_kwargs(worker_index, gpu_device)
+            self._warm_up(model, predict_kwargs)
             if not start_event.is_set():
                 start_event.set()
                 self.logger.info(f"{weights_path} inference is running on device {gpu_device}")
 
             while not stop_event.is_set():
-                if frame_queue.empty():
+                wait_start = time.monotonic()
+                try:
+                    # Block until a frame arrives; the timeout keeps stop_event checks responsive
+                    item = frame_queue.get(timeout=self.QUEUE_GET_TIMEOUT)
+                except Empty:
+                    self.idle_time[worker_index] += time.monotonic() - wait_start
                     continue
-                frame = frame_queue.get()
+                work_start = time.monotonic()
+                self.idle_time[worker_index] += work_start - wait_start
 
-                self._run_inference(model, frame, weights_path, gpu_device)
+                frame = self._resolve_frame(item, worker_index) if self._model_demanded(worker_index) else None
+                if frame is not None:
+                    self._run_inference(model, frame, weights_path, predict_kwargs, item, worker_index)
+                    self.frames_processed[worker_index] += 1
+                self.busy_time[worker_index] += time.monotonic() - work_start
 
         except Exception as e:
             self.logger.error(f"Inference error for {weights_path}: {e}")
         finally:
+            self.result_processor.close()
             self.logger.info(f"Inference stopped for {weights_path}")
 
+    def _batched_inference_worker(self, worker_index: int, start_event: Event, stop_event: Event,
+                                  gpu_device: Union[int, str]):
+        try:
+            models = [self._load_model(weights_path, gpu_device) for weights_path in self.weights_paths]
+            predict_kwargs = [self._compile_predict_kwargs(i, gpu_device) for i in range(len(models))]
+            for model, kwargs in zip(models, predict_kwargs):
+                self._warm_up(model, kwargs)
+            if not start_event.is_set():
+                start_event.set()
+                self.logger.info(f"Batched inference for {len(models)} models is running on device {gpu_device} "
+                                 f"(batch_size={self.batch_size}, batch_wait={self.batch_wait * 1000:.0f}ms)")
+
+            while not stop_event.is_set():
+                wait_start = time.monotonic()
+                batches = self._collect_batches(stop_event)
+                work_start = time.monotonic()
+                self.idle_time[worker_index] += work_start - wait_start
+
+                for model_index, (model, weights_path, kwargs, batch) in enumerate(
+                        zip(models, self.weights_paths, predict_kwargs, batches)):
+                    if batch:
+                        frames, items = zip(*batch)
+                        self._run_batch_inference(model, list(frames), weights_path, kwargs, items, model_index)
+                        self.frames_processed[worker_index] += len(frames)
+                self.busy_time[worker_index] += time.monotonic() - work_start
+
+        except Exception as e:
+            self.logger.error(f"Batched inference error: {e}")
+        finally:
+            self.result_processor.close()
+            self.logger.info("Batched inference stopped")
+
+    def _collect_batches(self, stop_event: Event) -> List[list]:
+        """
+        Sweep all model queues until one model has a full batch or the wait window
+        opened by the first received frame has elapsed
+        :return: One list of (frame, queue item) pairs per model, in weights_paths order
+        """
+        batches = [[] for _ in self.frame_queues]
+        deadline = None
+
+        while not stop_event.is_set():
+            # Clear before sweeping so a frame queued after the sweep still wakes us up
+            self.frame_event.clear()
+            received = False
+            for model_index, (batch, frame_queue) in enumerate(zip(batches, self.frame_queues)):
+                if len(batch) >= self.batch_size:
+                    continue
+                try:
+                    item = frame_queue.get_nowait()
+                except Empty:
+                    continue
+                if not self._model_demanded(model_index):
+                    continue
+                frame = self._resolve_frame(item, model_index)
+                if frame is None:
+                    continue
+                batch.append((frame, item))
+                received = True
+                if deadline is None:
+                    deadline = time.monotonic() + self.batch_wait
+
+            if deadline is not None and (time.monotonic() >= deadline
+                                         or any(len(batch) >= self.batch_size for batch in batches)):
+                break
+            if received:
+                continue
+            if deadline is None:
+                # Nothing pending: sleep until the streamer signals a new frame
+                self.frame_event.wait(self.QUEUE_GET_TIMEOUT)
+            else:
+                time.sleep(min(self.BATCH_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+
+        return batches
+
+    def _model_demanded(self, model_index: int) -> bool:
+        """
+        Whether a dequeued frame should be inferred by this model. Models with no pending step
+        only get one frame per heartbeat, which keeps undeclared flag writers and live reset
+        flags from going stale; the rest of their frames are dropped as 'inactive'
+        """
+        if self.model_heartbeat is None or self.result_processor.model_demand()[model_index]:
+            return True
+        now = time.monotonic()
+        if self.model_heartbeat > 0 and now - self._last_heartbeat[model_index] >= self.model_heartbeat:
+            self._last_heartbeat[model_index] = now
+            return True
+        self._count_drop(model_index, "inactive")
+        return False
+
+    def _resolve_frame(self, item, model_index: Optional[int] = None):
+        """Turn a queue item into a frame, reading FrameRef handles from shared memory"""
+        if not isinstance(item, FrameRef):
+            return item
+        if self.max_frame_age and item.timestamp:
+            age = time.time() - item.timestamp
+            if age > self.max_frame_age:
+                self.logger.debug(f"Skipped frame {item.seq} of stream {item.stream}, captured {age:.2f}s ago")
+                self._count_drop(model_index, "expired")
+                return None
+        frame = self.frame_buffers[item.stream].read(item.slot, item.seq)
+        if frame is None:
+            # The ring has wrapped around since the reference was queued
+            self.logger.debug(f"Dropped stale frame {item.seq} of stream {item.stream}")
+            self._count_drop(model_index, "ring_overwritten")
+        return frame
+
     def _load_model(self, weights_path: str, gpu_device: Union[int, str] = 0):
         try:
+            if self.model_server_socket:
+                # Identical weights are hosted once by the shared model server
+                return RemoteModel(weights_path, self.model_server_socket)
             # Load model without immediately setting device
             model = YOLO(weights_path)
             return model
@@ -86,29 +317,79 @@ class BaseYOLOPredictor:
             self.logger.error(f"Failed to load model {weights_path}: {e}")
             raise
 
-    def _run_inference(self, model, frame, weights_path, gpu_device: Union[int, str]):
+    def _warm_up(self, model, predict_kwargs: dict):
+        """
+        Run one inference on a blank frame so the first real frame does not pay for
+        lazy CUDA/graph initialisation; models on the shared model server are already warm
+        """
+        if self.model_server_socket:
+            return
         try:
-            # Determine device string for predict function
-            if isinstance(gpu_device, str) and gpu_device.lower() == 'cpu':
-                device = 'cpu'
-            elif isinstance(gpu_device, int):
-                device = f'cuda:{gpu_device}'
-            else:
-                device = 'cuda:0'  # fallback
-            
-            # Determine if this is a segmentation model and adjust parameters accordingly
-            # Projects can override this method for custom inference logic
-            if 'yolo11l-seg' in weights_path.lower():
-                results = model.predict(frame, verbose=False, conf=0.6, classes=[0], device=device)[0]
-                    # Additional parameters for segmentation models if needed
-            elif 'welding_wearing' in weights_path.lower():
-                results = model.predict(frame, verbose=False, conf=0.6, classes=[0,3,10], device=device)[0]
-            elif 'yolo11l-pose' in weights_path.lower():
-                results = model.predict(frame, verbose=False, conf=0.7, device=device)[0]
-            elif 'basket_up_brush' in weights_path.lower():
-                results = model.predict(frame, verbose=False, conf=0.6, device=device)[0]
-            else:
-                results = model.predict(frame, verbose=False, conf=0.6, device=device)[0]
+            model.predict(np.zeros(self.WARMUP_SHAPE, dtype=np.uint8), **predict_kwargs)
+        except Exception as e:
+            self.logger.warning(f"Warm-up inference failed: {e}")
+
+    @staticmethod
+    def _resolve_device(gpu_device: Union[int, str]) -> str:
+        # Determine device string for predict function
+        if isinstance(gpu_device, str) and gpu_device.lower() == 'cpu':
+            return 'cpu'
+        elif isinstance(gpu_device, int):
+            return f'cuda:{gpu_device}'
+        return 'cuda:0'  # fallback
+
+    def _compile_predict_kwargs(self, model_index: int, gpu_device: Union[int, str]) -> dict:
+        """
+        Resolve the predict() arguments of a model once, when its worker starts.
+        Projects can override this method for custom inference logic
+        """
+        return self.model_settings[model_index].predict_kwargs(self._resolve_device(gpu_device))
+
+    def _run_inference(self, model, frame, weights_path, predict_kwargs: dict,
+                       frame_ref=None, model_index: Optional[int] = None):
+        try:
+            infer_start = time.time()
+            results = model.predict(frame, **predict_kwargs)[0]
+            infer_end = time.time()
             self.result_processor.process_result(results, weights_path)
+            self._record_latency(model_index, frame_ref, infer_start, infer_end, time.time())
+        except ConnectionError:
+            raise  # Model server gone for good: stop the worker instead of failing every frame
         except Exception as e:
             self.logger.error(f"Inference failed: {e}")
+
+    def _run_batch_inference(self, model, frames: list, weights_path: str, predict_kwargs: dict,
+                             frame_refs=None, model_index: Optional[int] = None):
+        try:
+            infer_start = time.time()
+            results = model.predict(frames, **predict_kwargs)
+            infer_end = time.time()
+        except ConnectionError:
+            raise  # Model server gone for good: stop the worker instead of failing every frame
+        except Exception as e:
+            self.logger.error(f"Batch inference failed for {weights_path}: {e}")
+            return
+
+        # Results come back in input order, hand each one to the processor like a single-frame run
+        for i, result in enumerate(results):
+            try:
+                self.result_processor.process_result(result, weights_path)
+                frame_ref = frame_refs[i] if frame_refs else None
+                self._record_latency(model_index, frame_ref, infer_start, infer_end, time.time())
+            except Exception as e:
+                self.logger.error(f"Inference failed: {e}")
+
+    def _count_drop(self, model_index: Optional[int], reason: str):
+        if self.metrics and model_index is not None:
+            self.metrics.count_model_drop(model_index, reason)
+
+    def _record_latency(self, model_index: Optional[int], frame_ref, infer_start: float,
+                        infer_end: float, process_end: float):
+        """Record the per-stage latencies of a processed frame"""
+        if not self.metrics or model_index is None:
+            return
+        self.metrics.record_model(model_index, "inference", infer_end - infer_start)
+        self.metrics.record_model(model_index, "process", process_end - infer_end)
+        if isinstance(frame_ref, FrameRef) and frame_ref.enqueued:
+            self.metrics.record_model(model_index, "queue_wait", infer_start - frame_ref.enqueued)
+            self.metrics.record_model(model_index, "end_to_end", process_end - frame_ref.timestamp)
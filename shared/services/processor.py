@@ -1,10 +1,25 @@
 from abc import ABC, abstractmethod
 from pathlib import Path
+from .image_writer import StepImageWriter
 
 class BaseResultProcessor(ABC):
     """
     结果处理器基类，所有具体处理器应继承此类
+
+    子类以类属性声明步骤规则，{模型序号: [(标志序号, 步骤名), ...]}，
+    表示该模型的帧到来时，标志为真且尚未保存的步骤会保存当前帧作为步骤图片
     """
+    # 考试步骤，考试进行中（exam_status为真）时生效
+    EXAM_STEPS: dict[int, list[tuple[int, str]]] = {}
+    # 复位步骤，考试未进行时生效，使用reset_flag
+    RESET_STEPS: dict[int, list[tuple[int, str]]] = {}
+    # 步骤分数，有exam_score的处理器在保存考试步骤时写入，未列出的步骤记0分
+    EXAM_SCORES: dict[str, int] = {}
+    # 步骤标志的其他来源，{标志序号: [模型序号, ...]}。保存步骤的模型默认就是其标志的来源，
+    # 这里只需列出由别的视角写入的标志，用于判断哪些模型还需要运行
+    EXAM_FLAG_SOURCES: dict[int, list[int]] = {}
+    RESET_FLAG_SOURCES: dict[int, list[int]] = {}
+
     def __init__(self, weights_paths: list[str], 
                  images_dir: Path, 
                  img_url_path: str):
@@ -19,7 +34,111 @@ class BaseResultProcessor(ABC):
         self.weights_paths = weights_paths
         self.images_dir = images_dir
         self.img_url_path = img_url_path
+        # 后台写步骤图片，绘制/编码/写盘不阻塞推理
+        self.image_writer = StepImageWriter()
+        # 步骤规则只在构造时编译一次
+        self.exam_rules = self._compile_steps(self.EXAM_STEPS)
+        self.reset_rules = self._compile_steps(self.RESET_STEPS)
+        self.exam_demand = self._compile_demand(self.EXAM_STEPS, self.EXAM_FLAG_SOURCES)
+        self.reset_demand = self._compile_demand(self.RESET_STEPS, self.RESET_FLAG_SOURCES)
+        self._demand_key = None
+        self._demand = None
+
+    def _compile_steps(self, steps: dict[int, list[tuple[int, str]]]) -> dict[str, tuple[tuple[int, str], ...]]:
+        """
+        把按模型序号声明的步骤规则编译成按权重路径索引的表
+
+        Args:
+            steps: {模型序号: [(标志序号, 步骤名), ...]}
+
+        Returns:
+            {权重路径: ((标志序号, 步骤名), ...)}，未配置的模型序号被忽略
+        """
+        return {self.weights_paths[index]: tuple(rules)
+                for index, rules in steps.items()
+                if index < len(self.weights_paths) and rules}
         
+    def _compile_demand(self, steps: dict[int, list[tuple[int, str]]],
+                        sources: dict[int, list[int]]) -> tuple[tuple[str, tuple[int, ...]], ...]:
+        """
+        编译每个步骤需要哪些模型运行才能确定
+
+        Args:
+            steps: {模型序号: [(标志序号, 步骤名), ...]}
+            sources: {标志序号: [其他来源模型序号, ...]}
+
+        Returns:
+            ((步骤名, (模型序号, ...)), ...)
+        """
+        demand = {}
+        for model_index, rules in steps.items():
+            for flag_index, step in rules:
+                models = demand.setdefault(step, set())
+                models.add(model_index)
+                models.update(sources.get(flag_index, ()))
+        num_models = len(self.weights_paths)
+        return tuple((step, tuple(sorted(m for m in models if m < num_models)))
+                     for step, models in demand.items())
+
+    def model_demand(self) -> list[bool]:
+        """
+        当前阶段（考试/复位）每个模型是否还有未确定的步骤
+
+        没有声明步骤规则的处理器所有模型都需要运行。结果按阶段和步骤图片的版本缓存，
+        init_exam_variables/init_reset_variables清空步骤图片后自动恢复所有相关模型
+
+        Returns:
+            按weights_paths顺序，每个模型是否需要运行
+        """
+        num_models = len(self.weights_paths)
+        if not (self.EXAM_STEPS or self.RESET_STEPS):
+            return [True] * num_models
+
+        exam = bool(self.exam_status.value)
+        imgs = self.exam_imgs if exam else getattr(self, 'reset_imgs', None)
+        key = (exam, imgs.version if imgs is not None else 0)
+        if key != self._demand_key:
+            demand = [False] * num_models
+            if imgs is not None:
+                for step, models in (self.exam_demand if exam else self.reset_demand):
+                    if step not in imgs:
+                        for model_index in models:
+                            demand[model_index] = True
+            self._demand, self._demand_key = demand, key
+        return self._demand
+
+    def reset_state(self):
+        """
+        把考试状态恢复为新建处理器时的初始值
+
+        常驻推理进程的处理器在每次启动检测前调用，依次调用子类已有的
+        init_exam_variables/init_reset_variables/init_variables并清空步骤分数
+        """
+        exam_status = getattr(self, 'exam_status', None)
+        if exam_status is not None:
+            exam_status.value = False
+        for name in ('init_exam_variables', 'init_reset_variables', 'init_variables'):
+            init = getattr(self, name, None)
+            if init is not None:
+                init()
+        if hasattr(self, 'exam_score'):
+            self.exam_score.clear()
+
+    def rate_phase(self) -> str:
+        """
+        当前考试阶段对应的帧率档位
+
+        没有exam_status的处理器（如穿戴检测）始终按考试帧率运行；考试进行中为exam，
+        否则声明了复位步骤的处理器为reset，其余为idle
+
+        Returns:
+            RATE_PHASES中的一个
+        """
+        exam_status = getattr(self, 'exam_status', None)
+        if exam_status is None or exam_status.value:
+            return "exam"
+        return "reset" if self.RESET_STEPS else "idle"
+
     @abstractmethod    
     def process_result(self, result, weights_path):
         """
@@ -32,4 +151,49 @@ class BaseResultProcessor(ABC):
         Returns:
             处理后的结果
         """
-        raise NotImplementedError("Subclasses must implement process_result method")
\ No newline at end of file
+        raise NotImplementedError("Subclasses must implement process_result method")
+
+    def save_step(self, result, weights_path):
+        """
+        按EXAM_STEPS/RESET_STEPS保存本帧完成的步骤
+
+        只检查当前模型尚未保存的步骤，所有标志从本进程的快照中读取
+
+        Args:
+            result: 模型推理结果
+            weights_path: 使用的模型权重路径
+        """
+        exam = self.exam_status.value
+        rules = (self.exam_rules if exam else self.reset_rules).get(weights_path)
+        if not rules:
+            return
+        flags, imgs = (self.exam_flag, self.exam_imgs) if exam else (self.reset_flag, self.reset_imgs)
+
+        pending = [(index, step) for index, step in rules if step not in imgs]
+        if not pending:
+            return
+
+        snapshot = flags.snapshot()
+        for index, step in pending:
+            if not snapshot[index]:
+                continue
+            if exam:
+                self.save_image_exam(self.exam_imgs, result, step, self.exam_order)
+                if hasattr(self, 'exam_score'):
+                    self.exam_score[step] = self.EXAM_SCORES.get(step, 0)
+            else:
+                self.save_image_reset(self.reset_imgs, result, step)
+
+    def save_result_image(self, result, imgpath):
+        """
+        异步保存带标注的结果图片，调用后即可发布图片URL
+
+        Args:
+            result: 模型推理结果
+            imgpath: 图片保存路径
+        """
+        self.image_writer.submit(result, imgpath)
+
+    def close(self):
+        """推理进程退出前调用，写完本进程排队中的图片"""
+        self.image_writer.flush()
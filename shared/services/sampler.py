@@ -0,0 +1,92 @@
+from multiprocessing import RawValue
+from typing import Optional
+from ..schemas import RATE_PHASES
+
+
+class FrameSampler:
+    """
+    Time-based frame sampler for one (stream, model) pair.
+
+    Frames are accepted at most ``target_fps`` times per second of capture time,
+    independent of the camera frame rate. The effective rate backs off
+    multiplicatively while the consumer queue is filling up and recovers
+    additively once it drains, so frames the consumer could not keep up with
+    are never decoded in the first place.
+    """
+
+    # Queue fill ratios that trigger back-off / recovery
+    HIGH_WATER = 0.5
+    LOW_WATER = 0.1
+    # Back-off factor, recovery step and floor of the rate scale
+    DECREASE = 0.5
+    INCREASE = 0.05
+    MIN_SCALE = 0.1
+
+    def __init__(self, target_fps: Optional[float]):
+        """
+        :param target_fps: Frames per second to accept, None or <= 0 accepts every frame
+        """
+        self.target_fps = target_fps
+        self.scale = 1.0
+        self._last_sample: Optional[float] = None
+
+    @property
+    def effective_fps(self) -> Optional[float]:
+        if not self.target_fps or self.target_fps <= 0:
+            return None
+        return self.target_fps * self.scale
+
+    def set_target_fps(self, target_fps: Optional[float]):
+        """Switch to a new target rate, keeping the back-off scale and the last sample time"""
+        self.target_fps = target_fps
+
+    def due(self, timestamp: float) -> bool:
+        """Whether a frame captured at ``timestamp`` (seconds) should be sampled"""
+        fps = self.effective_fps
+        if fps is None or self._last_sample is None:
+            return True
+        return timestamp - self._last_sample >= 1.0 / fps
+
+    def mark(self, timestamp: float):
+        """Record that a frame captured at ``timestamp`` was sampled"""
+        self._last_sample = timestamp
+
+    def report_backlog(self, fill_ratio: float):
+        """Adapt the rate to how full the consumer queue is (0.0 empty - 1.0 full)"""
+        if fill_ratio >= self.HIGH_WATER:
+            self.scale = max(self.MIN_SCALE, self.scale * self.DECREASE)
+        elif fill_ratio <= self.LOW_WATER and self.scale < 1.0:
+            self.scale = min(1.0, self.scale + self.INCREASE)
+
+
+class RateController:
+    """
+    The active rate profile, shared by all stream processes of a service.
+
+    The manager switches the phase when the exam state changes; stream processes
+    poll ``index`` before sampling and retarget their samplers when it changed,
+    so profiles take effect without restarting any process.
+    """
+
+    def __init__(self, phase: str = "exam"):
+        """
+        :param phase: Initial phase, one of RATE_PHASES; 'exam' keeps the configured full rates
+        """
+        self._index = RawValue('b', self._phase_index(phase))
+
+    @staticmethod
+    def _phase_index(phase: str) -> int:
+        if phase not in RATE_PHASES:
+            raise ValueError(f"Unknown rate phase '{phase}', expected one of {RATE_PHASES}")
+        return RATE_PHASES.index(phase)
+
+    @property
+    def index(self) -> int:
+        return self._index.value
+
+    @property
+    def phase(self) -> str:
+        return RATE_PHASES[self._index.value]
+
+    def set_phase(self, phase: str):
+        self._index.value = self._phase_index(phase)
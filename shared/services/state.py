@@ -0,0 +1,251 @@
+from multiprocessing import Lock, RawArray, RawValue
+from typing import Any, Iterator, Optional
+
+
+class _SharedState:
+    """
+    Base of the shared exam-state containers.
+
+    The data lives in a ``multiprocessing.Manager`` proxy, next to a version
+    counter in shared memory that every write bumps. Each process keeps a local
+    copy of the data and only fetches it again from the Manager when the version
+    has changed, so reads cost one shared-memory load instead of an IPC round
+    trip, and Manager traffic only happens when a step actually completes.
+    """
+
+    def __init__(self, proxy):
+        self._proxy = proxy
+        self._lock = Lock()
+        self._version = RawValue('Q', 1)
+        self._local_version = 0
+        self._local = None
+
+    def _fetch(self):
+        raise NotImplementedError
+
+    def _sync(self):
+        """Local copy of the data, refreshed from the Manager only after a write"""
+        # Read the version before the data: a write racing with the fetch leaves
+        # the newer version behind and triggers another fetch on the next read
+        version = self._version.value
+        if version != self._local_version:
+            self._local = self._fetch()
+            self._local_version = version
+        return self._local
+
+    def _publish(self, write) -> None:
+        with self._lock:
+            write(self._proxy)
+            self._version.value += 1
+
+    @property
+    def version(self) -> int:
+        return self._version.value
+
+    def __len__(self) -> int:
+        return len(self._sync())
+
+    def __iter__(self) -> Iterator:
+        return iter(self._sync())
+
+    def __contains__(self, item) -> bool:
+        return item in self._sync()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._sync()!r})"
+
+
+class SharedStateDict(_SharedState):
+    """Dict shared between processes with local reads, writes go through the Manager"""
+
+    def __init__(self, manager, initial: Optional[dict] = None):
+        """
+        :param manager: multiprocessing.Manager() that hosts the data
+        :param initial: Initial contents
+        """
+        super().__init__(manager.dict(initial or {}))
+
+    def _fetch(self) -> dict:
+        return self._proxy.copy()
+
+    def __getitem__(self, key):
+        return self._sync()[key]
+
+    def get(self, key, default=None):
+        return self._sync().get(key, default)
+
+    def keys(self):
+        return self._sync().keys()
+
+    def values(self):
+        return self._sync().values()
+
+    def items(self):
+        return self._sync().items()
+
+    def copy(self) -> dict:
+        return dict(self._sync())
+
+    def __setitem__(self, key, value):
+        local = self._sync()
+        if key in local and local[key] == value:
+            return  # unchanged, nothing to publish
+        self._publish(lambda proxy: proxy.__setitem__(key, value))
+
+    def update(self, values: dict):
+        local = self._sync()
+        changed = {k: v for k, v in values.items() if k not in local or local[k] != v}
+        if changed:
+            self._publish(lambda proxy: proxy.update(changed))
+
+    def clear(self):
+        self._publish(lambda proxy: proxy.clear())
+
+
+class SharedStateList(_SharedState):
+    """Append-only list shared between processes with local reads"""
+
+    def __init__(self, manager):
+        """
+        :param manager: multiprocessing.Manager() that hosts the data
+        """
+        super().__init__(manager.list())
+
+    def _fetch(self) -> list:
+        return self._proxy[:]
+
+    def __getitem__(self, index) -> Any:
+        return self._sync()[index]
+
+    def copy(self) -> list:
+        return list(self._sync())
+
+    def append(self, item):
+        self._publish(lambda proxy: proxy.append(item))
+
+    def clear(self):
+        self._publish(lambda proxy: proxy.__setitem__(slice(None), []))
+
+
+class SharedFlags:
+    """
+    Fixed-size set of boolean step flags shared between processes.
+
+    A drop-in for ``multiprocessing.Array('b', ...)`` without a lock on reads:
+    the flags live in a ``RawArray('b')``, so ``flags[i]`` is one shared-memory
+    load. Writing a value a flag already has costs the same single load. Only
+    an actual change takes the lock, stores the byte and bumps the version
+    counter, and a flag changes a handful of times per exam. A flag may have
+    several writers (models of different views, see ``EXAM_FLAG_SOURCES``):
+    the lock serialises their changes, reads stay lock-free. ``snapshot()``
+    returns a per-process copy of all flags that is only re-read after the
+    version has changed.
+    """
+
+    def __init__(self, size: int, initial: bool = False):
+        """
+        :param size: Number of flags
+        :param initial: Initial value of every flag
+        """
+        self._flags = RawArray('b', [1 if initial else 0] * size)
+        self._lock = Lock()
+        self._version = RawValue('Q', 1)
+        self._local_version = 0
+        self._local: tuple = ()
+
+    @property
+    def version(self) -> int:
+        return self._version.value
+
+    def snapshot(self) -> tuple:
+        """All flags at once, from the local copy unless a flag changed since the last call"""
+        version = self._version.value
+        if version != self._local_version:
+            self._local = tuple(bool(v) for v in self._flags[:])
+            self._local_version = version
+        return self._local
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self.snapshot()[index])
+        return self._flags[index] != 0
+
+    def __setitem__(self, index: int, value) -> None:
+        value = 1 if value else 0
+        if self._flags[index] == value:
+            return
+        with self._lock:
+            self._flags[index] = value
+            self._version.value += 1
+
+    def fill(self, value: bool = False) -> None:
+        """Set every flag to ``value``, e.g. when an exam starts"""
+        value = 1 if value else 0
+        with self._lock:
+            for i in range(len(self._flags)):
+                self._flags[i] = value
+            self._version.value += 1
+
+    def __len__(self) -> int:
+        return len(self._flags)
+
+    def __iter__(self) -> Iterator[bool]:
+        return iter(self.snapshot())
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({list(self.snapshot())!r})"
+
+
+class SnapshotChannel:
+    """
+    Request/response channel for on-demand snapshots of processed frames.
+
+    A client posts a request and gets an increasing ID back. The worker that owns
+    the frames checks ``pending`` on every processed frame, which is one
+    shared-memory load, and answers all outstanding requests at once with the
+    result of that frame. Clients poll ``result(request_id)`` without blocking
+    until their ID has been served, so the latency is one frame interval.
+    """
+
+    def __init__(self, manager):
+        """
+        :param manager: multiprocessing.Manager() that hosts the latest result
+        """
+        self._lock = Lock()
+        self._requested = RawValue('Q', 0)
+        self._fulfilled = RawValue('Q', 0)
+        self._result = SharedStateDict(manager)
+
+    def request(self) -> int:
+        """Post a snapshot request, returns its ID"""
+        with self._lock:
+            self._requested.value += 1
+            return self._requested.value
+
+    @property
+    def pending(self) -> bool:
+        """Whether a request is waiting for the next processed frame"""
+        return self._fulfilled.value < self._requested.value
+
+    @property
+    def latest_request(self) -> int:
+        """ID of the newest request posted so far, unique per answer when passed on to ``fulfil``"""
+        return self._requested.value
+
+    def fulfil(self, value, request_id: Optional[int] = None) -> None:
+        """
+        Answer requests with ``value``, called by the worker
+        :param request_id: Answer requests up to this ID (e.g. ``latest_request`` read before building
+                           the value); later ones stay pending. All requests posted so far when None
+        """
+        if request_id is None:
+            request_id = self._requested.value
+        # Publish the result before the ID so a client never sees its ID served without a result
+        self._result.update({"value": value})
+        self._fulfilled.value = request_id
+
+    def result(self, request_id: int) -> Optional[Any]:
+        """The snapshot served for ``request_id``, or a newer one; None while it is still pending"""
+        if self._fulfilled.value < request_id:
+            return None
+        return self._result.get("value")
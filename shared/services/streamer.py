@@ -1,30 +1,75 @@
-from multiprocessing import Queue, Event, Process
-import cv2
-from contextlib import contextmanager
+from multiprocessing import Queue, Event, Process, RawArray
 import logging
 import time
 from queue import Full, Empty
-from typing import List, Optional
+from typing import List, Optional, Dict
+from .frame_buffer import SharedFrameRing, FrameRef, FrameMailbox
+from .decoders import BaseDecoder, create_decoder
+from .sampler import FrameSampler, RateController, RATE_PHASES
+from .change_detector import ChangeDetector
+from .metrics import PipelineMetrics
 
 # Use basic logging if specific logger not provided
 logger = logging.getLogger("shared_services")
 
+FRAME_DELIVERY_MODES = ("queue", "mailbox")
+# Stream health states, stored per stream as an index into this tuple
+STREAM_STATES = ("connecting", "connected", "reconnecting", "stopped")
+CONNECTING, CONNECTED, RECONNECTING, STOPPED = range(len(STREAM_STATES))
+
 class BaseVideoStreamer:
-    def __init__(self, stream_configs: list, num_models: int, custom_logger=None):
+    def __init__(self, stream_configs: list, num_models: int, custom_logger=None,
+                 delivery: str = "queue", metrics: Optional[PipelineMetrics] = None,
+                 rate_controller: Optional[RateController] = None, startup_timeout: Optional[float] = None):
         """
         Initialize video stream manager
         :param stream_configs: Configuration for each video stream
         :param num_models: Total number of models
         :param custom_logger: Optional custom logger
+        :param delivery: "queue" buffers up to queue_size frames per model,
+                         "mailbox" keeps only the newest frame per model
+        :param metrics: Optional shared metrics the stream processes record latencies and drops into
+        :param rate_controller: Shared active rate profile; streams sample at the 'exam' (configured) rates when None
+        :param startup_timeout: Seconds start_streams waits for the streams to connect; streams that miss
+                                the deadline keep reconnecting in the background. None waits for every stream
         """
+        if delivery not in FRAME_DELIVERY_MODES:
+            raise ValueError(f"Unknown frame delivery '{delivery}', expected one of {FRAME_DELIVERY_MODES}")
         self.stream_configs = stream_configs
         self.num_models = num_models
         self.logger = custom_logger or logger
+        self.delivery = delivery
+        self.metrics = metrics
+        self.rate_controller = rate_controller or RateController()
+        self.startup_timeout = startup_timeout
+        
+        if delivery == "mailbox":
+            # Latest-frame-only delivery: a new frame replaces the one the model has not picked up yet
+            self.frame_queues = [FrameMailbox() for _ in range(self.num_models)]
+        else:
+            # Create frame queues for each model using unified queue_size
+            # All queues use the same size from config (assuming all configs have same queue_size)
+            queue_size = stream_configs[0].queue_size if stream_configs else 100
+            self.frame_queues = [Queue(maxsize=queue_size) for _ in range(self.num_models)]
+
+        # One shared-memory ring per stream: frames are decoded into a slot once and
+        # only FrameRef handles travel through the queues
+        self.frame_buffers = [
+            SharedFrameRing(config.buffer_slots, config.max_frame_shape)
+            for config in stream_configs
+        ]
         
-        # Create frame queues for each model using unified queue_size
-        # All queues use the same size from config (assuming all configs have same queue_size)
-        queue_size = stream_configs[0].queue_size if stream_configs else 100
-        self.frame_queues = [Queue(maxsize=queue_size) for _ in range(self.num_models)]
+        # Set after every distributed frame so consumers can sleep instead of polling
+        self.frame_ready = Event()
+
+        # Smoothed per-frame decode time (ms) of each stream, written by its stream process
+        self.decode_times = RawArray('d', len(stream_configs))
+
+        # Stream health, written by the stream processes: state index into STREAM_STATES,
+        # capture time of the last grabbed frame and number of reconnects
+        self.stream_states = RawArray('b', [STOPPED] * len(stream_configs))
+        self.last_frame_times = RawArray('d', len(stream_configs))
+        self.reconnects = RawArray('Q', len(stream_configs))
         
         # Process and event management
         self.processes: List[Process] = []
@@ -32,8 +77,18 @@ class BaseVideoStreamer:
         self.stop_events = [Event() for _ in range(len(stream_configs))]
         self.reconnect_delays = [1.0] * len(stream_configs)  # Exponential backoff delays
 
-    def start_streams(self):
+    def start_streams(self) -> List[int]:
+        """
+        Start one process per stream; they connect concurrently
+        :return: Indices of the streams connected within startup_timeout
+        """
+        # Streams can be restarted on the same rings and queues, clear the events of the previous run
+        for start_event, stop_event in zip(self.start_events, self.stop_events):
+            start_event.clear()
+            stop_event.clear()
+
         for i, config in enumerate(self.stream_configs):
+            self.stream_states[i] = CONNECTING
             process = Process(
                 target=self._fetch_video_stream,
                 args=(config, i, self.start_events[i], self.stop_events[i])
@@ -41,12 +96,20 @@ class BaseVideoStreamer:
             process.start()
             self.processes.append(process)
             
-        # Wait for all processes to start
+        # Wait for the streams to connect, bounded by the startup deadline
+        deadline = None if self.startup_timeout is None else time.monotonic() + self.startup_timeout
         for event in self.start_events:
-            event.wait()
+            event.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+        connected = [i for i, event in enumerate(self.start_events) if event.is_set()]
+        for i, config in enumerate(self.stream_configs):
+            if i not in connected:
+                self.logger.warning(f"Stream {config.rtsp_url} not connected after {self.startup_timeout}s, "
+                                    f"reconnecting in the background")
+        return connected
             
     def stop_streams(self):
-        """Stop all video streams and cleanup resources"""
+        """Stop all video streams; the frame rings and queues stay usable for the next start_streams"""
         # Stop all processes
         for stop_event in self.stop_events:
             stop_event.set()
@@ -69,6 +132,19 @@ class BaseVideoStreamer:
         
         self.processes.clear()
         self.logger.info("All streams stopped")
+
+    def close(self):
+        """Stop all streams and release the shared frame rings"""
+        if self.processes:
+            self.stop_streams()
+        self._release_buffers()
+
+    def _release_buffers(self):
+        """Unlink the shared frame rings, processes that still map them keep a valid view"""
+        for buffer in self.frame_buffers:
+            buffer.close()
+            buffer.unlink()
+        self.frame_buffers = []
     
     def _clear_queues(self):
         """Clear all frame queues to prevent memory leaks"""
@@ -89,10 +165,14 @@ class BaseVideoStreamer:
         reconnect_delay = 1.0
         max_reconnect_delay = 60.0
         frame_count = 0  # Manual frame counting - more reliable than CAP_PROP_POS_FRAMES for RTSP
+        samplers = self._create_samplers(config)
+        change_detector = self._create_change_detector(config)
+        rate_phase = None  # Index of the rate profile the samplers are currently set to
         
         while not stop_event.is_set():
             try:
-                with self._video_capture(config.rtsp_url) as cap:
+                with self._open_decoder(config) as decoder:
+                    self.stream_states[index] = CONNECTED
                     if not stream_started:
                         start_event.set()
                         stream_started = True
@@ -100,26 +180,72 @@ class BaseVideoStreamer:
                         reconnect_delay = 1.0  # Reset delay on successful connection
                     
                     while not stop_event.is_set():
-                        # Grab frame from buffer without decoding (fast operation)
-                        ret = cap.grab()
+                        # Advance to the next frame as cheaply as the backend allows
+                        ret = decoder.grab()
                         if not ret:
                             self.logger.warning(f"Failed to grab frame from {config.rtsp_url}")
                             break
                         
                         frame_count += 1
+                        capture_time = decoder.last_capture_time
+                        self.last_frame_times[index] = capture_time
                         
-                        # Apply frame skip logic - only retrieve and decode needed frames
-                        if frame_count % config.frame_skip != 0:
-                            continue  # Skip frame without expensive decoding
+                        if samplers:
+                            if self.rate_controller.index != rate_phase:
+                                rate_phase = self.rate_controller.index
+                                self._apply_rate_profile(config, samplers, RATE_PHASES[rate_phase])
+                            # Time-based sampling: decode only when at least one model is due a frame
+                            due_models = [m for m, sampler in samplers.items() if sampler.due(capture_time)]
+                            if not due_models:
+                                continue  # Skip frame without expensive decoding
+                        else:
+                            # Legacy frame skip logic - only retrieve and decode needed frames
+                            if frame_count % config.frame_skip != 0:
+                                continue  # Skip frame without expensive decoding
+                            due_models = config.target_models
                         
                         # Retrieve and decode the current frame (only for frames we need)
-                        ret, frame = cap.retrieve()
-                        if not ret:
+                        frame = decoder.retrieve()
+                        if frame is None:
                             self.logger.warning(f"Failed to retrieve frame from {config.rtsp_url}")
                             continue
+                        decoded_time = time.time()
+                        self._record_decode_time(index, decoder.last_decode_time)
+
+                        # Write the frame into shared memory once, then hand out references
+                        ring = self.frame_buffers[index]
+                        if not ring.fits(frame):
+                            self.logger.error(f"Frame {frame.shape} from {config.rtsp_url} exceeds "
+                                              f"max_frame_shape {ring.max_shape}, dropped")
+                            continue
+
+                        # Backlog as the models left it, before this frame is queued: measured after the
+                        # put, a mailbox would always read full and back off on every sampled frame
+                        backlog = self._backlog(due_models, ring.slots) if samplers else {}
+
+                        send_models = due_models
+                        if change_detector and any(m in config.change_models for m in due_models) \
+                                and not change_detector.changed(frame, capture_time):
+                            # Static scene: the gated models keep their last result
+                            send_models = [m for m in due_models if m not in config.change_models]
+                            if self.metrics:
+                                for model_idx in due_models:
+                                    if model_idx in config.change_models:
+                                        self.metrics.count_stream_drop(index, model_idx, "unchanged")
+
+                        if send_models:
+                            slot, seq = ring.write(frame, capture_time)
+
+                            # Distribute frame reference to the target model queues that are due a frame
+                            frame_ref = FrameRef(index, slot, seq, capture_time, decoded_time, time.time())
+                            self._distribute_frame_safely(frame_ref, send_models, config.rtsp_url)
+                            if self.metrics:
+                                self.metrics.record_stream(index, "decode", decoded_time - capture_time)
+                                self.metrics.record_stream(index, "enqueue", frame_ref.enqueued - decoded_time)
 
-                        # Distribute frame to all target model queues for this stream
-                        self._distribute_frame_safely(frame, config.target_models, config.rtsp_url)
+                        for model_idx in due_models if samplers else ():
+                            samplers[model_idx].mark(capture_time)
+                            samplers[model_idx].report_backlog(backlog[model_idx])
                         
             except ConnectionError as e:
                 self.logger.error(f"Connection error for {config.rtsp_url}: {e}")
@@ -127,20 +253,62 @@ class BaseVideoStreamer:
                 self.logger.error(f"Unexpected error in stream {config.rtsp_url}: {e}")
             
             if not stop_event.is_set():
+                self.stream_states[index] = RECONNECTING
+                self.reconnects[index] += 1
                 self.logger.info(f"Reconnecting to {config.rtsp_url} in {reconnect_delay:.1f}s")
-                time.sleep(reconnect_delay)
+                stop_event.wait(reconnect_delay)
                 reconnect_delay = min(reconnect_delay * 2, max_reconnect_delay)
                 
+        self.stream_states[index] = STOPPED
         self.logger.info(f"Stopped stream: {config.rtsp_url}")
     
-    def _distribute_frame_safely(self, frame, target_models, rtsp_url: str):
-        """Safely distribute frame to target model queues"""
+    def _create_samplers(self, config) -> Dict[int, FrameSampler]:
+        """One time-based sampler per target model, empty when the stream uses frame_skip"""
+        if not config.target_fps:
+            return {}
+        return {
+            model_idx: FrameSampler(config.model_fps.get(model_idx, config.target_fps))
+            for model_idx in config.target_models
+        }
+
+    def _create_change_detector(self, config) -> Optional[ChangeDetector]:
+        """Scene-change gate of a stream, None when the stream has no change_threshold"""
+        if config.change_threshold is None or not config.change_models:
+            return None
+        return ChangeDetector(config.change_threshold, config.change_refresh)
+
+    def _apply_rate_profile(self, config, samplers: Dict[int, FrameSampler], phase: str):
+        """Retarget the samplers of a stream to the rates of an exam phase"""
+        profile = config.phase_fps.get(phase, {})
+        for model_idx, sampler in samplers.items():
+            sampler.set_target_fps(profile.get(model_idx, config.model_fps.get(model_idx, config.target_fps)))
+        self.logger.info(f"Stream {config.rtsp_url} switched to the '{phase}' rate profile")
+
+    def _backlog(self, model_indices, ring_slots: int) -> Dict[int, float]:
+        """Fill ratio of each model's queue; a mailbox reads 1.0 while it holds an unconsumed ref, else 0.0"""
+        return {model_idx: self._queue_fill_ratio(model_idx, ring_slots) for model_idx in model_indices}
+
+    def _queue_fill_ratio(self, model_idx: int, ring_slots: int) -> float:
+        """
+        Backlog of a model queue relative to the frames it can usefully hold: refs older than
+        the stream's ring slots point at overwritten frames, so the ring bounds the queue
+        """
+        queue = self.frame_queues[model_idx]
+        try:
+            return queue.qsize() / max(1, min(queue._maxsize, ring_slots))
+        except (NotImplementedError, AttributeError):
+            return 0.0  # qsize() is unavailable on some platforms
+
+    def _distribute_frame_safely(self, frame: FrameRef, target_models, rtsp_url: str):
+        """Safely distribute a frame reference to target model queues"""
         for model_idx in sorted(target_models):  # Sort for consistent ordering
             if model_idx >= len(self.frame_queues):
                 self.logger.error(f"Invalid model index {model_idx} for stream {rtsp_url}")
                 continue
                 
             try:
+                if self.metrics and self.delivery == "mailbox" and self.frame_queues[model_idx].qsize():
+                    self.metrics.count_stream_drop(frame.stream, model_idx, "mailbox_overwritten")
                 self.frame_queues[model_idx].put_nowait(frame)
             except Full:
                 # Queue is full, remove oldest frame and add new one
@@ -148,40 +316,25 @@ class BaseVideoStreamer:
                     self.frame_queues[model_idx].get_nowait()
                     self.frame_queues[model_idx].put_nowait(frame)
                     self.logger.debug(f"Dropped frame for model {model_idx} (queue full)")
+                    if self.metrics:
+                        self.metrics.count_stream_drop(frame.stream, model_idx, "queue_full")
                 except (Full, Empty):
                     self.logger.warning(f"Failed to add frame to queue for model {model_idx}")
             except Exception as e:
                 self.logger.error(f"Error distributing frame to model {model_idx}: {e}")
+        self.frame_ready.set()
+
+    def _open_decoder(self, config) -> BaseDecoder:
+        """Create the decoder backend configured for a stream, used as a context manager"""
+        return create_decoder(config.decoder, config.rtsp_url,
+                              keyframes_only=config.keyframes_only, custom_logger=self.logger)
+
+    def _record_decode_time(self, index: int, decode_time: float, smoothing: float = 0.1):
+        """Keep an exponential moving average of the decode time in milliseconds"""
+        decode_ms = decode_time * 1000.0
+        previous = self.decode_times[index]
+        self.decode_times[index] = decode_ms if previous == 0 else previous + smoothing * (decode_ms - previous)
 
-    @contextmanager
-    def _video_capture(self, rtsp_url: str):
-        """Video capture context manager with better error handling"""
-        cap = None
-        try:
-            cap = cv2.VideoCapture(rtsp_url)
-            if not cap.isOpened():
-                raise ConnectionError(f"Failed to open stream: {rtsp_url}")
-            
-            # Set capture properties for better performance
-            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Reduce buffer to minimize latency
-            cap.set(cv2.CAP_PROP_FPS, 30)  # Set desired FPS
-            
-            # Try to enable hardware acceleration if available
-            try:
-                cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'H264'))
-            except:
-                pass  # Hardware acceleration not available
-            
-            yield cap
-            
-        except Exception as e:
-            if cap:
-                cap.release()
-            raise ConnectionError(f"Video capture error for {rtsp_url}: {e}")
-        finally:
-            if cap:
-                cap.release()
-    
     def get_queue_status(self) -> dict:
         """Get status information about all queues"""
         status = {}
@@ -193,12 +346,21 @@ class BaseVideoStreamer:
         return status
     
     def get_stream_status(self) -> dict:
-        """Get status of all streams"""
+        """Get status and health of all streams"""
         status = {}
-        for i, (config, process) in enumerate(zip(self.stream_configs, self.processes)):
+        now = time.time()
+        for i, config in enumerate(self.stream_configs):
+            process = self.processes[i] if i < len(self.processes) else None
+            alive = process is not None and process.is_alive()
+            last_frame = self.last_frame_times[i]
             status[f"stream_{i}"] = {
                 "url": config.rtsp_url,
-                "alive": process.is_alive() if process else False,
-                "pid": process.pid if process and process.is_alive() else None
+                "decoder": config.decoder,
+                "state": STREAM_STATES[self.stream_states[i]] if alive else STREAM_STATES[STOPPED],
+                "last_frame_age": round(now - last_frame, 2) if last_frame else None,
+                "reconnects": self.reconnects[i],
+                "decode_ms": round(self.decode_times[i], 2),
+                "alive": alive,
+                "pid": process.pid if alive else None
             }
         return status
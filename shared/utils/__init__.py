@@ -7,13 +7,18 @@ from .geometry import (
     is_boxes_intersect,
     is_point_in_polygon,
     calculate_mask_rect_iou,
+    calculate_masks_regions_iou,
     is_point_in_rect,
     calculate_rect_polygon_iou
 )
 
+from .regions import RegionSet
+from .pose import keypoint_arrays, keypoints_in_regions
+
 from .config import (
     ConfigManager,
     config_manager,
+    redact_url,
     get_service_config,
     get_service_names,
     get_service_models,
@@ -26,11 +31,17 @@ __all__ = [
     'is_boxes_intersect',
     'is_point_in_polygon',
     'calculate_mask_rect_iou',
+    'calculate_masks_regions_iou',
     'is_point_in_rect',
     'calculate_rect_polygon_iou',
+    'RegionSet',
+    # 姿态关键点规则
+    'keypoint_arrays',
+    'keypoints_in_regions',
     # YAML配置函数
     'ConfigManager',
     'config_manager',
+    'redact_url',
     'get_service_config',
     'get_service_names',
     'get_service_models',
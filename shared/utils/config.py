@@ -3,7 +3,24 @@
 import yaml
 from pathlib import Path
 from typing import List, Set, Dict, Any
-from shared.schemas import StreamConfig, ServerConfig
+from urllib.parse import urlsplit, urlunsplit
+from shared.schemas import StreamConfig, ServerConfig, ModelSettings, RATE_PHASES
+
+
+def redact_url(url: str) -> str:
+    """Strip the credentials from a stream URL so it can be shown by the API and in metrics."""
+    parts = urlsplit(url)
+    if not parts.username and not parts.password:
+        return url
+    host = parts.hostname + (f":{parts.port}" if parts.port else "")
+    return urlunsplit(parts._replace(netloc=host))
+
+
+def model_file(model_entry) -> str:
+    """Return the weights filename of a models list entry (plain string or mapping with 'file')."""
+    if isinstance(model_entry, dict):
+        return model_entry['file']
+    return model_entry
 
 
 class ConfigManager:
@@ -65,39 +82,72 @@ class ConfigManager:
         # Get GPU device configuration
         defaults = global_config.get('defaults', {})
         gpu_device = service_config.get('gpu_device', defaults.get('gpu_device', 0))
+
+        # Inference settings: service section overrides global defaults key by key
+        inference = {**defaults.get('inference', {}), **service_config.get('inference', {})}
+
+        # Shared model server: enabled globally, services may opt out with model_server: false
+        model_server = global_config.get('model_server', {})
+        use_model_server = service_config.get('model_server', model_server.get('enabled', False))
+        model_server_socket = model_server.get('socket') if use_model_server else None
         
-        # Build weights paths from simplified models list
+        # Build weights paths and per-model inference settings from the models list.
+        # Entries are either a filename or a mapping with 'file' plus inference overrides.
         weights_paths = []
+        model_settings = []
+        default_settings = defaults.get('model_settings', {})
         models = service_config.get('models', [])
-        for weight_file in models:
-            # weight_file is now directly the filename string
-            weight_path = str(weights_base_dir / weight_file)
+        for model_entry in models:
+            weight_path = str(weights_base_dir / model_file(model_entry))
             weights_paths.append(weight_path)
+
+            overrides = {k: v for k, v in model_entry.items() if k != 'file'} if isinstance(model_entry, dict) else {}
+            model_settings.append(ModelSettings(**{**default_settings, **overrides}))
         
         # Create stream configurations from streams list
-        stream_configs = self._create_stream_configs(service_config, global_config)
+        stream_configs = self._create_stream_configs(service_config, global_config, model_settings)
         
         return ServerConfig(
             server_ip=server_ip,
             server_port=server_port,
             weights_paths=weights_paths,
+            model_settings=model_settings,
             images_dir=images_dir,
             static_mount_path=static_mount_path,
             img_url_path=img_url_path,
             stream_configs=stream_configs,
-            gpu_device=gpu_device
+            gpu_device=gpu_device,
+            inference_mode=inference.get('mode', 'per_model'),
+            batch_size=inference.get('batch_size', 8),
+            batch_wait_ms=inference.get('batch_wait_ms', 20.0),
+            model_server_socket=model_server_socket,
+            frame_delivery=service_config.get('delivery', defaults.get('delivery', 'queue')),
+            max_frame_age=service_config.get('max_frame_age', defaults.get('max_frame_age')),
+            stream_startup_timeout=service_config.get('stream_startup_timeout',
+                                                      defaults.get('stream_startup_timeout', 15.0)),
+            warm_pool=service_config.get('warm_pool', defaults.get('warm_pool', True)),
+            model_heartbeat=service_config.get('model_heartbeat', defaults.get('model_heartbeat', 1.0))
         )
     
-    def _create_stream_configs(self, service_config: Dict[str, Any], global_config: Dict[str, Any]) -> List[StreamConfig]:
+    def _create_stream_configs(self, service_config: Dict[str, Any], global_config: Dict[str, Any],
+                               model_settings: List[ModelSettings] = None) -> List[StreamConfig]:
         """Create stream configurations from service config."""
         configs = []
         defaults = global_config.get('defaults', {})
         queue_size = defaults.get('queue_size', 100)
         frame_skip = defaults.get('frame_skip', 10)
+        buffer_slots = defaults.get('buffer_slots', 8)
+        max_frame_shape = tuple(defaults.get('max_frame_shape', (1440, 2560, 3)))
+        decoder = defaults.get('decoder', 'opencv')
+        target_fps = defaults.get('target_fps')
+        model_settings = model_settings or []
         
         # Get models list to create model to index mapping
         models = service_config.get('models', [])
-        model_to_index = {model: idx for idx, model in enumerate(models)}
+        model_to_index = {model_file(model): idx for idx, model in enumerate(models)}
+
+        # Rate profiles per exam phase: service section overrides global defaults phase by phase
+        rate_profiles = {**defaults.get('rate_profiles', {}), **service_config.get('rate_profiles', {})}
         
         streams = service_config.get('streams', [])
         for stream in streams:
@@ -111,25 +161,102 @@ class ConfigManager:
                     target_models.add(model_to_index[model_name])
                 else:
                     raise ValueError(f"Model '{model_name}' not found in models list for service")
+
+            # Per-model target_fps from the models list overrides the stream rate
+            model_fps = {
+                idx: model_settings[idx].target_fps
+                for idx in target_models
+                if idx < len(model_settings) and model_settings[idx].target_fps
+            }
+            phase_fps = {
+                phase: self._profile_fps(phase, profile or {}, target_models, model_to_index)
+                for phase, profile in rate_profiles.items()
+            }
+            # Scene-change gate: stream entry overrides global defaults key by key
+            change_gate = {**(defaults.get('change_gate') or {}), **(stream.get('change_gate') or {})}
+            change_models = self._change_models(change_gate, target_models, model_to_index)
             
             config = StreamConfig(
                 rtsp_url=rtsp_url,
                 queue_size=queue_size,
                 frame_skip=frame_skip,
-                target_models=target_models
+                target_models=target_models,
+                buffer_slots=stream.get('buffer_slots', buffer_slots),
+                max_frame_shape=tuple(stream.get('max_frame_shape', max_frame_shape)),
+                decoder=stream.get('decoder', decoder),
+                keyframes_only=stream.get('keyframes_only', False),
+                target_fps=stream.get('target_fps', target_fps),
+                model_fps=model_fps,
+                phase_fps=phase_fps,
+                change_threshold=change_gate.get('threshold'),
+                change_refresh=change_gate.get('refresh', 5.0),
+                change_models=change_models
             )
             configs.append(config)
         
         return configs
     
+    @staticmethod
+    def _profile_fps(phase: str, profile: Dict[str, Any], target_models: set,
+                     model_to_index: Dict[str, int]) -> Dict[int, float]:
+        """Resolve one rate profile to a target FPS per model of a stream."""
+        if phase not in RATE_PHASES:
+            raise ValueError(f"Unknown rate profile '{phase}', expected one of {RATE_PHASES}")
+        model_rates = profile.get('models', {})
+        for model_name in model_rates:
+            if model_name not in model_to_index:
+                raise ValueError(f"Model '{model_name}' in rate profile '{phase}' not found in models list for service")
+
+        fps = {}
+        for idx in target_models:
+            name = next(name for name, i in model_to_index.items() if i == idx)
+            rate = model_rates.get(name, profile.get('target_fps'))
+            if rate is None:
+                continue  # Keep the configured rate of this model
+            if rate <= 0:
+                raise ValueError(f"Rate profile '{phase}' must use a positive target_fps, got {rate} for '{name}'")
+            fps[idx] = rate
+        return fps
+
+    @staticmethod
+    def _change_models(change_gate: Dict[str, Any], target_models: set,
+                       model_to_index: Dict[str, int]) -> set:
+        """Resolve the models a stream's scene-change gate applies to; no list means all of the stream's models."""
+        if change_gate.get('threshold') is None:
+            return set()
+        if not 0 < change_gate['threshold'] <= 1:
+            raise ValueError(f"change_gate threshold must be in (0, 1], got {change_gate['threshold']}")
+        model_names = change_gate.get('models')
+        if not model_names:
+            return set(target_models)
+        change_models = set()
+        for model_name in model_names:
+            if model_name not in model_to_index:
+                raise ValueError(f"Model '{model_name}' in change_gate not found in models list for service")
+            change_models.add(model_to_index[model_name])
+        return change_models & target_models
+
+    def get_hub_cameras(self) -> Dict[str, bool]:
+        """Camera URLs any service subscribes to through the camera hub, with whether key frames suffice."""
+        defaults = self.get_global_config().get('defaults', {})
+        cameras = {}
+        for service_config in self._config.get('services', {}).values():
+            for stream in service_config.get('streams', []):
+                if stream.get('decoder', defaults.get('decoder', 'opencv')) != 'hub':
+                    continue
+                # Key frames only is used when every subscriber of the camera asks for it
+                keyframes_only = stream.get('keyframes_only', False)
+                cameras[stream['url']] = cameras.get(stream['url'], True) and keyframes_only
+        return cameras
+
     def get_service_names(self) -> List[str]:
         """Get list of all configured service names."""
         return list(self._config.get('services', {}).keys())
     
     def get_service_models(self, service_name: str) -> List[str]:
-        """Get model configurations for a service."""
+        """Get model weight filenames for a service."""
         service_config = self.get_service_config(service_name)
-        return service_config.get('models', [])
+        return [model_file(model) for model in service_config.get('models', [])]
     
     def get_service_streams(self, service_name: str) -> List[Dict[str, Any]]:
         """Get stream configurations for a service."""
@@ -152,7 +279,7 @@ def get_service_names() -> List[str]:
 
 
 def get_service_models(service_name: str) -> List[str]:
-    """Get model configurations for a service."""
+    """Get model weight filenames for a service."""
     return config_manager.get_service_models(service_name)
 
 
@@ -57,6 +57,95 @@ def is_point_in_polygon(point: tuple[int, int], polygon: list[tuple[int, int]])
     
     return result >= 0
 
+def _rasterize_polygon(points: np.ndarray) -> tuple[np.ndarray, int, int]:
+    """
+    只在多边形的外接矩形范围内栅格化多边形
+
+    与在整幅画布上fillPoly得到的像素完全一致（顶点先截断为整数，负坐标部分被裁掉），
+    但只需分配外接矩形大小的内存
+
+    参数:
+        points: 多边形顶点数组，形状为(n,2)
+
+    返回:
+        tuple: (局部二值图, 局部图左上角x, 局部图左上角y)，多边形完全在画布外时局部图为空
+    """
+    points = np.asarray(points).reshape(-1, 2).astype(np.int32)
+    x0, y0 = max(int(points[:, 0].min()), 0), max(int(points[:, 1].min()), 0)
+    x1, y1 = int(points[:, 0].max()), int(points[:, 1].max())
+    if x1 < 0 or y1 < 0:
+        return np.zeros((0, 0), dtype=np.uint8), 0, 0
+
+    local = np.zeros((y1 - y0 + 1, x1 - x0 + 1), dtype=np.uint8)
+    cv2.fillPoly(local, [(points - (x0, y0)).reshape((-1, 1, 2))], 1)
+    return local, x0, y0
+
+
+def _rect_pixels(rect: tuple[int, int, int, int]) -> tuple[int, int, int, int, int]:
+    """
+    矩形在画布上覆盖的像素范围（含边界，负坐标部分被裁掉）及像素数
+    """
+    x1, y1, x2, y2 = (int(v) for v in rect)
+    x1, x2 = min(x1, x2), max(x1, x2)
+    y1, y2 = min(y1, y2), max(y1, y2)
+    x1, y1 = max(x1, 0), max(y1, 0)
+    area = max(x2 - x1 + 1, 0) * max(y2 - y1 + 1, 0)
+    return x1, y1, x2, y2, area
+
+
+def _local_iou(integral: np.ndarray, x0: int, y0: int, poly_area: int,
+               rect: tuple[int, int, int, int]) -> float:
+    """
+    利用局部栅格的积分图计算多边形与矩形的IoU
+
+    参数:
+        integral: 局部二值图的积分图（cv2.integral的结果）
+        x0, y0: 局部图左上角在画布中的坐标
+        poly_area: 多边形像素数
+        rect: 矩形区域(x1, y1, x2, y2)
+    """
+    rx1, ry1, rx2, ry2, rect_area = _rect_pixels(rect)
+    height, width = integral.shape[0] - 1, integral.shape[1] - 1
+
+    # 矩形与局部图的重叠部分（局部坐标，右下角不含）
+    ix1, iy1 = max(rx1 - x0, 0), max(ry1 - y0, 0)
+    ix2, iy2 = min(rx2 - x0 + 1, width), min(ry2 - y0 + 1, height)
+    intersection = 0
+    if ix1 < ix2 and iy1 < iy2:
+        intersection = int(integral[iy2, ix2] - integral[iy1, ix2] - integral[iy2, ix1] + integral[iy1, ix1])
+
+    union = poly_area + rect_area - intersection
+    if union == 0:
+        return 0.0
+    return intersection / union
+
+
+def calculate_masks_regions_iou(masks: list, rects: list[tuple[int, int, int, int]]) -> np.ndarray:
+    """
+    批量计算多个掩码与多个矩形区域的交并比(IoU)
+
+    每个掩码只在自身外接矩形内栅格化一次，再通过积分图在O(1)时间内得到与每个矩形的交集，
+    结果与calculate_mask_rect_iou逐个计算完全一致
+
+    参数:
+        masks: 掩码点坐标数组的列表，每个形状为(n,2)，如r.masks.xy
+        rects: 矩形区域列表，每个格式为(x1, y1, x2, y2)
+
+    返回:
+        np.ndarray: 形状为(len(masks), len(rects))的IoU矩阵
+    """
+    ious = np.zeros((len(masks), len(rects)), dtype=np.float64)
+    for i, mask in enumerate(masks):
+        if len(mask) == 0:
+            continue
+        local, x0, y0 = _rasterize_polygon(mask)
+        integral = cv2.integral(local)
+        poly_area = int(integral[-1, -1])
+        for j, rect in enumerate(rects):
+            ious[i, j] = _local_iou(integral, x0, y0, poly_area, rect)
+    return ious
+
+
 def calculate_mask_rect_iou(mask: np.ndarray, rect: tuple[int, int, int, int]) -> float:
     """
     计算掩码与矩形区域的交并比(IoU)
@@ -70,31 +159,7 @@ def calculate_mask_rect_iou(mask: np.ndarray, rect: tuple[int, int, int, int]) -
     """
     if len(mask) == 0:
         return 0.0
-    
-    # 创建掩码的二值图像
-    x1_rect, y1_rect, x2_rect, y2_rect = rect
-    width = max(x2_rect, np.max(mask[:, 0]).astype(int)) + 1
-    height = max(y2_rect, np.max(mask[:, 1]).astype(int)) + 1
-    
-    # 创建掩码图像
-    mask_img = np.zeros((height, width), dtype=np.uint8)
-    mask_points = np.array(mask, dtype=np.int32).reshape((-1, 1, 2))
-    cv2.fillPoly(mask_img, [mask_points], 1)
-    
-    # 创建矩形图像
-    rect_img = np.zeros((height, width), dtype=np.uint8)
-    cv2.rectangle(rect_img, (x1_rect, y1_rect), (x2_rect, y2_rect), 1, -1)
-    
-    # 计算交集和并集
-    intersection = np.logical_and(mask_img, rect_img).sum()
-    union = np.logical_or(mask_img, rect_img).sum()
-    
-    # 计算IoU
-    if union == 0:
-        return 0.0
-    iou = intersection / union
-    
-    return iou
+    return float(calculate_masks_regions_iou([mask], [rect])[0, 0])
 
 def calculate_rect_polygon_iou(rect: tuple[int, int, int, int], polygon: list[tuple[int, int]]) -> float:
     """
@@ -109,33 +174,7 @@ def calculate_rect_polygon_iou(rect: tuple[int, int, int, int], polygon: list[tu
     """
     if len(polygon) == 0:
         return 0.0
-    
-    # 提取矩形坐标
-    x1_rect, y1_rect, x2_rect, y2_rect = rect
-    
-    # 确定画布大小
-    polygon_array = np.array(polygon)
-    width = max(x2_rect, np.max(polygon_array[:, 0]).astype(int)) + 1
-    height = max(y2_rect, np.max(polygon_array[:, 1]).astype(int)) + 1
-    
-    # 创建矩形掩码
-    rect_mask = np.zeros((height, width), dtype=np.uint8)
-    cv2.rectangle(rect_mask, (x1_rect, y1_rect), (x2_rect, y2_rect), 1, -1)
-    
-    # 创建多边形掩码
-    poly_mask = np.zeros((height, width), dtype=np.uint8)
-    poly_points = np.array(polygon, dtype=np.int32).reshape((-1, 1, 2))
-    cv2.fillPoly(poly_mask, [poly_points], 1)
-    
-    # 计算交集和并集
-    intersection = np.logical_and(rect_mask, poly_mask).sum()
-    union = np.logical_or(rect_mask, poly_mask).sum()
-    
-    # 计算IoU
-    if union == 0:
-        return 0.0
-    
-    return float(intersection) / union
+    return float(calculate_masks_regions_iou([np.array(polygon)], [rect])[0, 0])
 
 def is_point_in_rect(point: tuple[int, int], rect: tuple[int, int, int, int]) -> bool:
     """
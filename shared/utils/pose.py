@@ -0,0 +1,66 @@
+from typing import Optional
+import numpy as np
+
+from .regions import RegionSet
+
+# COCO关键点序号
+NOSE = 0
+LEFT_EYE = 1
+RIGHT_EYE = 2
+LEFT_WRIST = 9
+RIGHT_WRIST = 10
+
+HEAD = [NOSE, LEFT_EYE, RIGHT_EYE]
+WRISTS = [LEFT_WRIST, RIGHT_WRIST]
+
+# 低于该置信度的关键点视为不可见（与ultralytics把不可见关键点置为(0, 0)的阈值一致）
+KEYPOINT_CONF = 0.5
+
+
+def keypoint_arrays(r) -> tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    从姿态估计结果中取出关键点坐标和置信度
+
+    参数:
+        r: ultralytics的单帧结果
+
+    返回:
+        tuple: (坐标数组，形状为(人数, 关键点数, 2)；置信度数组，形状为(人数, 关键点数)，模型不输出置信度时为None)
+    """
+    if r.keypoints is None:
+        return np.zeros((0, 0, 2), dtype=np.float32), None
+    xy = r.keypoints.xy.cpu().numpy()
+    conf = r.keypoints.conf
+    return xy, (None if conf is None else conf.cpu().numpy())
+
+
+def keypoints_in_regions(xy: np.ndarray, conf: Optional[np.ndarray], indices: list[int],
+                         regions: RegionSet, names: Optional[list[str]] = None,
+                         min_conf: float = KEYPOINT_CONF) -> np.ndarray:
+    """
+    一次判断所有人的指定关键点分别落在哪些区域内
+
+    关键点坐标先取整（与int()一致），置信度低于min_conf的关键点不命中任何区域
+
+    参数:
+        xy: 关键点坐标，形状为(人数, 关键点数, 2)，如r.keypoints.xy
+        conf: 关键点置信度，形状为(人数, 关键点数)，为None时所有关键点都参与判断
+        indices: 要判断的关键点序号，如WRISTS
+        regions: 预编译的区域集合
+        names: 只判断这些区域，默认判断全部区域
+        min_conf: 关键点置信度阈值
+
+    返回:
+        np.ndarray: 形状为(人数, len(indices), 区域数)的布尔矩阵，
+            [p, k, j]表示第p个人的第indices[k]个关键点是否在第j个区域内
+    """
+    persons = xy.shape[0] if xy.ndim == 3 else 0
+    columns = len(regions) if names is None else len(names)
+    if persons == 0 or xy.shape[1] <= max(indices):  # 没有人，或模型的关键点数不够
+        return np.zeros((persons, len(indices), columns), dtype=bool)
+
+    points = xy[:, indices].astype(int)
+    hits = regions.contains(points.reshape(-1, 2), names).reshape(persons, len(indices), columns)
+    if conf is not None:
+        hits &= (conf[:, indices] >= min_conf)[:, :, None]
+    return hits
@@ -0,0 +1,187 @@
+from typing import Optional
+import numpy as np
+
+
+class RegionSet:
+    """
+    预编译的区域集合
+
+    在创建时把每个区域（矩形或多边形）一次性转换为顶点数组和外接矩形，
+    之后每帧只需一次调用即可判断N个点分别落在哪些区域内，不再对每个点、每个区域
+    重复构造轮廓并调用cv2.pointPolygonTest
+
+    点在多边形内的判断与is_point_in_polygon完全一致（包括边界上的点），
+    点在矩形内的判断与is_point_in_rect完全一致
+    """
+
+    def __init__(self, regions: dict, raster_size: Optional[tuple[int, int]] = None):
+        """
+        参数:
+            regions: 区域名到区域的映射，区域为矩形(x1, y1, x2, y2)或多边形顶点列表[(x, y), ...]
+            raster_size: 可选的画布尺寸(宽, 高)。给出时额外生成一张按位标记区域的查找栅格，
+                画布内的整数坐标点直接查表，适合点数很多的场景
+        """
+        self.names = list(regions)
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self._bboxes = np.zeros((len(self.names), 4), dtype=np.float64)
+        self._edges = {}  # 多边形区域序号 -> 各条边的(起点, 终点)，float32，形状为(m,4)
+        self._plans = {}  # 查询的区域组合 -> 拼接好的边数组和每个区域的边数
+
+        for i, (name, region) in enumerate(regions.items()):
+            points = np.asarray(region, dtype=np.float32)
+            if points.shape == (4,):  # 矩形
+                self._bboxes[i] = points
+            elif points.ndim == 2 and points.shape[0] >= 3 and points.shape[1] == 2:  # 多边形
+                self._bboxes[i] = (points[:, 0].min(), points[:, 1].min(),
+                                   points[:, 0].max(), points[:, 1].max())
+                self._edges[i] = np.hstack([np.roll(points, 1, axis=0), points])
+            else:
+                raise ValueError(f"区域{name}既不是矩形(x1, y1, x2, y2)也不是多边形顶点列表: {region}")
+
+        self._raster = None
+        if raster_size is not None:
+            self._raster = self._build_raster(*raster_size)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name) -> bool:
+        return name in self._index
+
+    def _columns(self, names: Optional[list[str]]) -> list[int]:
+        if names is None:
+            return list(range(len(self.names)))
+        return [self._index[name] for name in names]
+
+    def _plan(self, columns: list[int]) -> tuple:
+        """把要查询的多边形区域的边拼成一个数组，同一组区域只拼接一次"""
+        key = tuple(columns)
+        if key not in self._plans:
+            polygons = [j for j, column in enumerate(columns) if column in self._edges]
+            edges = [self._edges[columns[j]] for j in polygons]
+            edges = np.vstack(edges) if edges else np.zeros((0, 4), dtype=np.float32)
+            starts = np.cumsum([0] + [len(self._edges[columns[j]]) for j in polygons[:-1]]).astype(np.intp)
+            self._plans[key] = (np.array(polygons, dtype=np.intp), edges, starts)
+        return self._plans[key]
+
+    @staticmethod
+    def _polygon_test(points: np.ndarray, edges: np.ndarray, starts: np.ndarray) -> np.ndarray:
+        """
+        对一组点执行与cv2.pointPolygonTest(measureDist=False)相同的判断，返回结果>=0的掩码
+
+        参数:
+            points: float32点数组，形状为(n,2)
+            edges: 一个或多个多边形首尾相接拼成的边数组，每行为(起点x, 起点y, 终点x, 终点y)，float32
+            starts: 每个多边形第一条边在edges中的位置
+
+        返回:
+            np.ndarray: 形状为(n, 多边形数)的布尔矩阵
+        """
+        px, py = points[:, :1], points[:, 1:]
+        x0, y0, x1, y1 = edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+
+        # 整条边在点的上方、下方或左侧时不参与射线计数，只检查点是否正好在顶点或水平边上
+        skip = ((y0 <= py) & (y1 <= py)) | ((y0 > py) & (y1 > py)) | ((x0 < px) & (x1 < px))
+        on_edge = skip & (py == y1) & ((px == x1) | ((py == y0) & (((x0 <= px) & (px <= x1)) |
+                                                                 ((x1 <= px) & (px <= x0)))))
+
+        dist = (py - y0).astype(np.float64) * (x1 - x0) - (px - x0).astype(np.float64) * (y1 - y0)
+        on_edge |= ~skip & (dist == 0)
+        dist = np.where(y1 < y0, -dist, dist)
+        crossings = np.add.reduceat(~skip & (dist > 0), starts, axis=1, dtype=np.intp)
+
+        return np.logical_or.reduceat(on_edge, starts, axis=1) | (crossings % 2 == 1)
+
+    def _compute(self, points: np.ndarray, columns: list[int]) -> np.ndarray:
+        """先用外接矩形筛选，再对外接矩形内有点的多边形一次算完所有边"""
+        px, py = points[:, :1].astype(np.float64), points[:, 1:].astype(np.float64)
+        boxes = self._bboxes[columns]
+        hits = (boxes[:, 0] <= px) & (px <= boxes[:, 2]) & (boxes[:, 1] <= py) & (py <= boxes[:, 3])
+
+        polygons, edges, starts = self._plan(columns)
+        if polygons.size:
+            candidates = np.flatnonzero(hits[:, polygons].any(axis=1))
+            if candidates.size:
+                hits[np.ix_(candidates, polygons)] &= self._polygon_test(points[candidates], edges, starts)
+        return hits
+
+    def _build_raster(self, width: int, height: int) -> np.ndarray:
+        if len(self.names) > 64:
+            raise ValueError("查找栅格最多支持64个区域")
+        dtype = next(t for t in (np.uint8, np.uint16, np.uint32, np.uint64)
+                     if np.iinfo(t).bits >= len(self.names))
+        raster = np.zeros((height, width), dtype=dtype)
+
+        for i in range(len(self.names)):
+            x1, y1, x2, y2 = self._bboxes[i]
+            xs = np.arange(max(int(np.ceil(x1)), 0), min(int(np.floor(x2)), width - 1) + 1)
+            ys = np.arange(max(int(np.ceil(y1)), 0), min(int(np.floor(y2)), height - 1) + 1)
+            if xs.size == 0 or ys.size == 0:
+                continue
+            grid = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2).astype(np.float32)
+            inside = self._compute(grid, [i])[:, 0].reshape(ys.size, xs.size)
+            raster[ys[0]:ys[-1] + 1, xs[0]:xs[-1] + 1] |= inside.astype(dtype) << dtype(i)
+        return raster
+
+    @staticmethod
+    def box_centers(boxes) -> np.ndarray:
+        """
+        检测框中心点，与处理器中先取整再计算((x1+x2)//2, (y1+y2)//2)的结果一致
+
+        参数:
+            boxes: 检测框，形状为(n,4)的数组，如r.boxes.xyxy.cpu().numpy()
+
+        返回:
+            np.ndarray: 形状为(n,2)的整数中心点数组
+        """
+        boxes = np.asarray(boxes).reshape(-1, 4).astype(np.int64)
+        return (boxes[:, :2] + boxes[:, 2:]) // 2
+
+    def contains(self, points, names: Optional[list[str]] = None) -> np.ndarray:
+        """
+        判断每个点落在哪些区域内（含边界）
+
+        参数:
+            points: 点坐标，形状为(n,2)的数组或[(x, y), ...]列表，单个点(x, y)也可以
+            names: 只查询这些区域，按给定顺序返回；默认查询全部区域
+
+        返回:
+            np.ndarray: 形状为(n, 区域数)的布尔矩阵，[i, j]表示第i个点是否在第j个区域内
+        """
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        columns = self._columns(names)
+        if self._raster is None or points.shape[0] == 0:
+            return self._compute(points, columns)
+
+        height, width = self._raster.shape
+        lookup = (np.all(points == np.floor(points), axis=1) & (points[:, 0] >= 0) & (points[:, 0] < width)
+                  & (points[:, 1] >= 0) & (points[:, 1] < height))
+        hits = np.zeros((points.shape[0], len(columns)), dtype=bool)
+
+        idx = np.flatnonzero(lookup)
+        if idx.size:
+            bits = self._raster[points[idx, 1].astype(np.intp), points[idx, 0].astype(np.intp)]
+            shifts = np.array(columns, dtype=self._raster.dtype)
+            hits[idx] = (bits[:, None] >> shifts) & 1 == 1
+        idx = np.flatnonzero(~lookup)
+        if idx.size:
+            hits[idx] = self._compute(points[idx], columns)
+        return hits
+
+    def intersects(self, boxes, names: Optional[list[str]] = None) -> np.ndarray:
+        """
+        判断每个检测框与哪些区域相交（与is_boxes_intersect一致，边界接触也算相交）
+
+        多边形区域按其外接矩形判断
+
+        参数:
+            boxes: 检测框，形状为(n,4)的数组，每行格式为(x1, y1, x2, y2)
+            names: 只查询这些区域，按给定顺序返回；默认查询全部区域
+
+        返回:
+            np.ndarray: 形状为(n, 区域数)的布尔矩阵
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        regions = self._bboxes[self._columns(names)]
+        return ~((boxes[:, 2:3] < regions[:, 0]) | (regions[:, 2] < boxes[:, 0:1]) |
+                 (boxes[:, 3:4] < regions[:, 1]) | (regions[:, 3] < boxes[:, 1:2]))
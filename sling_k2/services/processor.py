@@ -1,8 +1,9 @@
-from multiprocessing import Array,Manager,Value
+from multiprocessing import Manager,Value
 from datetime import datetime
 from ..core import logger
-from shared.utils import is_point_in_rect,is_boxes_intersect,is_point_in_polygon
-from shared.services import BaseResultProcessor
+from shared.utils import is_boxes_intersect,RegionSet,keypoint_arrays,keypoints_in_regions
+from shared.utils.pose import WRISTS
+from shared.services import BaseResultProcessor, SharedStateDict, SharedStateList, SharedFlags
 
 class ResultProcessor(BaseResultProcessor):
     # ANCHOR_POINT_REGION = [
@@ -18,22 +19,33 @@ class ResultProcessor(BaseResultProcessor):
     WORK_REGIONS = [
         (854, 1021, 1599, 1236),       
     ]
+    REGIONS = RegionSet({f"work_{i}": region for i, region in enumerate(WORK_REGIONS)})#预编译的区域
+
+    # 考试步骤：{模型序号: [(exam_flag序号, 步骤名), ...]}
+    EXAM_STEPS = {
+        1: [
+            (0, "sling_step_1"), (1, "sling_step_2"), (2, "sling_step_3"), (3, "sling_step_4"),
+            (4, "sling_step_5"), (5, "sling_step_6"), (6, "sling_step_7"), (7, "sling_step_8"),
+            (8, "sling_step_9"), (9, "sling_step_10"), (10, "sling_step_11"), (11, "sling_step_12"),
+        ],
+    }
+    # 清洗工作区的步骤也由姿态模型写入
+    EXAM_FLAG_SOURCES = {9: [0], 10: [0], 11: [0]}
 
     def __init__(self,weights_paths: list[str],images_dir, img_url_path):
         super().__init__(weights_paths, images_dir, img_url_path)
-        self.exam_flag = Array('b', [False] * 12)
+        self.exam_flag = SharedFlags(12)
         #self.warning_zone_flag=Array('b', [False] * 2)#存储两个视角下的警戒区域的检测结果
         self.manager = Manager()
-        self.exam_imgs = self.manager.dict()
-        self.exam_order = self.manager.list()
+        self.exam_imgs = SharedStateDict(self.manager)
+        self.exam_order = SharedStateList(self.manager)
         self.exam_status = Value('b', False)
 
     
     def init_exam_variables(self):
-        for i in range(len(self.exam_flag)):
-            self.exam_flag[i] = False    
+        self.exam_flag.fill(False)
         self.exam_imgs.clear()
-        self.exam_order[:]=[]
+        self.exam_order.clear()
 
     def process_result(self, r, weights_path):
         """Process results from the model - implementation of BaseResultProcessor method"""
@@ -43,26 +55,12 @@ class ResultProcessor(BaseResultProcessor):
         if weights_path==self.weights_paths[0]:  # 姿态估计
             if r.keypoints is None:
                 return
-            keypoints = r.keypoints.xy.cpu().numpy()
-            if keypoints.size != 0:
-                for keypoint in keypoints:
-                    try:
-                        left_wrist = list(map(int, keypoint[9]))
-                        right_wrist = list(map(int, keypoint[10]))
-
-                        # 检查左右手腕是否在任意悬挂区域内
-                        for region in self.WORK_REGIONS:
-                            # 检查左手腕
-                            if is_point_in_rect(left_wrist, region) or is_point_in_polygon(right_wrist, region):
-                                self.exam_flag[9]=True        
-                                self.exam_flag[10]=True   
-                                self.exam_flag[11]=True         
-                                break
-                                
-                                
-                    except (IndexError, ValueError) as e:
-                        logger.error(f"处理关键点时出错: {e}")
-                        continue
+            xy, conf = keypoint_arrays(r)
+            # 检查所有人的左右手腕是否在任意清洗工作区内
+            if keypoints_in_regions(xy, conf, WRISTS, self.REGIONS).any():
+                self.exam_flag[9]=True
+                self.exam_flag[10]=True
+                self.exam_flag[11]=True
                 
 
         if weights_path==self.weights_paths[1]:
@@ -102,38 +100,12 @@ class ResultProcessor(BaseResultProcessor):
 
         self.save_step(r, weights_path)
     
-    def save_step(self,r,weights_path):
-
-        # Restructure exam_steps to be a dictionary with weights_path as keys
-        exam_steps = {
-            self.weights_paths[0]: [],
-            self.weights_paths[1]: [
-                (self.exam_flag[0], "sling_step_1"),
-                (self.exam_flag[1], "sling_step_2"),
-                (self.exam_flag[2], "sling_step_3"),
-                (self.exam_flag[3], "sling_step_4"),
-                (self.exam_flag[4], "sling_step_5"),
-                (self.exam_flag[5], "sling_step_6"),
-                (self.exam_flag[6], "sling_step_7"),
-                (self.exam_flag[7], "sling_step_8"),
-                (self.exam_flag[8], "sling_step_9"),
-                (self.exam_flag[9], "sling_step_10"),
-                (self.exam_flag[10], "sling_step_11"),
-                (self.exam_flag[11], "sling_step_12"),
-            ]
-        }
-        
-        if self.exam_status.value and weights_path in exam_steps:
-            for flag, step in exam_steps[weights_path]:
-                if flag and step not in self.exam_imgs:
-                    self.save_image_exam(self.exam_imgs, r, step, self.exam_order)
-
     #TODO 还需要修改
     def save_image_exam(self,welding_exam_imgs,r, step_name,welding_exam_order):
         save_time = datetime.now().strftime('%Y%m%d_%H%M')
         imgpath = f"{self.images_dir}/{step_name}_{save_time}.jpg"
         postpath = f"{self.img_url_path}/{step_name}_{save_time}.jpg"
-        r.save(imgpath)
+        self.save_result_image(r, imgpath)
         # annotated_frame = r.plot()
         # cv2.imwrite(imgpath, annotated_frame)
         welding_exam_imgs[step_name]=postpath
@@ -0,0 +1,59 @@
+"""Back-off of the frame samplers against the model queues (streamer loop order)."""
+import time
+
+import pytest
+
+from shared.schemas import StreamConfig
+from shared.services.frame_buffer import FrameRef
+from shared.services.sampler import FrameSampler
+from shared.services.streamer import BaseVideoStreamer
+
+TARGET_FPS = 2.5
+
+
+@pytest.fixture
+def make_streamer():
+    streamers = []
+
+    def make(delivery):
+        config = StreamConfig(rtsp_url="test.avi", target_models={0}, target_fps=TARGET_FPS,
+                              buffer_slots=8, max_frame_shape=(4, 4, 3))
+        streamer = BaseVideoStreamer([config], num_models=1, delivery=delivery)
+        streamers.append(streamer)
+        return streamer
+
+    yield make
+    for streamer in streamers:
+        streamer.close()
+
+
+def sample_frames(streamer, frames: int, consume: bool) -> FrameSampler:
+    """Replay the sampling steps of one stream for model 0, optionally draining the queue after each frame"""
+    sampler = FrameSampler(TARGET_FPS)
+    slots = streamer.frame_buffers[0].slots
+    for seq in range(frames):
+        now = time.time()
+        backlog = streamer._backlog([0], slots)
+        streamer._distribute_frame_safely(FrameRef(0, seq % slots, seq, now, now, now), [0], "test.avi")
+        sampler.mark(now)
+        sampler.report_backlog(backlog[0])
+        if consume:
+            streamer.frame_queues[0].get(timeout=1)
+    return sampler
+
+
+@pytest.mark.parametrize("delivery", ["mailbox", "queue"])
+def test_keeping_up_keeps_full_rate(make_streamer, delivery):
+    sampler = sample_frames(make_streamer(delivery), frames=20, consume=True)
+    assert sampler.effective_fps == pytest.approx(TARGET_FPS)
+
+
+def test_unconsumed_mailbox_backs_off(make_streamer):
+    sampler = sample_frames(make_streamer("mailbox"), frames=3, consume=False)
+    assert sampler.effective_fps < TARGET_FPS
+
+
+def test_queue_backs_off_within_ring_slots(make_streamer):
+    # Refs beyond the ring's 8 slots are stale, so back-off must start well before queue_size (100)
+    sampler = sample_frames(make_streamer("queue"), frames=8, consume=False)
+    assert sampler.effective_fps < TARGET_FPS
@@ -0,0 +1,114 @@
+"""SharedFrameRing seqlock / overwrite behaviour and FrameMailbox delivery."""
+from queue import Empty
+
+import numpy as np
+import pytest
+
+from shared.services.frame_buffer import FrameMailbox, FrameRef, SharedFrameRing
+
+MAX_SHAPE = (4, 6, 3)
+
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing(3, MAX_SHAPE)
+    yield ring
+    ring.close()
+    ring.unlink()
+
+
+def make_frame(value: int, shape=MAX_SHAPE) -> np.ndarray:
+    return np.full(shape, value, dtype=np.uint8)
+
+
+@pytest.mark.parametrize("shape", [MAX_SHAPE, (2, 3, 3), (4, 6)])
+def test_round_trip_keeps_shape_and_dtype(ring, shape):
+    frame = np.arange(np.prod(shape), dtype=np.uint8).reshape(shape)
+    slot, seq = ring.write(frame, timestamp=12.5)
+    copy = ring.read(slot, seq)
+    assert copy.shape == frame.shape
+    assert copy.dtype == np.uint8
+    np.testing.assert_array_equal(copy, frame)
+    assert ring.timestamp(slot, seq) == pytest.approx(12.5)
+
+
+def test_rejects_frames_that_do_not_fit(ring):
+    assert not ring.fits(np.zeros(MAX_SHAPE, dtype=np.float32))
+    assert not ring.fits(np.zeros((5, 6, 3), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        ring.write(np.zeros(MAX_SHAPE, dtype=np.float32))
+
+
+def test_read_after_wrap_around_returns_none(ring):
+    slot, seq = ring.write(make_frame(1))
+    for value in range(ring.slots):
+        ring.write(make_frame(2 + value))
+    assert ring.read(slot, seq) is None
+    assert ring.timestamp(slot, seq) is None
+    # The newest frame in the reused slot is still readable
+    latest = ring.latest_seq
+    np.testing.assert_array_equal(ring.read(latest % ring.slots, latest), make_frame(1 + ring.slots))
+
+
+def test_read_of_slot_being_rewritten_returns_none(ring):
+    slot, seq = ring.write(make_frame(1))
+    ring._slot_header(slot)[0] = -1  # writer has invalidated the slot and not finished yet
+    assert ring.read(slot, seq) is None
+
+
+def test_read_detects_rewrite_during_copy(ring):
+    slot, seq = ring.write(make_frame(1))
+    data = ring._data
+
+    class RewriteWhileCopying:
+        """Slot data whose first access lets the writer wrap around onto the slot being read"""
+
+        def __getitem__(self, key):
+            ring._data = data
+            for value in range(ring.slots):
+                ring.write(make_frame(2 + value))
+            return data[key]
+
+    ring._data = RewriteWhileCopying()
+    assert ring.read(slot, seq) is None
+
+
+def test_attach_by_name_reads_frames_of_the_owner(ring):
+    slot, seq = ring.write(make_frame(7), timestamp=3.0)
+    reader = SharedFrameRing.attach(ring.name)
+    try:
+        assert reader.slots == ring.slots
+        assert reader.max_shape == MAX_SHAPE
+        assert reader.latest_seq == seq
+        np.testing.assert_array_equal(reader.read(slot, seq), make_frame(7))
+        assert reader.timestamp(slot, seq) == pytest.approx(3.0)
+    finally:
+        reader.close()
+
+
+def test_attach_to_missing_ring_raises():
+    with pytest.raises(FileNotFoundError):
+        SharedFrameRing.attach("ai_exam_test_missing_ring")
+
+
+def test_mailbox_keeps_newest_and_counts_overwrites():
+    mailbox = FrameMailbox()
+    mailbox.put_nowait(FrameRef(0, 0, 1))
+    mailbox.put_nowait(FrameRef(0, 1, 2))
+    mailbox.put_nowait(FrameRef(1, 2, 3))
+    assert mailbox.overwritten.value == 2
+    assert mailbox.qsize() == 1
+    assert mailbox.get(timeout=1) == FrameRef(1, 2, 3)
+    assert mailbox.empty()
+
+
+def test_mailbox_get_times_out_when_empty():
+    mailbox = FrameMailbox()
+    with pytest.raises(Empty):
+        mailbox.get(timeout=0.05)
+    with pytest.raises(Empty):
+        mailbox.get_nowait()
+    mailbox.put_nowait(FrameRef(0, 0, 1))
+    mailbox.get_nowait()
+    with pytest.raises(Empty):
+        mailbox.get(timeout=0.05)  # A consumed frame is not delivered twice
@@ -0,0 +1,20 @@
+"""Bbox-local mask/rectangle IoU against the previous full-frame raster implementation."""
+import numpy as np
+
+from benchmarks.geometry_bench import raster_mask_rect_iou, random_masks
+from shared.utils import calculate_mask_rect_iou, calculate_masks_regions_iou
+
+
+def test_mask_rect_iou_matches_full_frame_raster():
+    rng = np.random.default_rng(1)
+    masks = random_masks(300, vertices=40, seed=1)
+    for mask in masks:
+        rects = [tuple(int(v) for v in (*corner, *(corner + size)))
+                 for corner, size in zip(rng.uniform(0, 2200, (10, 2)), rng.uniform(1, 800, (10, 2)))]
+        expected = [raster_mask_rect_iou(mask, rect) for rect in rects]
+        assert [calculate_mask_rect_iou(mask, rect) for rect in rects] == expected
+        np.testing.assert_array_equal(calculate_masks_regions_iou([mask], rects)[0], expected)
+
+
+def test_mask_rect_iou_of_empty_mask_is_zero():
+    assert calculate_mask_rect_iou(np.zeros((0, 2), dtype=np.float32), (0, 0, 10, 10)) == 0.0
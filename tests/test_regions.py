@@ -0,0 +1,82 @@
+"""RegionSet against the per-point is_point_in_polygon / is_point_in_rect tests."""
+from functools import lru_cache
+
+import numpy as np
+import pytest
+
+from shared.utils import RegionSet, is_point_in_polygon, is_point_in_rect
+
+FRAME_SIZE = (2560, 1440)
+
+# Regions of the services (welding1_k2, welding3_k2, welding4_k2) plus rectangles
+REGIONS = {
+    "safe_area": [(1560, 3), (1524, 409), (1999, 557), (2156, 0)],
+    "ground_clamp_area": [(1532, 1188), (1670, 1439), (2053, 1439), (1801, 1130)],
+    "pentagon": [(1170, 3), (1196, 552), (1485, 428), (1495, 5), (1482, 3)],
+    "concave": [(100, 100), (600, 100), (600, 500), (350, 250), (100, 500)],
+    "welding_table": (675, 346, 1842, 1427),
+    "first_line": (662, 976, 1421, 1407),
+}
+
+
+def reference_contains(points: np.ndarray) -> np.ndarray:
+    """Per point, per region answer of is_point_in_rect / is_point_in_polygon"""
+    expected = np.zeros((len(points), len(REGIONS)), dtype=bool)
+    for i, point in enumerate(points):
+        for j, region in enumerate(REGIONS.values()):
+            if isinstance(region, tuple):
+                expected[i, j] = is_point_in_rect(tuple(point), region)
+            else:
+                expected[i, j] = is_point_in_polygon(tuple(point), region)
+    return expected
+
+
+@lru_cache(maxsize=None)
+def probe_points(integer: bool) -> np.ndarray:
+    """Random points over the frame plus every region vertex, its neighbours and points along the edges"""
+    rng = np.random.default_rng(0)
+    random = rng.uniform(0, FRAME_SIZE, (20000, 2))
+    if integer:
+        random = np.floor(random)
+    vertices, edge_points = [], []
+    for region in REGIONS.values():
+        corners = np.array(region, dtype=np.float64).reshape(-1, 2)
+        if corners.shape[0] == 2:  # rectangle (x1, y1), (x2, y2)
+            (x1, y1), (x2, y2) = corners
+            corners = np.array([(x1, y1), (x2, y1), (x2, y2), (x1, y2)])
+        vertices.append(corners)
+        for start, end in zip(corners, np.roll(corners, -1, axis=0)):
+            t = np.linspace(0, 1, 11)[:, None]
+            edge = start + t * (end - start)
+            edge_points.append(np.round(edge) if integer else edge)
+    # Points just outside every vertex as well, to probe the boundary from both sides
+    vertices = np.vstack(vertices)
+    around = np.vstack([vertices + offset for offset in ((-1, 0), (1, 0), (0, -1), (0, 1))])
+    return np.vstack([random, vertices, around, *edge_points]).astype(np.float32)
+
+
+@lru_cache(maxsize=None)
+def expected_contains(integer: bool) -> np.ndarray:
+    return reference_contains(probe_points(integer))
+
+
+@pytest.mark.parametrize("integer", [True, False])
+def test_region_set_matches_point_tests(integer):
+    points = probe_points(integer)
+    np.testing.assert_array_equal(RegionSet(REGIONS).contains(points), expected_contains(integer))
+
+
+@pytest.mark.parametrize("integer", [True, False])
+def test_region_set_raster_matches_point_tests(integer):
+    # Integer points inside the canvas are looked up, the others fall back to the polygon test
+    points = probe_points(integer)
+    regions = RegionSet(REGIONS, raster_size=FRAME_SIZE)
+    np.testing.assert_array_equal(regions.contains(points), expected_contains(integer))
+
+
+def test_region_set_selects_and_orders_columns():
+    regions = RegionSet(REGIONS, raster_size=FRAME_SIZE)
+    points = probe_points(integer=True)[:500]
+    names = ["first_line", "safe_area"]
+    expected = reference_contains(points)[:, [list(REGIONS).index(name) for name in names]]
+    np.testing.assert_array_equal(regions.contains(points, names), expected)
@@ -0,0 +1,118 @@
+"""Version-driven resync of the shared exam state across forked processes."""
+import multiprocessing
+
+import pytest
+
+from shared.services.state import SharedFlags, SharedStateDict, SharedStateList
+
+fork = multiprocessing.get_context("fork")
+
+
+def run_in_child(target, *args):
+    """Run ``target`` in a forked process, as the inference workers do, and wait for it"""
+    process = fork.Process(target=target, args=args)
+    process.start()
+    process.join(timeout=10)
+    assert process.exitcode == 0
+
+
+@pytest.fixture(scope="module")
+def manager():
+    manager = fork.Manager()
+    yield manager
+    manager.shutdown()
+
+
+def set_flag(flags, index, value):
+    flags[index] = value
+
+
+def fill_flags(flags, value):
+    flags.fill(value)
+
+
+def test_flags_written_in_child_are_seen_after_version_bump():
+    flags = SharedFlags(4)
+    assert flags.snapshot() == (False, False, False, False)  # Parent caches its copy
+    version = flags.version
+
+    run_in_child(set_flag, flags, 2, True)
+
+    assert flags.version > version
+    assert flags.snapshot() == (False, False, True, False)
+    assert flags[2] and list(flags) == [False, False, True, False]
+
+
+def test_flags_of_several_writers_all_land():
+    flags = SharedFlags(3)
+    flags.snapshot()
+    writers = [fork.Process(target=set_flag, args=(flags, i, True)) for i in range(3)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join(timeout=10)
+    assert flags.snapshot() == (True, True, True)
+
+
+def test_unchanged_flag_write_keeps_version():
+    flags = SharedFlags(2, initial=True)
+    version = flags.version
+    run_in_child(set_flag, flags, 0, True)
+    assert flags.version == version
+
+
+def test_flags_fill_invalidates_cached_snapshots():
+    flags = SharedFlags(3)
+    flags[1] = True
+    assert flags.snapshot() == (False, True, False)
+
+    run_in_child(fill_flags, flags, True)
+    assert flags.snapshot() == (True, True, True)
+
+    run_in_child(fill_flags, flags, False)
+    assert flags.snapshot() == (False, False, False)
+
+
+def set_key(state, key, value):
+    state[key] = value
+
+
+def clear_state(state):
+    state.clear()
+
+
+def append_item(state, item):
+    state.append(item)
+
+
+def test_dict_written_in_child_is_seen_after_version_bump(manager):
+    state = SharedStateDict(manager, {"reset_step_1": "a.jpg"})
+    assert state.copy() == {"reset_step_1": "a.jpg"}  # Parent caches its copy
+    version = state.version
+
+    run_in_child(set_key, state, "reset_step_2", "b.jpg")
+
+    assert state.version > version
+    assert state["reset_step_2"] == "b.jpg"
+    assert state.copy() == {"reset_step_1": "a.jpg", "reset_step_2": "b.jpg"}
+
+
+def test_dict_clear_invalidates_cached_copies(manager):
+    state = SharedStateDict(manager)
+    run_in_child(set_key, state, "exam_step_1", "a.jpg")
+    assert "exam_step_1" in state
+
+    run_in_child(clear_state, state)
+    assert len(state) == 0
+    assert state.get("exam_step_1") is None
+
+
+def test_list_appends_and_clear_in_child_are_seen(manager):
+    order = SharedStateList(manager)
+    assert order.copy() == []
+    run_in_child(append_item, order, "step_1")
+    run_in_child(append_item, order, "step_2")
+    assert order.copy() == ["step_1", "step_2"]
+
+    run_in_child(clear_state, order)
+    assert order.copy() == []
@@ -28,10 +28,17 @@ class DetectionManager(BaseDetectionManager):
             return self.result_processor.human_postion.value
         return None
     
-    def set_save_img_flag(self, flag):
-        """设置保存图片标志"""
-        if self.result_processor and hasattr(self.result_processor, 'save_img_flag'):
-            self.result_processor.save_img_flag.value = flag
+    def request_wearing_snapshot(self):
+        """请求用下一帧检测结果保存穿戴图片，返回请求ID，服务未运行时返回None"""
+        if self.result_processor and hasattr(self.result_processor, 'snapshots'):
+            return self.result_processor.snapshots.request()
+        return None
+
+    def get_wearing_snapshot(self, request_id):
+        """获取请求对应的穿戴图片url，尚未保存时返回None"""
+        if self.result_processor and hasattr(self.result_processor, 'snapshots'):
+            return self.result_processor.snapshots.result(request_id)
+        return None
 
     def get_wearing_items(self):
         """获取穿戴物品"""
@@ -2,7 +2,7 @@ from multiprocessing import Manager,Value
 from datetime import datetime
 from ..core import logger
 from shared.utils import is_boxes_intersect
-from shared.services import BaseResultProcessor
+from shared.services import BaseResultProcessor, SharedStateDict, SnapshotChannel
 
 class ResultProcessor(BaseResultProcessor):
 
@@ -12,11 +12,10 @@ class ResultProcessor(BaseResultProcessor):
         super().__init__(weights_paths, images_dir, img_url_path)
 
         self.human_postion=Value('b', False)  # 用来判断穿戴的人是否在指定位置
-        self.save_img_flag=Value('b', False)  # 用来传递保存图片的标志
-        self.img_saved=Value('b', False) # 若已保存图片，则设置为True
 
         self.manager = Manager()
-        self.img_rul = self.manager.dict()#用来存放图片url
+        self.img_rul = SharedStateDict(self.manager)#用来存放图片url
+        self.snapshots = SnapshotChannel(self.manager)#接口请求拍照，下一帧检测结果保存图片后返回url
 
         self.detection_items = {
             "brush": 1,#刷子和锤子默认给1个
@@ -26,7 +25,7 @@ class ResultProcessor(BaseResultProcessor):
             'mask': 0
         }#用来在检测中记录，但不传递
 
-        self.wearing_items = self.manager.dict(self.detection_items)
+        self.wearing_items = SharedStateDict(self.manager, self.detection_items)
         # self.wearing_items = self.manager.dict({
         #     "pants": 0,
         #     'jacket': 0,
@@ -46,8 +45,6 @@ class ResultProcessor(BaseResultProcessor):
         logger.info("Resetting variables for wearing exam")
         #每次考试前重置变量
         self.human_postion.value = False
-        self.save_img_flag.value = False
-        self.img_saved.value = False
         for key in self.wearing_items:
             self.wearing_items[key] = 0
         for key in self.detection_items:
@@ -87,13 +84,15 @@ class ResultProcessor(BaseResultProcessor):
                 self.wearing_items['helmet']  = min(max(self.wearing_items['helmet'] , self.detection_items["helmet"]), 1)
                 self.wearing_items['gloves']  = min(max(self.wearing_items['gloves'] , self.detection_items["gloves"]), 2)
 
-            if self.save_img_flag.value and not self.img_saved.value:
-                save_time = datetime.now().strftime('%Y%m%d_%H%M')
-                img_path = f"{self.images_dir}/welding_wearing_{save_time}.jpg"
-                post_path = f"{self.img_url_path}/welding_wearing_{save_time}.jpg"
-                r.save(img_path)
+            if self.snapshots.pending:#有拍照请求，用当前帧应答
+                # 文件名带上请求序号，同一秒内的多次请求不会覆盖之前已返回的图片
+                request_id = self.snapshots.latest_request
+                save_time = datetime.now().strftime('%Y%m%d_%H%M%S')
+                img_path = f"{self.images_dir}/welding_wearing_{save_time}_{request_id}.jpg"
+                post_path = f"{self.img_url_path}/welding_wearing_{save_time}_{request_id}.jpg"
+                self.save_result_image(r, img_path)
                 self.img_rul['welding_wearing']=post_path
-                self.img_saved.value=True
+                self.snapshots.fulfil(post_path, request_id)
                 logger.info(f"Image saved at {img_path}")
             
 
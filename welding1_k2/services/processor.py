@@ -1,13 +1,15 @@
-from multiprocessing import Array,Manager,Value
+from multiprocessing import Manager,Value
 from datetime import datetime
-from shared.utils import is_boxes_intersect,calculate_mask_rect_iou,is_point_in_polygon
+from shared.utils import is_boxes_intersect,calculate_masks_regions_iou,RegionSet
 from ..core import logger
-from shared.services import BaseResultProcessor
+from shared.services import BaseResultProcessor, SharedStateDict, SharedStateList, SharedFlags
 
 class ResultProcessor(BaseResultProcessor):
 
     #机电学院焊接区域
     SAFE_AREA = [(1560, 3), (1524, 409), (1999, 557), (2156, 0)]#油桶和扫把安全区域
+    GROUND_CLAMP_AREA = [(1532, 1188), (1670, 1439), (2053, 1439), (1801, 1130)]#接地夹夹好的区域
+    REGIONS = RegionSet({"safe_area": SAFE_AREA, "ground_clamp_area": GROUND_CLAMP_AREA})#预编译的区域，每帧一次判断所有中心点
 
     FIRST_LINE_AREA = (662, 976, 1421, 1407)#一次线区域
     WELDING_MACHINE_AREA = (948, 293, 1397, 1091)#焊机区域
@@ -19,28 +21,55 @@ class ResultProcessor(BaseResultProcessor):
     GROUNDING_WIRE_AREA = (546, 268, 1941, 1431)#焊台上的搭铁线
     WELDING_PIECE_AREA = (675, 346, 1842, 1427)#焊台上的焊件区域
 
+    # 复位步骤：{模型序号: [(reset_flag序号, 步骤名), ...]}
+    RESET_STEPS = {
+        0: [(0, 'reset_step_1')],
+        2: [(1, 'reset_step_2'), (2, 'reset_step_3'), (3, 'reset_step_4'), (4, 'reset_step_5')],
+        5: [(5, 'reset_step_6')],
+    }
+    # 考试步骤：{模型序号: [(exam_flag序号, 步骤名), ...]}
+    EXAM_STEPS = {
+        0: [(0, 'welding_exam_1'), (21, 'welding_exam_22')],
+        1: [
+            (1, 'welding_exam_2'), (2, 'welding_exam_3'), (3, 'welding_exam_4'), (4, 'welding_exam_5'),
+            (5, 'welding_exam_6'),
+        ],
+        2: [
+            (6, 'welding_exam_7'), (7, 'welding_exam_8'), (10, 'welding_exam_11'), (16, 'welding_exam_17'),
+            (17, 'welding_exam_18'), (18, 'welding_exam_19'), (22, 'welding_exam_23'), (23, 'welding_exam_24'),
+        ],
+        3: [
+            (9, 'welding_exam_10'), (11, 'welding_exam_12'), (14, 'welding_exam_15'), (19, 'welding_exam_20'),
+            (20, 'welding_exam_21'),
+        ],
+        4: [(12, 'welding_exam_13'), (13, 'welding_exam_14')],
+        5: [(8, 'welding_exam_9'), (15, 'welding_exam_16')],
+    }
+    # 由其他视角写入的标志：21由焊台目标检测模型写入（焊后场地清理），9由开关灯视角模型写入（夹好接地夹），
+    # 14由焊台分类模型写入（取下接地夹）
+    EXAM_FLAG_SOURCES = {21: [3], 9: [2], 14: [4]}
+    EXAM_SCORES = {'welding_exam_21': 8}#TODO:计算分数,临时测试,10分值
+
     def __init__(self,weights_paths: list[str],images_dir, img_url_path):
         super().__init__(weights_paths,images_dir,img_url_path)
 
-        self.reset_flag = Array('b', [False] * 6)
-        self.exam_flag = Array('b', [False] * 24)
+        self.reset_flag = SharedFlags(6)
+        self.exam_flag = SharedFlags(24)
         self.manager = Manager()
-        self.reset_imgs = self.manager.dict()
-        self.exam_imgs = self.manager.dict()
-        self.exam_order = self.manager.list()
-        self.exam_score = self.manager.dict()#某一步骤考试分数
+        self.reset_imgs = SharedStateDict(self.manager)
+        self.exam_imgs = SharedStateDict(self.manager)
+        self.exam_order = SharedStateList(self.manager)
+        self.exam_score = SharedStateDict(self.manager)#某一步骤考试分数
         self.exam_status = Value('b', False)
 
     
     def init_exam_variables(self):
-        for i in range(len(self.exam_flag)):
-            self.exam_flag[i] = False    
+        self.exam_flag.fill(False)
         self.exam_imgs.clear()
-        self.exam_order[:]=[]
+        self.exam_order.clear()
 
     def init_reset_variables(self):
-        for i in range(len(self.reset_flag)):
-            self.reset_flag[i] = False
+        self.reset_flag.fill(False)
         self.reset_imgs.clear()
 
     def process_result(self, r, weights_path):
@@ -53,11 +82,12 @@ class ResultProcessor(BaseResultProcessor):
             boxes = r.boxes.xyxy.cpu().numpy()
             classes = r.boxes.cls.cpu().numpy()
             
-            for box, cls in zip(boxes, classes):
+            # 所有检测框的中心点一次判断是否在安全区域
+            in_safe_area = self.REGIONS.contains(RegionSet.box_centers(boxes), ["safe_area"])[:, 0]
+
+            for box, cls, in_safe in zip(boxes, classes, in_safe_area):
                 if r.names[int(cls)] == "oil_tank":
-                    box=list(map(int, box))#转换为int类型
-                    center_point = ((box[0]+box[2])//2,(box[1]+box[3])//2)
-                    if is_point_in_polygon(center_point, self.SAFE_AREA):
+                    if in_safe:
                         self.reset_flag[0] = True#表面油桶不在危险区域，所以需要复位
                         self.exam_flag[0]=True#油桶已经排除在危险区域外
                     else:
@@ -66,9 +96,7 @@ class ResultProcessor(BaseResultProcessor):
 
 
                 elif r.names[int(cls)] == "sweep":
-                    box=list(map(int, box))
-                    center_point = ((box[0]+box[2])//2,(box[1]+box[3])//2)
-                    if not is_point_in_polygon(center_point, self.SAFE_AREA):#表明扫把在工作区
+                    if not in_safe:#表明扫把在工作区
                         self.exam_flag[21]=True
                     
                         
@@ -76,11 +104,14 @@ class ResultProcessor(BaseResultProcessor):
             if r.masks is not None:
                 masks = r.masks.xy #已经是list数组了
                 #Todo: 加上判断分割出的物体是否是人
-                for mask in masks:
-                    iou1=calculate_mask_rect_iou(mask, self.FIRST_LINE_AREA)#一次线
-                    iou2=calculate_mask_rect_iou(mask, self.WELDING_MACHINE_AREA)#焊机
-                    iou3=calculate_mask_rect_iou(mask, self.GUN_SECONDARY_LINE_AREA)#焊枪二次线区域
-                    iou4=calculate_mask_rect_iou(mask, self.GROUND_SECONDARY_LINE_AREA)#接地夹二次线区域
+                # 所有掩码与所有区域的IoU一次算完
+                ious = calculate_masks_regions_iou(masks, [
+                    self.FIRST_LINE_AREA,#一次线
+                    self.WELDING_MACHINE_AREA,#焊机
+                    self.GUN_SECONDARY_LINE_AREA,#焊枪二次线区域
+                    self.GROUND_SECONDARY_LINE_AREA,#接地夹二次线区域
+                ])
+                for iou1, iou2, iou3, iou4 in ious:
                     #logger.info(f"iou1:{iou1},iou2:{iou2},iou3:{iou3},iou4:{iou4}")
                     if iou1>0.01:
                         self.exam_flag[1]=True#一次线
@@ -100,7 +131,10 @@ class ResultProcessor(BaseResultProcessor):
             self.reset_flag[2] = True
             self.reset_flag[1] = True
 
-            for box, cls in zip(boxes, classes):
+            # 接地夹中心点是否在夹好的区域内
+            in_clamp_area = self.REGIONS.contains(RegionSet.box_centers(boxes), ["ground_clamp_area"])[:, 0]
+
+            for box, cls, in_clamp in zip(boxes, classes, in_clamp_area):
                 #logger.info(r.names[int(cls)] )
 
                 if r.names[int(cls)] == "welding_gun":
@@ -126,10 +160,7 @@ class ResultProcessor(BaseResultProcessor):
                     else:
                         self.exam_flag[23]=False
                     
-                    box=list(map(int, box))#转换为int类型
-                    center_point = ((box[0]+box[2])//2,(box[1]+box[3])//2)
-                    #[(1532, 1188), (1670, 1439), (2053, 1439), (1801, 1130)]
-                    if is_point_in_polygon(center_point, [(1532, 1188), (1670, 1439), (2053, 1439), (1801, 1130)]):
+                    if in_clamp:
                         self.exam_flag[9]=True#夹好接地夹
                     
 
@@ -212,90 +243,22 @@ class ResultProcessor(BaseResultProcessor):
             
         self.save_step(r,weights_path)
     
-    def save_step(self,r,weights_path):
-
-        reset_steps = {
-        self.weights_paths[0]: [(self.reset_flag[0], 'reset_step_1'),],
-        self.weights_paths[2]: [(self.reset_flag[1], 'reset_step_2'),
-                                (self.reset_flag[2], 'reset_step_3'),
-                                (self.reset_flag[3], 'reset_step_4'),
-                                (self.reset_flag[4], 'reset_step_5')],
-        self.weights_paths[5]: [(self.reset_flag[5], 'reset_step_6')]
-    }
-
-
-        if not self.exam_status.value and weights_path in reset_steps:
-            for flag, step in reset_steps[weights_path]:
-                if flag and step not in self.reset_imgs:
-                    self.save_image_reset(self.reset_imgs, r, step)
-
-
-        exam_steps = {
-            self.weights_paths[0]: [
-            (self.exam_flag[0], 'welding_exam_1'),
-            (self.exam_flag[21], 'welding_exam_22'),
-            ],
-            self.weights_paths[1]: [
-            (self.exam_flag[1], 'welding_exam_2'),
-            (self.exam_flag[2], 'welding_exam_3'),
-            (self.exam_flag[3], 'welding_exam_4'),
-            (self.exam_flag[4], 'welding_exam_5'),
-            (self.exam_flag[5], 'welding_exam_6'),
-            ],
-            self.weights_paths[2]: [
-            (self.exam_flag[6], 'welding_exam_7'),
-            (self.exam_flag[7], 'welding_exam_8'),
-            (self.exam_flag[10], 'welding_exam_11'),
-            (self.exam_flag[16], 'welding_exam_17'),
-            (self.exam_flag[17], 'welding_exam_18'),
-            (self.exam_flag[18], 'welding_exam_19'),
-            (self.exam_flag[22], 'welding_exam_23'),
-            (self.exam_flag[23], 'welding_exam_24'),
-            ],
-            self.weights_paths[3]: [
-            (self.exam_flag[9], 'welding_exam_10'),
-            (self.exam_flag[11], 'welding_exam_12'),
-            (self.exam_flag[14], 'welding_exam_15'),
-            (self.exam_flag[19], 'welding_exam_20'),
-            (self.exam_flag[20], 'welding_exam_21'),
-            ],
-            self.weights_paths[4]: [
-            (self.exam_flag[12], 'welding_exam_13'),
-            (self.exam_flag[13], 'welding_exam_14'),
-            ],
-            self.weights_paths[5]: [
-            (self.exam_flag[8], 'welding_exam_9'),
-            (self.exam_flag[15], 'welding_exam_16'),
-            ]
-        }
-        if self.exam_status.value and weights_path in exam_steps:
-            for flag, step in exam_steps[weights_path]:
-                if flag and step not in self.exam_imgs:
-                    self.save_image_exam(self.exam_imgs, r, step, self.exam_order)
-                    if step == 'welding_exam_21':        
-                        self.exam_score['welding_exam_21']=8#TODO:计算分数,临时测试,10分值
-                    else:
-                        self.exam_score[step]=0
-
-                    #self.exam_score[step]=8#TODO:计算分数,临时测试,10分值
-                     
     def save_image_reset(self,welding_reset_imgs,r, step_name):#保存图片
         save_time = datetime.now().strftime('%Y%m%d_%H%M')
         imgpath = f"{self.images_dir}/{step_name}_{save_time}.jpg"
         postpath = f"{self.img_url_path}/{step_name}_{save_time}.jpg"
         # annotated_frame = r.plot()
         # cv2.imwrite(imgpath, annotated_frame)
-        r.save(imgpath)
+        self.save_result_image(r, imgpath)
         welding_reset_imgs[step_name]=postpath
 
     def save_image_exam(self,welding_exam_imgs,r, step_name,welding_exam_order):
         save_time = datetime.now().strftime('%Y%m%d_%H%M')
         imgpath = f"{self.images_dir}/{step_name}_{save_time}.jpg"
         postpath = f"{self.img_url_path}/{step_name}_{save_time}.jpg"
-        r.save(imgpath)
+        self.save_result_image(r, imgpath)
         # annotated_frame = r.plot()
         # cv2.imwrite(imgpath, annotated_frame)
         welding_exam_imgs[step_name]=postpath
         welding_exam_order.append(step_name)
         logger.info(f"{step_name}完成")
-
@@ -1,14 +1,16 @@
-from multiprocessing import Array,Manager,Value
+from multiprocessing import Manager,Value
 from datetime import datetime
-from shared.utils import is_boxes_intersect,calculate_mask_rect_iou,is_point_in_polygon
+from shared.utils import is_boxes_intersect,calculate_masks_regions_iou,RegionSet
 from ..core import logger
-from shared.services import BaseResultProcessor
+from shared.services import BaseResultProcessor, SharedStateDict, SharedStateList, SharedFlags
 
 class ResultProcessor(BaseResultProcessor):
 
 
     #机电学院焊接区域
     SAFE_AREA = [(1170, 3), (1196, 552), (1485, 428), (1495, 5), (1482, 3)]#油桶和扫把安全区域
+    GROUND_CLAMP_AREA = [(1484, 668), (1823, 1127), (2042, 990), (1720, 597)]#接地夹夹好的区域
+    REGIONS = RegionSet({"safe_area": SAFE_AREA, "ground_clamp_area": GROUND_CLAMP_AREA})#预编译的区域，每帧一次判断所有中心点
 
     FIRST_LINE_AREA = (965, 857, 1757, 1438)#一次线区域
     WELDING_MACHINE_AREA = (564, 199, 1615, 1195)#焊机区域
@@ -22,28 +24,53 @@ class ResultProcessor(BaseResultProcessor):
     GROUNDING_WIRE_AREA = (400, 117, 2042, 1439)#焊台上的搭铁线
     WELDING_PIECE_AREA = (486, 177, 1972, 1427)#焊台上的焊件区域
 
+    # 复位步骤：{模型序号: [(reset_flag序号, 步骤名), ...]}
+    RESET_STEPS = {
+        0: [(0, 'reset_step_1')],
+        2: [(1, 'reset_step_2'), (2, 'reset_step_3')],
+        6: [(3, 'reset_step_4')],
+        7: [(4, 'reset_step_5'), (5, 'reset_step_6')],
+    }
+    # 考试步骤：{模型序号: [(exam_flag序号, 步骤名), ...]}
+    EXAM_STEPS = {
+        0: [(0, 'welding_exam_1'), (22, 'welding_exam_23')],#油桶模型
+        1: [#分割模型，焊机视角
+            (1, 'welding_exam_2'), (2, 'welding_exam_3'), (3, 'welding_exam_4'), (4, 'welding_exam_5'),
+        ],
+        3: [(5, 'welding_exam_6'), (10, 'welding_exam_11'), (17, 'welding_exam_18')],#分割模型，气瓶视角
+        2: [#目标检测，开关灯视角
+            (6, 'welding_exam_7'), (7, 'welding_exam_8'), (15, 'welding_exam_16'), (16, 'welding_exam_17'),
+        ],
+        4: [(9, 'welding_exam_10'), (18, 'welding_exam_19'), (19, 'welding_exam_20')],#目标检测，焊台视角
+        5: [(11, 'welding_exam_12'), (12, 'welding_exam_13'), (13, 'welding_exam_14')],#焊台视角，目标分类
+        6: [(8, 'welding_exam_9'), (14, 'welding_exam_15')],#焊台视角，目标分类
+        7: [(20, 'welding_exam_21'), (21, 'welding_exam_22')],#油桶视角，目标检测焊枪与接地夹
+    }
+    # 由其他视角写入的标志：22由焊台目标检测模型写入（焊后场地清理），9由开关灯视角模型写入（夹好接地夹），
+    # 21由油桶模型写入（扫把在工作区）
+    EXAM_FLAG_SOURCES = {22: [4], 9: [2], 21: [0]}
+    EXAM_SCORES = {'welding_exam_20': 8}#TODO:计算分数,临时测试,10分值
+
     def __init__(self,weights_paths: list[str],images_dir, img_url_path):
         super().__init__(weights_paths,images_dir,img_url_path)
 
-        self.reset_flag = Array('b', [False] * 6)
-        self.exam_flag = Array('b', [False] * 23)
+        self.reset_flag = SharedFlags(6)
+        self.exam_flag = SharedFlags(23)
         self.manager = Manager()
-        self.reset_imgs = self.manager.dict()
-        self.exam_imgs = self.manager.dict()
-        self.exam_order = self.manager.list()
-        self.exam_score = self.manager.dict()#某一步骤考试分数
+        self.reset_imgs = SharedStateDict(self.manager)
+        self.exam_imgs = SharedStateDict(self.manager)
+        self.exam_order = SharedStateList(self.manager)
+        self.exam_score = SharedStateDict(self.manager)#某一步骤考试分数
         self.exam_status = Value('b', False)
 
     
     def init_exam_variables(self):
-        for i in range(len(self.exam_flag)):
-            self.exam_flag[i] = False    
+        self.exam_flag.fill(False)
         self.exam_imgs.clear()
-        self.exam_order[:]=[]
+        self.exam_order.clear()
 
     def init_reset_variables(self):
-        for i in range(len(self.reset_flag)):
-            self.reset_flag[i] = False
+        self.reset_flag.fill(False)
         self.reset_imgs.clear()
 
     def process_result(self, r, weights_path):
@@ -56,11 +83,12 @@ class ResultProcessor(BaseResultProcessor):
             boxes = r.boxes.xyxy.cpu().numpy()
             classes = r.boxes.cls.cpu().numpy()
             
-            for box, cls in zip(boxes, classes):
+            # 所有检测框的中心点一次判断是否在安全区域
+            in_safe_area = self.REGIONS.contains(RegionSet.box_centers(boxes), ["safe_area"])[:, 0]
+
+            for box, cls, in_safe in zip(boxes, classes, in_safe_area):
                 if r.names[int(cls)] == "oil_tank":
-                    box=list(map(int, box))#转换为int类型
-                    center_point = ((box[0]+box[2])//2,(box[1]+box[3])//2)
-                    if is_point_in_polygon(center_point, self.SAFE_AREA):
+                    if in_safe:
                         self.reset_flag[0] = True#表面油桶不在危险区域，所以需要复位
                         self.exam_flag[0]=True#油桶已经排除在危险区域外
                     else:
@@ -69,9 +97,7 @@ class ResultProcessor(BaseResultProcessor):
 
 
                 elif r.names[int(cls)] == "sweep":
-                    box=list(map(int, box))
-                    center_point = ((box[0]+box[2])//2,(box[1]+box[3])//2)
-                    if not is_point_in_polygon(center_point, self.SAFE_AREA):#表明扫把在工作区
+                    if not in_safe:#表明扫把在工作区
                         self.exam_flag[21]=True
                     
                         
@@ -79,11 +105,14 @@ class ResultProcessor(BaseResultProcessor):
             if r.masks is not None:
                 masks = r.masks.xy #已经是list数组了
                 #Todo: 加上判断分割出的物体是否是人
-                for mask in masks:
-                    iou1=calculate_mask_rect_iou(mask, self.FIRST_LINE_AREA)#一次线
-                    iou2=calculate_mask_rect_iou(mask, self.WELDING_MACHINE_AREA)#焊机
-                    iou3=calculate_mask_rect_iou(mask, self.GUN_SECONDARY_LINE_AREA)#焊枪二次线区域
-                    iou4=calculate_mask_rect_iou(mask, self.GROUND_SECONDARY_LINE_AREA)#接地夹二次线区域
+                # 所有掩码与所有区域的IoU一次算完
+                ious = calculate_masks_regions_iou(masks, [
+                    self.FIRST_LINE_AREA,#一次线
+                    self.WELDING_MACHINE_AREA,#焊机
+                    self.GUN_SECONDARY_LINE_AREA,#焊枪二次线区域
+                    self.GROUND_SECONDARY_LINE_AREA,#接地夹二次线区域
+                ])
+                for iou1, iou2, iou3, iou4 in ious:
                     #logger.info(f"iou1:{iou1},iou2:{iou2},iou3:{iou3},iou4:{iou4}")
                     if iou1>0.01:
                         self.exam_flag[1]=True#一次线，电源线
@@ -99,8 +128,10 @@ class ResultProcessor(BaseResultProcessor):
             if r.masks is not None:
                 masks = r.masks.xy #已经是list数组了
                 #Todo: 加上判断分割出的物体是否是人
-                for mask in masks:
-                    iou=calculate_mask_rect_iou(mask, self.GAS_CYLINDER_AREA)#气瓶区域
+                ious = calculate_masks_regions_iou(masks, [
+                    self.GAS_CYLINDER_AREA,#气瓶区域
+                ])
+                for iou in ious[:, 0]:
 
                     #logger.info(f"iou1:{iou1},iou2:{iou2},iou3:{iou3},iou4:{iou4}")
                     if iou>0.01:
@@ -117,7 +148,10 @@ class ResultProcessor(BaseResultProcessor):
             classes = r.boxes.cls.cpu().numpy()
             
 
-            for box, cls in zip(boxes, classes):
+            # 接地夹中心点是否在夹好的区域内
+            in_clamp_area = self.REGIONS.contains(RegionSet.box_centers(boxes), ["ground_clamp_area"])[:, 0]
+
+            for box, cls, in_clamp in zip(boxes, classes, in_clamp_area):
 
 
                 if r.names[int(cls)] == "red_light_on":#红灯亮,打开总开关
@@ -142,9 +176,7 @@ class ResultProcessor(BaseResultProcessor):
                         self.exam_flag[15]=True
                 
                 elif r.names[int(cls)] == "grounding_wire":#TODO 多了个空格
-                    box=list(map(int, box))#转换为int类型
-                    center_point = ((box[0]+box[2])//2,(box[1]+box[3])//2)
-                    if is_point_in_polygon(center_point, [(1484, 668), (1823, 1127), (2042, 990), (1720, 597)]):
+                    if in_clamp:
                         self.exam_flag[9]=True#夹好接地夹
             
             # if self.exam_flag[6] and self.exam_flag[7] and self.exam_flag[8] and self.exam_flag[9]:
@@ -233,99 +265,22 @@ class ResultProcessor(BaseResultProcessor):
             
         self.save_step(r,weights_path)
     
-    def save_step(self,r,weights_path):
-
-        reset_steps = {
-        self.weights_paths[0]: [(self.reset_flag[0], 'reset_step_1')],
-        self.weights_paths[2]: [(self.reset_flag[1], 'reset_step_2'),
-                                (self.reset_flag[2], 'reset_step_3')],
-        self.weights_paths[6]: [(self.reset_flag[3], 'reset_step_4')],
-        self.weights_paths[7]: [(self.reset_flag[4], 'reset_step_5'),
-                                (self.reset_flag[5], 'reset_step_6')]
-    }
-
-
-        if not self.exam_status.value and weights_path in reset_steps:
-            for flag, step in reset_steps[weights_path]:
-                if flag and step not in self.reset_imgs:
-                    self.save_image_reset(self.reset_imgs, r, step)
-
-
-        exam_steps = {
-            #油桶模型
-            self.weights_paths[0]: [
-            (self.exam_flag[0], 'welding_exam_1'),
-            (self.exam_flag[22], 'welding_exam_23'),
-            ],
-            #分割模型，焊机视角
-            self.weights_paths[1]: [
-            (self.exam_flag[1], 'welding_exam_2'),
-            (self.exam_flag[2], 'welding_exam_3'),
-            (self.exam_flag[3], 'welding_exam_4'),
-            (self.exam_flag[4], 'welding_exam_5')
-            ],
-            #分割模型，气瓶视角
-            self.weights_paths[3]: [
-            (self.exam_flag[5], 'welding_exam_6'),
-            (self.exam_flag[10], 'welding_exam_11'),
-            (self.exam_flag[17], 'welding_exam_18'),
-            ],
-            #目标检测，开关灯视角
-            self.weights_paths[2]: [
-            (self.exam_flag[6], 'welding_exam_7'),
-            (self.exam_flag[7], 'welding_exam_8'),
-            (self.exam_flag[15], 'welding_exam_16'),
-            (self.exam_flag[16], 'welding_exam_17')
-            ],
-            #目标检测，焊台视角
-            self.weights_paths[4]: [
-            (self.exam_flag[9], 'welding_exam_10'),
-            (self.exam_flag[18], 'welding_exam_19'),
-            (self.exam_flag[19], 'welding_exam_20')
-            ],
-            #焊台视角，目标分类
-            self.weights_paths[5]: [
-            (self.exam_flag[11], 'welding_exam_12'),
-            (self.exam_flag[12], 'welding_exam_13'),
-            (self.exam_flag[13], 'welding_exam_14')
-            ],
-            #焊台视角，目标分类
-            self.weights_paths[6]: [
-            (self.exam_flag[8], 'welding_exam_9'),
-            (self.exam_flag[14], 'welding_exam_15')
-            ],
-            #油桶视角，目标检测焊枪与接地夹
-            self.weights_paths[7]: [
-            (self.exam_flag[20], 'welding_exam_21'),
-            (self.exam_flag[21], 'welding_exam_22')
-            ]
-        }
-        if self.exam_status.value and weights_path in exam_steps:
-            for flag, step in exam_steps[weights_path]:
-                if flag and step not in self.exam_imgs:
-                    self.save_image_exam(self.exam_imgs, r, step, self.exam_order)
-                    if step == 'welding_exam_20':        
-                        self.exam_score['welding_exam_20']=8#TODO:计算分数,临时测试,10分值
-                    else:
-                        self.exam_score[step]=0
-                     
     def save_image_reset(self,welding_reset_imgs,r, step_name):#保存图片
         save_time = datetime.now().strftime('%Y%m%d_%H%M')
         imgpath = f"{self.images_dir}/{step_name}_{save_time}.jpg"
         postpath = f"{self.img_url_path}/{step_name}_{save_time}.jpg"
         # annotated_frame = r.plot()
         # cv2.imwrite(imgpath, annotated_frame)
-        r.save(imgpath)
+        self.save_result_image(r, imgpath)
         welding_reset_imgs[step_name]=postpath
 
     def save_image_exam(self,welding_exam_imgs,r, step_name,welding_exam_order):
         save_time = datetime.now().strftime('%Y%m%d_%H%M')
         imgpath = f"{self.images_dir}/{step_name}_{save_time}.jpg"
         postpath = f"{self.img_url_path}/{step_name}_{save_time}.jpg"
-        r.save(imgpath)
+        self.save_result_image(r, imgpath)
         # annotated_frame = r.plot()
         # cv2.imwrite(imgpath, annotated_frame)
         welding_exam_imgs[step_name]=postpath
         welding_exam_order.append(step_name)
         logger.info(f"{step_name}完成")
-
@@ -1,8 +1,8 @@
-from multiprocessing import Array,Manager,Value
+from multiprocessing import Manager,Value
 from datetime import datetime
-from shared.utils import is_boxes_intersect,calculate_mask_rect_iou,is_point_in_polygon
+from shared.utils import is_boxes_intersect,calculate_masks_regions_iou,RegionSet
 from ..core import logger
-from shared.services import BaseResultProcessor
+from shared.services import BaseResultProcessor, SharedStateDict, SharedStateList, SharedFlags
 
 class ResultProcessor(BaseResultProcessor):
 
@@ -15,30 +15,43 @@ class ResultProcessor(BaseResultProcessor):
     WELDING_GUN_AREA = (936, 880, 1546, 1279)#焊机区域
     VAVLE_AREA = (1578, 1028, 1866, 1116)#气管区域
     WELDING_TABLE_AREA = [(1563, 0), (1520, 399), (2006, 554), (2159, 0)]#焊台区域
-
+    REGIONS = RegionSet({"safe_area": SAFE_AREA, "welding_table_area": WELDING_TABLE_AREA})#预编译的区域，每帧一次判断所有中心点
+
+    # 复位步骤：{模型序号: [(reset_flag序号, 步骤名), ...]}
+    RESET_STEPS = {
+        0: [(0, 'reset_step_1'), (1, 'reset_step_2'), (2, 'reset_step_3')],
+    }
+    # 考试步骤：{模型序号: [(exam_flag序号, 步骤名), ...]}
+    EXAM_STEPS = {
+        0: [(0, 'welding_exam_1')],#油桶模型
+        1: [(1, 'welding_exam_2'), (2, 'welding_exam_3')],#分割模型
+        2: [(3, 'welding_exam_4'), (6, 'welding_exam_7'), (7, 'welding_exam_8'), (8, 'welding_exam_9')],#分割模型
+        3: [(4, 'welding_exam_5'), (5, 'welding_exam_6')],#目标检测
+    }
+    # 由其他视角写入的标志
+    RESET_FLAG_SOURCES = {2: [3]}
+    EXAM_FLAG_SOURCES = {7: [0]}
 
     def __init__(self,weights_paths: list[str],images_dir, img_url_path):
         super().__init__(weights_paths,images_dir,img_url_path)
 
-        self.reset_flag = Array('b', [True] * 3)
-        self.exam_flag = Array('b', [False] * 9)
+        self.reset_flag = SharedFlags(3, True)
+        self.exam_flag = SharedFlags(9)
         self.manager = Manager()
-        self.reset_imgs = self.manager.dict()
-        self.exam_imgs = self.manager.dict()
-        self.exam_order = self.manager.list()
-        self.exam_score = self.manager.dict()#某一步骤考试分数
+        self.reset_imgs = SharedStateDict(self.manager)
+        self.exam_imgs = SharedStateDict(self.manager)
+        self.exam_order = SharedStateList(self.manager)
+        self.exam_score = SharedStateDict(self.manager)#某一步骤考试分数
         self.exam_status = Value('b', False)
 
     
     def init_exam_variables(self):
-        for i in range(len(self.exam_flag)):
-            self.exam_flag[i] = False    
+        self.exam_flag.fill(False)
         self.exam_imgs.clear()
-        self.exam_order[:]=[]
+        self.exam_order.clear()
 
     def init_reset_variables(self):
-        for i in range(len(self.reset_flag)):
-            self.reset_flag[i] = True
+        self.reset_flag.fill(True)
         self.reset_imgs.clear()
 
     def process_result(self, r, weights_path):
@@ -51,11 +64,12 @@ class ResultProcessor(BaseResultProcessor):
             boxes = r.boxes.xyxy.cpu().numpy()
             classes = r.boxes.cls.cpu().numpy()
             
-            for box, cls in zip(boxes, classes):
+            # 所有检测框的中心点一次判断是否在安全区域
+            in_safe_area = self.REGIONS.contains(RegionSet.box_centers(boxes), ["safe_area"])[:, 0]
+
+            for box, cls, in_safe in zip(boxes, classes, in_safe_area):
                 if r.names[int(cls)] == "oil_tank":
-                    box=list(map(int, box))#转换为int类型
-                    center_point = ((box[0]+box[2])//2,(box[1]+box[3])//2)
-                    if is_point_in_polygon(center_point, self.SAFE_AREA):
+                    if in_safe:
                         self.reset_flag[0] = True#表面油桶不在危险区域，所以需要复位
                         self.exam_flag[0]=True#油桶已经排除在危险区域外
                     else:
@@ -65,9 +79,7 @@ class ResultProcessor(BaseResultProcessor):
 
 
                 elif r.names[int(cls)] == "sweep":
-                    box=list(map(int, box))
-                    center_point = ((box[0]+box[2])//2,(box[1]+box[3])//2)
-                    if not is_point_in_polygon(center_point, self.SAFE_AREA):#表明扫把在工作区
+                    if not in_safe:#表明扫把在工作区
                         self.exam_flag[7]=True
                     
                         
@@ -75,9 +87,12 @@ class ResultProcessor(BaseResultProcessor):
             if r.masks is not None:
                 masks = r.masks.xy #已经是list数组了
                 #Todo: 加上判断分割出的物体是否是人
-                for mask in masks:
-                    iou1=calculate_mask_rect_iou(mask, self.WINDPIPE_AREA)#气管区域
-                    iou2=calculate_mask_rect_iou(mask, self.WELDING_GUN_AREA)#焊枪区域
+                # 所有掩码与所有区域的IoU一次算完
+                ious = calculate_masks_regions_iou(masks, [
+                    self.WINDPIPE_AREA,#气管区域
+                    self.WELDING_GUN_AREA,#焊枪区域
+                ])
+                for iou1, iou2 in ious:
                     #logger.info(f"iou1:{iou1},iou2:{iou2},iou3:{iou3},iou4:{iou4}")
                     if iou1>0.01:
                         self.exam_flag[1]=True#检查气管
@@ -89,8 +104,10 @@ class ResultProcessor(BaseResultProcessor):
             if r.masks is not None:
                 masks = r.masks.xy #已经是list数组了
                 #Todo: 加上判断分割出的物体是否是人
-                for mask in masks:
-                    iou=calculate_mask_rect_iou(mask, self.VAVLE_AREA)#气瓶区域
+                ious = calculate_masks_regions_iou(masks, [
+                    self.VAVLE_AREA,#气瓶区域
+                ])
+                for iou in ious[:, 0]:
 
                     #logger.info(f"iou1:{iou1},iou2:{iou2},iou3:{iou3},iou4:{iou4}")
                     if iou>0.01:
@@ -107,7 +124,9 @@ class ResultProcessor(BaseResultProcessor):
             classes = r.boxes.cls.cpu().numpy()
             
             iron_sheet_nums = 0#焊件数量
-            for box, cls in zip(boxes, classes):
+            # 焊件中心点是否在焊台区域内
+            on_table_area = self.REGIONS.contains(RegionSet.box_centers(boxes), ["welding_table_area"])[:, 0]
+            for box, cls, on_table in zip(boxes, classes, on_table_area):
 
 
                 if r.names[int(cls)] == "iron_sheet":#焊件
@@ -116,8 +135,7 @@ class ResultProcessor(BaseResultProcessor):
                     box=list(map(int, box))#转换为int类型
                     # Calculate the area of the detection box
                     
-                    center_point = ((box[0]+box[2])//2,(box[1]+box[3])//2)
-                    if is_point_in_polygon(center_point, self.WELDING_TABLE_AREA):
+                    if on_table:
                         self.reset_flag[2]=True
                         self.exam_flag[4]=True
                         box_area = (box[2] - box[0]) * (box[3] - box[1])
@@ -134,68 +152,20 @@ class ResultProcessor(BaseResultProcessor):
             
         self.save_step(r,weights_path)
     
-    def save_step(self,r,weights_path):
-
-        reset_steps = {
-        self.weights_paths[0]: [(self.reset_flag[0], 'reset_step_1'),
-                                (self.reset_flag[1], 'reset_step_2'),
-                                (self.reset_flag[2], 'reset_step_3')]
-        }
-
-
-        if not self.exam_status.value and weights_path in reset_steps:
-            for flag, step in reset_steps[weights_path]:
-                if flag and step not in self.reset_imgs:
-                    self.save_image_reset(self.reset_imgs, r, step)
-
-
-        exam_steps = {
-            #油桶模型
-            self.weights_paths[0]: [
-            (self.exam_flag[0], 'welding_exam_1')
-            ],
-            #分割模型
-            self.weights_paths[1]: [
-            (self.exam_flag[1], 'welding_exam_2'),
-            (self.exam_flag[2], 'welding_exam_3')
-            ],
-            #分割模型
-            self.weights_paths[2]: [
-            (self.exam_flag[3], 'welding_exam_4'),
-            (self.exam_flag[6], 'welding_exam_7'),
-            (self.exam_flag[7], 'welding_exam_8'),
-            (self.exam_flag[8], 'welding_exam_9'),
-            ],
-            #目标检测
-            self.weights_paths[3]: [
-            (self.exam_flag[4], 'welding_exam_5'),
-            (self.exam_flag[5], 'welding_exam_6')
-            ]
-        }
-
-        if self.exam_status.value and weights_path in exam_steps:
-            for flag, step in exam_steps[weights_path]:
-                if flag and step not in self.exam_imgs:
-                    self.save_image_exam(self.exam_imgs, r, step, self.exam_order)
-                    if self.exam_flag[19]:          
-                        self.exam_score[step]=8#TODO:计算分数,临时测试,10分值
-                    else:
-                        self.exam_score[step]=0
-                     
     def save_image_reset(self,welding_reset_imgs,r, step_name):#保存图片
         save_time = datetime.now().strftime('%Y%m%d_%H%M')
         imgpath = f"{self.images_dir}/{step_name}_{save_time}.jpg"
         postpath = f"{self.img_url_path}/{step_name}_{save_time}.jpg"
         # annotated_frame = r.plot()
         # cv2.imwrite(imgpath, annotated_frame)
-        r.save(imgpath)
+        self.save_result_image(r, imgpath)
         welding_reset_imgs[step_name]=postpath
 
     def save_image_exam(self,welding_exam_imgs,r, step_name,welding_exam_order):
         save_time = datetime.now().strftime('%Y%m%d_%H%M')
         imgpath = f"{self.images_dir}/{step_name}_{save_time}.jpg"
         postpath = f"{self.img_url_path}/{step_name}_{save_time}.jpg"
-        r.save(imgpath)
+        self.save_result_image(r, imgpath)
         # annotated_frame = r.plot()
         # cv2.imwrite(imgpath, annotated_frame)
         welding_exam_imgs[step_name]=postpath